@@ -0,0 +1,137 @@
+"""Bandingkan pembentukan DataFrame laporan: loop dict per baris (lama) vs read_sql_query (vektor).
+
+    python bench/bench_laporan.py                         # 10k staf, 1 juta transaksi
+    python bench/bench_laporan.py --staf 1000 --transaksi 100000 --db /tmp/bench_laporan.db
+
+Database dibuat di file sementara (atau --db) dan tidak menyentuh kantin_staf.db.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kantin_db  # noqa: E402
+import kantin_laporan  # noqa: E402
+
+DEPARTEMEN = ["Produksi", "HRD", "Gudang", "Keuangan", "IT", "Logistik", "QC", "Maintenance"]
+HARI = 30
+
+
+def buat_data(db_file: str, jumlah_staf: int, jumlah_transaksi: int, seed: int = 42):
+    rng = random.Random(seed)
+    kantin_db.DB_FILE = db_file
+    kantin_db.init_db()
+    staf = [(f"B{i:06d}", f"Staf {i}", rng.choice(DEPARTEMEN), rng.choice((1, 2))) for i in range(jumlah_staf)]
+    mulai = datetime.combine(date.today() - timedelta(days=HARI - 1), datetime.min.time())
+    with kantin_db.get_db_connection() as conn:
+        conn.executemany("INSERT OR IGNORE INTO departemen (nama_departemen) VALUES (?)", [(d,) for d in DEPARTEMEN])
+        conn.executemany(kantin_db.SQL_TAMBAH_STAF, staf)
+        awal = kantin_db.ke_epoch(mulai)
+        conn.executemany(
+            kantin_db.SQL_TAMBAH_TRANSAKSI,
+            ((rng.choice(staf)[0], awal + rng.randrange(HARI * 86400), rng.random() < 0.8)
+             for _ in range(jumlah_transaksi)),
+        )
+        conn.commit()
+        conn.execute("ANALYZE")
+
+
+# --- IMPLEMENTASI LAMA (loop dict per baris) SEBAGAI PEMBANDING ---
+
+def transaksi_lama(start_date, end_date):
+    where_clauses, params = kantin_laporan._filter_transaksi(None, start_date, end_date)
+    query = f"""
+        SELECT T.waktu_transaksi, S.nama, D.nama_departemen AS departemen, T.barcode_id, T.status_valid
+        FROM transaksi T JOIN staf S ON T.barcode_id = S.barcode_id
+        LEFT JOIN departemen D ON D.id = S.departemen_id
+        WHERE {' AND '.join(where_clauses)}
+        ORDER BY T.waktu_transaksi DESC
+    """
+    with kantin_db.get_db_connection() as conn:
+        transaksi = conn.execute(query, params).fetchall()
+    data = []
+    for row in transaksi:
+        data.append({
+            'Waktu': kantin_db.dari_epoch(row['waktu_transaksi']),
+            'Nama Staf': row['nama'],
+            'Departemen': row['departemen'],
+            'ID Barcode': row['barcode_id'],
+            'Status': 'VALID' if row['status_valid'] else 'BATAS (Ditolak)'
+        })
+    return pd.DataFrame(data)
+
+
+def jatah_lama():
+    query = """
+        SELECT S.barcode_id, S.nama, D.nama_departemen AS departemen, S.jatah_harian,
+               COALESCE(K.jumlah_ambil, 0) AS sudah_ambil
+        FROM staf AS S LEFT JOIN departemen AS D ON D.id = S.departemen_id
+        LEFT JOIN kuota_harian AS K ON K.barcode_id = S.barcode_id AND K.tanggal = ?
+        ORDER BY S.nama
+    """
+    with kantin_db.get_db_connection() as conn:
+        data = conn.execute(query, (date.today().isoformat(),)).fetchall()
+    df_data = []
+    for row in data:
+        row_dict = dict(row)
+        sisa_jatah = row_dict['jatah_harian'] - row_dict['sudah_ambil']
+        df_data.append({
+            'Nama Staf': row_dict['nama'],
+            'Departemen': row_dict['departemen'],
+            'ID Barcode': row_dict['barcode_id'],
+            'Jatah Harian': row_dict['jatah_harian'],
+            'Sudah Diambil': row_dict['sudah_ambil'],
+            'Sisa Jatah': sisa_jatah,
+            'Status': 'Selesai' if sisa_jatah <= 0 else 'Tersedia'
+        })
+    return pd.DataFrame(df_data)
+
+
+def ukur(label: str, fungsi, ulang: int):
+    terbaik, df = float("inf"), None
+    for _ in range(ulang):
+        mulai = time.perf_counter()
+        df = fungsi()
+        terbaik = min(terbaik, time.perf_counter() - mulai)
+    memori = df.memory_usage(deep=True).sum() / 1e6
+    print(f"  {label:<8} {terbaik:8.3f} s   {len(df):>9,} baris   {memori:8.1f} MB")
+    return terbaik
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--staf", type=int, default=10_000)
+    parser.add_argument("--transaksi", type=int, default=1_000_000)
+    parser.add_argument("--ulang", type=int, default=3, help="Ambil waktu terbaik dari N kali jalan.")
+    parser.add_argument("--db", help="Pakai/isi file ini alih-alih file sementara.")
+    args = parser.parse_args(argv)
+
+    db_file = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_laporan_"), "bench.db")
+    if not os.path.exists(db_file):
+        print(f"Membuat {args.staf:,} staf dan {args.transaksi:,} transaksi di {db_file} ...")
+        buat_data(db_file, args.staf, args.transaksi)
+    kantin_db.DB_FILE = db_file
+    kantin_db.CACHE_AKTIF = False    # Ukur query sebenarnya, bukan hit cache
+
+    awal, akhir = date.today() - timedelta(days=HARI - 1), date.today()
+    kasus = [
+        ("Riwayat transaksi", lambda: transaksi_lama(awal, akhir),
+         lambda: kantin_laporan.get_all_transaksi(None, awal, akhir)),
+        ("Jatah harian staf", jatah_lama, kantin_laporan.get_jatah_harian_staf),
+    ]
+    for judul, lama, baru in kasus:
+        print(judul)
+        t_lama = ukur("lama", lama, args.ulang)
+        t_baru = ukur("vektor", baru, args.ulang)
+        print(f"  percepatan {t_lama / t_baru:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
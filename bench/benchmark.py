@@ -0,0 +1,288 @@
+"""Benchmark jalur panas: scan, laporan jatah, riwayat transaksi, dan pemrosesan frame kamera.
+
+    python bench/benchmark.py                                   # ukuran "sedang"
+    python bench/benchmark.py --ukuran besar --simpan hasil.json
+    python bench/benchmark.py --bandingkan hasil.json           # gagal (exit 1) bila ada regresi
+
+Database uji dibuat sekali per ukuran & tanggal lewat generate_data.py dan dipakai ulang. Scan
+dijalankan pada salinan database agar hasil antar-run tetap sebanding.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import kantin_db  # noqa: E402
+import kantin_laporan  # noqa: E402
+from generate_data import buat_data  # noqa: E402
+from generate_frames import buat_frame  # noqa: E402
+
+UKURAN = {
+    "kecil": dict(jumlah_departemen=5, jumlah_staf=200, jumlah_hari=30),
+    "sedang": dict(jumlah_departemen=10, jumlah_staf=2_000, jumlah_hari=90),
+    "besar": dict(jumlah_departemen=20, jumlah_staf=10_000, jumlah_hari=90),
+}
+RENTANG_HARI = {"1 hari": 1, "7 hari": 7, "30 hari": 30}
+JUMLAH_SCAN = 2_000
+PEMANGGIL_SCAN = (1, 16)         # Jumlah pemanggil bersamaan (kios/lajur) per mode scan
+AMBANG_REGRESI = 0.20            # Median 20% lebih lambat dari baseline = regresi
+
+
+def ringkas(nama: str, durasi: List[float], catatan: str = "") -> Dict:
+    """Ringkas daftar durasi (detik) menjadi median/p95 dalam milidetik."""
+    urut = sorted(durasi)
+    return {
+        "nama": nama,
+        "n": len(urut),
+        "median_ms": round(statistics.median(urut) * 1000, 4),
+        "p95_ms": round(urut[min(len(urut) - 1, int(len(urut) * 0.95))] * 1000, 4),
+        "catatan": catatan,
+    }
+
+
+def ukur(fungsi: Callable[[], object], ulang: int, pemanasan: int = 1) -> List[float]:
+    for _ in range(pemanasan):
+        fungsi()
+    durasi = []
+    for _ in range(ulang):
+        mulai = time.perf_counter()
+        fungsi()
+        durasi.append(time.perf_counter() - mulai)
+    return durasi
+
+
+# --- KASUS BENCHMARK ---
+
+def bench_laporan(ulang: int) -> List[Dict]:
+    hasil = []
+    durasi = ukur(kantin_laporan.get_jatah_harian_staf, ulang)
+    hasil.append(ringkas("get_jatah_harian_staf", durasi))
+
+    hari_ini = date.today()
+    for label, hari in RENTANG_HARI.items():
+        awal = hari_ini - timedelta(days=hari - 1)
+        baris = len(kantin_laporan.get_all_transaksi(None, awal, hari_ini))
+        durasi = ukur(lambda: kantin_laporan.get_all_transaksi(None, awal, hari_ini), ulang)
+        hasil.append(ringkas(f"get_all_transaksi {label}", durasi, f"{baris:,} baris"))
+
+    awal = hari_ini - timedelta(days=29)
+    durasi = ukur(lambda: kantin_laporan.get_halaman_transaksi(None, awal, hari_ini, page_size=50), ulang)
+    hasil.append(ringkas("get_halaman_transaksi 30 hari", durasi, "halaman pertama, 50 baris"))
+    durasi = ukur(lambda: kantin_laporan.hitung_transaksi(None, awal, hari_ini), ulang)
+    hasil.append(ringkas("hitung_transaksi 30 hari", durasi))
+    return hasil + bench_laporan_duckdb(ulang)
+
+
+def bench_laporan_duckdb(ulang: int) -> List[Dict]:
+    """Kasus laporan berat yang sama lewat mesin analitik DuckDB (dilewati bila tidak tersedia)."""
+    import kantin_analitik
+
+    if not kantin_analitik.tersedia():
+        print("Benchmark DuckDB dilewati: mesin analitik tidak tersedia.", file=sys.stderr)
+        return []
+    hasil = []
+    hari_ini = date.today()
+    mesin_semula = kantin_laporan.MESIN_ANALITIK
+    kantin_laporan.MESIN_ANALITIK = "duckdb"
+    try:
+        durasi = ukur(kantin_laporan.get_jatah_harian_staf, ulang)
+        hasil.append(ringkas("get_jatah_harian_staf (duckdb)", durasi))
+        for label, hari in RENTANG_HARI.items():
+            awal = hari_ini - timedelta(days=hari - 1)
+            durasi = ukur(lambda: kantin_laporan.get_all_transaksi(None, awal, hari_ini), ulang)
+            hasil.append(ringkas(f"get_all_transaksi {label} (duckdb)", durasi))
+    finally:
+        kantin_laporan.MESIN_ANALITIK = mesin_semula
+    return hasil
+
+
+def bench_scan(db_file: str, jumlah: int, folder: str) -> List[Dict]:
+    """Latensi proses_scan per panggilan, dengan dan tanpa group commit, pada salinan database.
+
+    Tiap mode dijalankan dengan 1 pemanggil dan dengan beberapa pemanggil bersamaan (PEMANGGIL_SCAN),
+    karena group commit hanya bisa menggabungkan scan yang datang bersamaan.
+    """
+    with kantin_db.get_db_connection() as conn:
+        barcode = [row[0] for row in conn.execute(
+            f"SELECT barcode_id FROM staf WHERE departemen_id != {kantin_db.SQL_ID_DEPARTEMEN}",
+            (kantin_db.ADMIN_DEPARTEMEN_NAME,)
+        )]
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    hasil = []
+    group_commit_semula = kantin_db.GROUP_COMMIT
+    try:
+        for group_commit in (True, False):
+            for pemanggil in PEMANGGIL_SCAN:
+                salinan = os.path.join(folder, "scan.db")
+                shutil.copyfile(db_file, salinan)
+                kantin_db.DB_FILE = salinan
+                kantin_db.GROUP_COMMIT = group_commit
+
+                durasi: List[float] = []
+
+                def kerja(seed: int):
+                    rng = random.Random(seed)
+                    for _ in range(jumlah // pemanggil):
+                        barcode_id = rng.choice(barcode)
+                        mulai = time.perf_counter()
+                        kantin_db.proses_scan(barcode_id)
+                        durasi.append(time.perf_counter() - mulai)
+
+                mulai_total = time.perf_counter()
+                thread = [threading.Thread(target=kerja, args=(7 + i,)) for i in range(pemanggil)]
+                for t in thread:
+                    t.start()
+                for t in thread:
+                    t.join()
+                if group_commit:
+                    kantin_db.get_scan_writer().flush()
+                total = time.perf_counter() - mulai_total
+
+                mode = "group commit" if group_commit else "langsung"
+                if pemanggil > 1:
+                    mode += f", {pemanggil} pemanggil"
+                hasil.append(ringkas(f"proses_scan ({mode})", durasi, f"{len(durasi) / total:,.0f} scan/detik"))
+                kantin_db.stop_scan_writer()
+                kantin_db.close_pool()
+                kantin_db.direktori_staf().close()
+    finally:
+        kantin_db.GROUP_COMMIT = group_commit_semula
+        kantin_db.DB_FILE = db_file
+    return hasil
+
+
+def _muat_frame(path: Optional[str], jumlah: int):
+    """Frame rekaman (.npz berisi array `frames` uint8 [n, tinggi, lebar]) atau frame 720p berisi barcode sungguhan."""
+    import numpy as np
+
+    if path:
+        return list(np.load(path)["frames"])
+    return list(buat_frame(min(jumlah, 30)))
+
+
+def _frame_derau(jumlah: int):
+    """Derau tanpa barcode: kasus terburuk, pass murah gagal lalu fallback resolusi penuh."""
+    import numpy as np
+
+    rng = np.random.default_rng(3)
+    return [rng.integers(0, 256, size=(720, 1280), dtype=np.uint8) for _ in range(jumlah)]
+
+
+def bench_kamera(path_frame: Optional[str], ulang: int) -> List[Dict]:
+    try:
+        import av
+        from kantin_scanner import BarcodeProcessor, DecodeConfig, decode_luma
+    except ImportError as e:
+        print(f"Benchmark kamera dilewati: {e}", file=sys.stderr)
+        return []
+
+    frames_gray = _muat_frame(path_frame, ulang)
+    frames = [av.VideoFrame.from_ndarray(g, format="gray").reformat(format="yuv420p") for g in frames_gray]
+    sumber = f"{len(frames)} frame {'rekaman' if path_frame else 'barcode'} {frames_gray[0].shape[1]}x{frames_gray[0].shape[0]}"
+
+    processor = BarcodeProcessor(hub=None)
+    processor.last_scan_time = 0
+    durasi = []
+    for i in range(ulang * processor.config.frame_stride):
+        frame = frames[i % len(frames)]
+        mulai = time.perf_counter()
+        processor.recv(frame)
+        durasi.append(time.perf_counter() - mulai)
+    processor.on_ended()
+
+    config = DecodeConfig()
+    durasi_decode = ukur(lambda: [decode_luma(g, config) for g in frames_gray], max(1, ulang // len(frames_gray)))
+    terbaca = sum(1 for g in frames_gray if decode_luma(g, config))
+    derau = _frame_derau(10)
+    durasi_derau = ukur(lambda: [decode_luma(g, config) for g in derau], max(1, ulang // len(derau)))
+    return [
+        ringkas("BarcodeProcessor.recv", durasi, sumber),
+        ringkas("decode_luma per frame", [d / len(frames_gray) for d in durasi_decode],
+                f"{sumber}, {terbaca} terbaca"),
+        ringkas("decode_luma per frame (derau)", [d / len(derau) for d in durasi_derau], "10 frame tanpa barcode 1280x720"),
+    ]
+
+
+# --- LAPORAN ---
+
+def cetak(hasil: List[Dict], baseline: Optional[Dict[str, Dict]] = None, ambang: float = AMBANG_REGRESI) -> List[str]:
+    """Cetak tabel hasil; kembalikan nama kasus yang mengalami regresi terhadap baseline."""
+    regresi = []
+    print(f"{'kasus':<42} {'n':>6} {'median ms':>11} {'p95 ms':>10} {'vs baseline':>12}  catatan")
+    for h in hasil:
+        banding = ""
+        lama = (baseline or {}).get(h["nama"])
+        if lama and lama["median_ms"] > 0:
+            rasio = h["median_ms"] / lama["median_ms"] - 1
+            banding = f"{rasio:+.0%}"
+            if rasio > ambang:
+                banding += " !"
+                regresi.append(h["nama"])
+        print(f"{h['nama']:<42} {h['n']:>6} {h['median_ms']:>11.3f} {h['p95_ms']:>10.3f} {banding:>12}  {h['catatan']}")
+    return regresi
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ukuran", choices=list(UKURAN), default="sedang")
+    parser.add_argument("--folder", default=os.path.join(tempfile.gettempdir(), "kantin_bench"),
+                        help="Tempat database uji disimpan dan dipakai ulang.")
+    parser.add_argument("--ulang", type=int, default=5, help="Jumlah pengulangan per kasus laporan.")
+    parser.add_argument("--scan", type=int, default=JUMLAH_SCAN, help="Jumlah scan per mode.")
+    parser.add_argument("--tunda", type=float, default=kantin_db.GROUP_COMMIT_MAKS_TUNDA,
+                        help="GROUP_COMMIT_MAKS_TUNDA (detik) untuk mode group commit.")
+    parser.add_argument("--frames", help="File .npz berisi frame grayscale rekaman (array 'frames').")
+    parser.add_argument("--lewati", nargs="*", default=[], choices=["laporan", "scan", "kamera"])
+    parser.add_argument("--simpan", help="Tulis hasil ke file JSON (untuk baseline).")
+    parser.add_argument("--bandingkan", help="File JSON hasil sebelumnya sebagai baseline.")
+    parser.add_argument("--ambang", type=float, default=AMBANG_REGRESI,
+                        help="Kenaikan median (0.2 = 20%%) yang dianggap regresi.")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.folder, exist_ok=True)
+    db_file = os.path.join(args.folder, f"kantin_{args.ukuran}_{date.today()}.db")
+    if not os.path.exists(db_file):
+        print(f"Membuat data uji '{args.ukuran}' di {db_file} ...", file=sys.stderr)
+        jumlah_staf, jumlah_transaksi = buat_data(db_file, **UKURAN[args.ukuran])
+        print(f"  {jumlah_staf:,} staf, {jumlah_transaksi:,} transaksi", file=sys.stderr)
+    kantin_db.DB_FILE = db_file
+    kantin_db.CACHE_AKTIF = False    # Ukur query sebenarnya, bukan hit cache
+    kantin_db.GROUP_COMMIT_MAKS_TUNDA = args.tunda
+    kantin_db.init_db()
+
+    hasil: List[Dict] = []
+    if "laporan" not in args.lewati:
+        hasil += bench_laporan(args.ulang)
+    if "kamera" not in args.lewati:
+        hasil += bench_kamera(args.frames, 100)
+    if "scan" not in args.lewati:
+        hasil += bench_scan(db_file, args.scan, args.folder)
+
+    baseline = None
+    if args.bandingkan:
+        with open(args.bandingkan, encoding="utf-8") as f:
+            baseline = {h["nama"]: h for h in json.load(f)["hasil"]}
+    print(f"\nUkuran: {args.ukuran} ({os.path.basename(db_file)})")
+    regresi = cetak(hasil, baseline, args.ambang)
+
+    if args.simpan:
+        with open(args.simpan, "w", encoding="utf-8") as f:
+            json.dump({"ukuran": args.ukuran, "tanggal": str(date.today()), "hasil": hasil}, f, indent=2)
+    if regresi:
+        print(f"\nRegresi (> {args.ambang:.0%} lebih lambat): {', '.join(regresi)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
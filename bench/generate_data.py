@@ -0,0 +1,96 @@
+"""Buat database uji berskala besar: departemen, staf, dan riwayat transaksi sintetis.
+
+    python bench/generate_data.py --db /tmp/kantin_besar.db --staf 10000 --hari 90
+    python bench/generate_data.py --db /tmp/kantin_kecil.db --departemen 5 --staf 200 --hari 7 --tolak 0.2
+
+Setiap staf makan sesuai jatahnya hampir setiap hari pada jam makan; sebagian scan ditolak
+(`--tolak`, scan ulang setelah jatah habis). Semua insert memakai executemany dalam satu
+transaksi per hari, sehingga trigger kuota_harian/rekap_harian ikut terisi. Tidak pernah
+menyentuh kantin_staf.db kecuali diminta lewat --db.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kantin_db  # noqa: E402
+
+# Jam makan: (jam mulai, lama dalam menit, bobot)
+JAM_MAKAN = ((6, 90, 0.15), (11, 150, 0.6), (17, 120, 0.2), (22, 120, 0.05))
+PELUANG_HADIR = 0.9
+
+
+def _waktu_makan(rng: random.Random, hari: date) -> datetime:
+    jam, menit, _ = rng.choices(JAM_MAKAN, weights=[b for *_, b in JAM_MAKAN])[0]
+    return datetime.combine(hari, datetime.min.time()) + timedelta(hours=jam, minutes=rng.uniform(0, menit))
+
+
+def buat_data(db_file: str, jumlah_departemen: int = 8, jumlah_staf: int = 1000, jumlah_hari: int = 30,
+              rasio_tolak: float = 0.05, seed: int = 42, sampai: Optional[date] = None) -> Tuple[int, int]:
+    """Isi `db_file` (skema lewat init_db). Mengembalikan (jumlah staf, jumlah transaksi) yang ditulis."""
+    rng = random.Random(seed)
+    sampai = sampai or date.today()
+    kantin_db.DB_FILE = db_file
+    kantin_db.init_db()
+
+    departemen = [f"Departemen {i:02d}" for i in range(1, jumlah_departemen + 1)]
+    staf: List[Tuple[str, str, str, int]] = [
+        (f"S{i:06d}", f"Staf {i:06d}", rng.choice(departemen), rng.choices((1, 2), weights=(0.8, 0.2))[0])
+        for i in range(1, jumlah_staf + 1)
+    ]
+    with kantin_db.get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT OR IGNORE INTO departemen (nama_departemen) VALUES (?)", [(d,) for d in departemen])
+        conn.executemany(f"""
+            INSERT OR IGNORE INTO staf (barcode_id, nama, departemen_id, jatah_harian)
+            VALUES (?, ?, {kantin_db.SQL_ID_DEPARTEMEN}, ?)
+        """, staf)
+        conn.commit()
+
+        total = 0
+        for offset in range(jumlah_hari - 1, -1, -1):
+            hari = sampai - timedelta(days=offset)
+            baris = []
+            for barcode_id, _, _, jatah in staf:
+                if rng.random() > PELUANG_HADIR:
+                    continue
+                baris.extend((barcode_id, kantin_db.ke_epoch(_waktu_makan(rng, hari)), 1) for _ in range(jatah))
+                if rng.random() < rasio_tolak:
+                    baris.append((barcode_id, kantin_db.ke_epoch(_waktu_makan(rng, hari)), 0))
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(kantin_db.SQL_TAMBAH_TRANSAKSI, baris)
+            conn.commit()
+            total += len(baris)
+        conn.execute("ANALYZE")
+    kantin_db.direktori_staf().invalidate()
+    return len(staf), total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="File database tujuan (dibuat bila belum ada).")
+    parser.add_argument("--departemen", type=int, default=8)
+    parser.add_argument("--staf", type=int, default=1000)
+    parser.add_argument("--hari", type=int, default=30, help="Jumlah hari riwayat sampai hari ini.")
+    parser.add_argument("--tolak", type=float, default=0.05, help="Peluang scan ulang yang ditolak per staf per hari.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if os.path.abspath(args.db) == os.path.abspath(kantin_db.DB_FILE):
+        parser.error(f"Menolak menulis data uji ke database aplikasi ({kantin_db.DB_FILE}).")
+
+    mulai = time.perf_counter()
+    jumlah_staf, jumlah_transaksi = buat_data(
+        args.db, args.departemen, args.staf, args.hari, args.tolak, args.seed
+    )
+    print(f"{jumlah_staf:,} staf, {jumlah_transaksi:,} transaksi -> {args.db} "
+          f"({time.perf_counter() - mulai:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Buat frame kamera uji berisi barcode Code 128 sungguhan untuk benchmark jalur decode.
+
+    python bench/generate_frames.py --keluar /tmp/frame_barcode.npz --jumlah 30
+    python bench/benchmark.py --frames /tmp/frame_barcode.npz
+
+Setiap frame grayscale 720p berisi satu kartu putih dengan barcode ID staf, pada posisi, ukuran
+modul, kontras, blur, dan derau sensor yang berbeda-beda; sebagian kartu sengaja di luar ROI tengah
+sehingga fallback resolusi penuh ikut terukur. Hasilnya deterministik untuk `--seed` yang sama.
+"""
+import argparse
+import os
+from typing import List, Sequence
+
+import numpy as np
+
+# Pola lebar garis/spasi Code 128 per nilai simbol 0-106 (106 = stop)
+POLA_CODE128 = (
+    "212222", "222122", "222221", "121223", "121322", "131222", "122213", "122312", "132212", "221213",
+    "221312", "231212", "112232", "122132", "122231", "113222", "123122", "123221", "223211", "221132",
+    "221231", "213212", "223112", "312131", "311222", "321122", "321221", "312212", "322112", "322211",
+    "212123", "212321", "232121", "111323", "131123", "131321", "112313", "132113", "132311", "211313",
+    "231113", "231311", "112133", "112331", "132131", "113123", "113321", "133121", "313121", "211331",
+    "231131", "213113", "213311", "213131", "311123", "311321", "331121", "312113", "312311", "332111",
+    "314111", "221411", "431111", "111224", "111422", "121124", "121421", "141122", "141221", "112214",
+    "112412", "122114", "122411", "142112", "142211", "241211", "221114", "413111", "241112", "134111",
+    "111242", "121142", "121241", "114212", "124112", "124211", "411212", "421112", "421211", "212141",
+    "214121", "412121", "111143", "111341", "131141", "114113", "114311", "411113", "411311", "113141",
+    "114131", "311141", "411131", "211412", "211214", "211232", "2331112",
+)
+START_B = 104
+STOP = 106
+ZONA_SEPI = 10                   # Modul kosong di kiri/kanan barcode (minimum standar)
+ID_CONTOH = ("1001A", "2002B", "3003C", "C1001", "A1004", "9999Z")
+
+
+def modul_code128(teks: str) -> np.ndarray:
+    """Barcode Code 128 (set B) sebagai array 1D modul: 1 = garis, 0 = spasi, termasuk zona sepi."""
+    nilai = [ord(c) - 32 for c in teks]
+    if any(not 0 <= v < 95 for v in nilai):
+        raise ValueError(f"'{teks}' berisi karakter di luar Code 128 set B.")
+    checksum = (START_B + sum(i * v for i, v in enumerate(nilai, start=1))) % 103
+    modul: List[int] = [0] * ZONA_SEPI
+    for simbol in [START_B, *nilai, checksum, STOP]:
+        for i, lebar in enumerate(POLA_CODE128[simbol]):
+            modul += [1 - i % 2] * int(lebar)
+    return np.array(modul + [0] * ZONA_SEPI, dtype=np.uint8)
+
+
+def _blur(gray: np.ndarray, radius: int) -> np.ndarray:
+    """Box blur terpisah (horizontal lalu vertikal) untuk meniru fokus kamera yang kurang tajam."""
+    if radius <= 0:
+        return gray
+    kernel = np.ones(2 * radius + 1, dtype=np.float32) / (2 * radius + 1)
+    hasil = gray.astype(np.float32)
+    for sumbu in (1, 0):
+        hasil = np.apply_along_axis(np.convolve, sumbu, hasil, kernel, mode="same")
+    return hasil
+
+
+def buat_frame(jumlah: int = 30, daftar_id: Sequence[str] = ID_CONTOH, lebar: int = 1280, tinggi: int = 720,
+               seed: int = 3) -> np.ndarray:
+    """Array uint8 [jumlah, tinggi, lebar]; setiap frame berisi satu barcode dari `daftar_id`."""
+    rng = np.random.default_rng(seed)
+    frames = np.empty((jumlah, tinggi, lebar), dtype=np.uint8)
+    yy, xx = np.mgrid[0:tinggi, 0:lebar]
+    for n in range(jumlah):
+        # Latar: gradien pencahayaan + tekstur kasar per blok 8x8
+        tekstur = rng.normal(0, 6, size=(tinggi // 8 + 1, lebar // 8 + 1)).repeat(8, 0).repeat(8, 1)
+        latar = 60 + 60 * (xx / lebar) + 30 * (yy / tinggi) + tekstur[:tinggi, :lebar]
+
+        modul = modul_code128(daftar_id[n % len(daftar_id)])
+        lebar_modul = int(rng.integers(2, 5))
+        tinggi_bar = int(rng.integers(60, 160))
+        bar = np.repeat(modul, lebar_modul)
+        pad = 20
+        kartu_w, kartu_h = len(bar) + 2 * pad, tinggi_bar + 2 * pad
+        # Sebagian besar kartu di area tengah (pass murah berhasil), sekitar 1 dari 4 di tepi frame
+        if rng.random() < 0.75:
+            x0 = int(rng.integers(lebar * 0.3, lebar * 0.7 - kartu_w)) if lebar * 0.4 > kartu_w else (lebar - kartu_w) // 2
+            y0 = int(rng.integers(tinggi * 0.3, tinggi * 0.7 - kartu_h)) if tinggi * 0.4 > kartu_h else (tinggi - kartu_h) // 2
+        else:
+            x0 = int(rng.integers(0, lebar * 0.15))
+            y0 = int(rng.integers(0, tinggi - kartu_h))
+
+        terang, gelap = rng.uniform(170, 240), rng.uniform(15, 70)
+        kartu = np.full((kartu_h, kartu_w), terang, dtype=np.float32)
+        kartu[pad:pad + tinggi_bar, pad:pad + len(bar)] = np.where(bar == 1, gelap, terang)
+        latar[y0:y0 + kartu_h, x0:x0 + kartu_w] = kartu
+
+        # Blur hanya bila modul cukup lebar; modul 2 piksel yang di-blur terlalu kabur untuk dibaca
+        gambar = _blur(latar, int(rng.integers(0, 2)) if lebar_modul >= 3 else 0)
+        gambar = gambar + rng.normal(0, rng.uniform(2, 6), size=gambar.shape)
+        frames[n] = np.clip(gambar, 0, 255).astype(np.uint8)
+    return frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keluar", required=True, help="File .npz tujuan (array 'frames').")
+    parser.add_argument("--jumlah", type=int, default=30)
+    parser.add_argument("--id", nargs="*", default=list(ID_CONTOH), help="ID staf yang di-encode.")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    frames = buat_frame(args.jumlah, args.id, seed=args.seed)
+    np.savez_compressed(args.keluar, frames=frames)
+    print(f"{len(frames)} frame {frames.shape[2]}x{frames.shape[1]} -> {os.path.abspath(args.keluar)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""Mesin analitik opsional berbasis DuckDB (kolumnar) untuk laporan admin.
+
+Aktif bila `kantin_laporan.MESIN_ANALITIK = "duckdb"` dan paket duckdb terpasang; selain itu laporan
+tetap memakai SQLite. DuckDB membaca kantin_staf.db langsung (ekstensi sqlite, read-only), partisi
+arsip, dan riwayat Parquet di folder arsip. Semua filter, join dan agregasi dijalankan di DuckDB;
+hasilnya DataFrame ber-dtype Arrow, tanpa konversi baris per baris di Python.
+
+    pip install duckdb
+    python kantin_analitik.py --parquet        # salin setiap partisi arsip ke transaksi_YYYY_MM.parquet
+
+Ekstensi sqlite diunduh otomatis oleh DuckDB saat pertama dipakai. Untuk kiosk tanpa internet,
+jalankan sekali `INSTALL sqlite` dari mesin yang sama saat masih terhubung.
+"""
+import argparse
+import os
+import re
+import threading
+from datetime import date
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:              # Opsional: tanpa duckdb laporan tetap memakai SQLite
+    duckdb = None
+
+import kantin_db
+from kantin_arsip import Bulan, daftar_partisi, file_partisi, folder_arsip
+from kantin_db import ADMIN_DEPARTEMEN_NAME, logger, rentang_waktu
+from kantin_laporan import KOLOM_JATAH_HARIAN, KOLOM_TRANSAKSI, SEMUA_DEPARTEMEN
+
+ALIAS_DB = "kantin"              # Nama katalog kantin_staf.db di DuckDB
+POLA_FILE_PARQUET = re.compile(r"^transaksi_(\d{4})_(\d{2})\.parquet$")
+
+
+# --- KONEKSI DUCKDB (SATU PER PROSES) ---
+
+_lock = threading.Lock()
+_koneksi = None
+_koneksi_db_file: Optional[str] = None
+_galat: Optional[str] = None     # Alasan DuckDB tidak dapat dipakai; dicatat sekali per proses
+
+
+def _literal(teks: str) -> str:
+    """String SQL ber-kutip untuk perintah yang tidak menerima parameter (ATTACH, COPY)."""
+    return "'" + teks.replace("'", "''") + "'"
+
+
+def _kursor():
+    """Kursor baru dari koneksi DuckDB bersama; database utama di-ATTACH ulang bila DB_FILE berganti."""
+    global _koneksi, _koneksi_db_file
+    with _lock:
+        if _koneksi is None or _koneksi_db_file != kantin_db.DB_FILE:
+            if _koneksi is not None:
+                _koneksi.close()
+                _koneksi = None
+            conn = duckdb.connect()
+            try:
+                conn.execute(f"ATTACH {_literal(kantin_db.DB_FILE)} AS {ALIAS_DB} (TYPE sqlite, READ_ONLY)")
+            except Exception:
+                conn.close()
+                raise
+            _koneksi, _koneksi_db_file = conn, kantin_db.DB_FILE
+        # Satu kursor per pemanggilan: koneksi DuckDB tidak boleh dipakai bersamaan oleh beberapa thread
+        return _koneksi.cursor()
+
+
+def tersedia() -> bool:
+    """True bila DuckDB terpasang dan dapat membuka database; bila tidak, catat alasannya sekali."""
+    global _galat
+    if _galat is not None:
+        return False
+    if duckdb is None:
+        _galat = "paket duckdb tidak terpasang"
+    else:
+        try:
+            _kursor().close()
+            return True
+        except Exception as e:
+            _galat = str(e)
+    logger.warning("Mesin analitik DuckDB tidak dapat dipakai (%s); laporan memakai SQLite.", _galat)
+    return False
+
+
+def _ke_frame(hasil) -> pd.DataFrame:
+    """Hasil query -> DataFrame ber-dtype Arrow (tanpa salinan ke NumPy object)."""
+    # to_arrow_table() menggantikan fetch_arrow_table() sejak duckdb 1.4
+    ambil = getattr(hasil, "to_arrow_table", None) or hasil.fetch_arrow_table
+    return ambil().to_pandas(types_mapper=pd.ArrowDtype)
+
+
+# --- SUMBER TRANSAKSI: TABEL UTAMA + ARSIP (PARQUET ATAU PARTISI SQLITE) ---
+
+def file_parquet(bulan: Bulan) -> str:
+    return os.path.join(folder_arsip(), f"transaksi_{bulan[0]:04d}_{bulan[1]:02d}.parquet")
+
+
+def daftar_parquet() -> List[Bulan]:
+    """Semua bulan yang memiliki riwayat Parquet di folder arsip, terlama dulu."""
+    try:
+        nama_file = os.listdir(folder_arsip())
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (int(cocok.group(1)), int(cocok.group(2)))
+        for cocok in map(POLA_FILE_PARQUET.match, nama_file) if cocok
+    )
+
+
+def _waktu_partisi(bulan: Bulan) -> float:
+    """mtime terbaru file partisi SQLite bulan ini (termasuk -wal), 0 bila tidak ada."""
+    path = file_partisi(bulan)
+    return max((os.path.getmtime(p) for p in (path, path + "-wal") if os.path.exists(p)), default=0.0)
+
+
+def parquet_terkini(bulan: Bulan) -> bool:
+    """True bila Parquet bulan ini ada dan tidak lebih tua dari partisinya.
+
+    Partisi bisa berubah setelah diekspor (pembersihan staf terhapus, migrasi format); Parquet yang
+    tertinggal diabaikan sampai diekspor ulang, agar baris yang sudah dihapus tidak muncul lagi.
+    """
+    try:
+        return os.path.getmtime(file_parquet(bulan)) >= _waktu_partisi(bulan)
+    except FileNotFoundError:
+        return False
+
+
+def _sumber_transaksi(start_date=None, end_date=None) -> Tuple[str, list]:
+    """Relasi UNION ALL transaksi untuk rentang tanggal, dengan parameternya.
+
+    Bulan arsip dibaca dari Parquet bila terkini (kolumnar, terkompresi), selain itu dari file partisi.
+    waktu_transaksi selalu detik epoch (BIGINT) seperti di SQLite; Parquet menyimpannya sebagai TIMESTAMP.
+    """
+    awal = date.fromisoformat(str(start_date)).replace(day=1) if start_date else None
+    akhir = date.fromisoformat(str(end_date)).replace(day=1) if end_date else None
+    bagian = [f"SELECT barcode_id, waktu_transaksi, status_valid FROM {ALIAS_DB}.transaksi"]
+    params = []
+    for bulan in sorted(set(daftar_partisi()) | set(daftar_parquet())):
+        if (awal and date(*bulan, 1) < awal) or (akhir and date(*bulan, 1) > akhir):
+            continue
+        parquet = file_parquet(bulan)
+        if parquet_terkini(bulan):
+            bagian.append(
+                "SELECT barcode_id, epoch_ms(waktu_transaksi) // 1000 AS waktu_transaksi, status_valid FROM read_parquet(?)"
+            )
+            params.append(parquet)
+        else:
+            bagian.append("SELECT barcode_id, waktu_transaksi, status_valid FROM sqlite_scan(?, 'transaksi')")
+            params.append(file_partisi(bulan))
+    return "(" + " UNION ALL ".join(bagian) + ")", params
+
+
+def _filter_transaksi(departemen_filter=None, start_date=None, end_date=None, tanpa_admin=False):
+    """Klausa WHERE & parameter (sintaks DuckDB) untuk transaksi T JOIN staf S LEFT JOIN departemen D."""
+    where_clauses = ["S.dihapus_pada IS NULL"]
+    params = []
+    if departemen_filter and departemen_filter != SEMUA_DEPARTEMEN:
+        where_clauses.append("D.nama_departemen = ?")
+        params.append(departemen_filter)
+    elif tanpa_admin:
+        where_clauses.append("D.nama_departemen IS DISTINCT FROM ?")
+        params.append(ADMIN_DEPARTEMEN_NAME)
+
+    waktu_awal, waktu_akhir = rentang_waktu(start_date, end_date)
+    if waktu_awal:
+        where_clauses.append("T.waktu_transaksi >= ?")
+        params.append(waktu_awal)
+    if waktu_akhir:
+        where_clauses.append("T.waktu_transaksi < ?")
+        params.append(waktu_akhir)
+    return " WHERE " + " AND ".join(where_clauses), params
+
+
+# --- LAPORAN (PADANAN FUNGSI kantin_laporan) ---
+
+def get_all_transaksi(departemen_filter=None, start_date=None, end_date=None, tanpa_admin=False) -> pd.DataFrame:
+    sumber, params_sumber = _sumber_transaksi(start_date, end_date)
+    where_sql, params = _filter_transaksi(departemen_filter, start_date, end_date, tanpa_admin)
+    with _kursor() as cur:
+        df = _ke_frame(cur.execute(f"""
+            SELECT make_timestamp(T.waktu_transaksi * 1000000) AS "Waktu", S.nama AS "Nama Staf",
+                   D.nama_departemen AS "Departemen", T.barcode_id AS "ID Barcode",
+                   CASE WHEN T.status_valid = 1 THEN 'VALID' ELSE 'BATAS (Ditolak)' END AS "Status"
+            FROM {sumber} AS T
+            JOIN {ALIAS_DB}.staf AS S ON T.barcode_id = S.barcode_id
+            LEFT JOIN {ALIAS_DB}.departemen AS D ON D.id = S.departemen_id
+            {where_sql}
+            ORDER BY T.waktu_transaksi DESC
+        """, params_sumber + params))
+    return df[KOLOM_TRANSAKSI]
+
+
+def hitung_transaksi(departemen_filter=None, start_date=None, end_date=None):
+    sumber, params_sumber = _sumber_transaksi(start_date, end_date)
+    where_sql, params = _filter_transaksi(departemen_filter, start_date, end_date, tanpa_admin=True)
+    with _kursor() as cur:
+        total, valid = cur.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(CAST(T.status_valid = 1 AS INTEGER)), 0)
+            FROM {sumber} AS T
+            JOIN {ALIAS_DB}.staf AS S ON T.barcode_id = S.barcode_id
+            LEFT JOIN {ALIAS_DB}.departemen AS D ON D.id = S.departemen_id
+            {where_sql}
+        """, params_sumber + params).fetchone()
+    return {'total': int(total), 'valid': int(valid), 'ditolak': int(total - valid)}
+
+
+def get_jatah_harian_staf(departemen_filter=None, tanpa_admin=False) -> pd.DataFrame:
+    where_clauses, params = ["S.dihapus_pada IS NULL"], [date.today().isoformat()]
+    if departemen_filter and departemen_filter != SEMUA_DEPARTEMEN:
+        where_clauses.append("D.nama_departemen = ?")
+        params.append(departemen_filter)
+    elif tanpa_admin:
+        where_clauses.append("D.nama_departemen IS DISTINCT FROM ?")
+        params.append(ADMIN_DEPARTEMEN_NAME)
+    where_sql = " WHERE " + " AND ".join(where_clauses)
+
+    with _kursor() as cur:
+        df = _ke_frame(cur.execute(f"""
+            WITH J AS (
+                SELECT S.nama, D.nama_departemen AS departemen, S.barcode_id, S.jatah_harian,
+                       COALESCE(K.jumlah_ambil, 0) AS sudah_ambil
+                FROM {ALIAS_DB}.staf AS S
+                LEFT JOIN {ALIAS_DB}.departemen AS D ON D.id = S.departemen_id
+                LEFT JOIN {ALIAS_DB}.kuota_harian AS K
+                    ON K.barcode_id = S.barcode_id AND K.tanggal = ?
+                {where_sql}
+            )
+            SELECT nama AS "Nama Staf", departemen AS "Departemen", barcode_id AS "ID Barcode",
+                   jatah_harian AS "Jatah Harian", sudah_ambil AS "Sudah Diambil",
+                   jatah_harian - sudah_ambil AS "Sisa Jatah",
+                   CASE WHEN jatah_harian - sudah_ambil <= 0 THEN 'Selesai' ELSE 'Tersedia' END AS "Status"
+            FROM J
+            ORDER BY nama
+        """, params))
+    return df[KOLOM_JATAH_HARIAN]
+
+
+# --- RIWAYAT PARQUET ---
+
+def ekspor_parquet(bulan: Bulan) -> int:
+    """Salin partisi arsip `bulan` ke Parquet (zstd) di sampingnya. Mengembalikan jumlah baris.
+
+    File ditulis ke nama sementara lalu di-rename, sehingga query tidak pernah membaca Parquet setengah jadi.
+    File partisi SQLite dibiarkan; selama Parquet terkini (lihat parquet_terkini), mesin DuckDB membaca Parquet.
+    """
+    tujuan = file_parquet(bulan)
+    sementara = tujuan + ".tmp"
+    # mtime Parquet = mtime partisi sebelum dibaca: perubahan selama ekspor membuatnya langsung dianggap usang
+    waktu_sumber = _waktu_partisi(bulan)
+    with _kursor() as cur:
+        cur.execute(f"""
+            COPY (
+                SELECT id, barcode_id, make_timestamp(waktu_transaksi * 1000000) AS waktu_transaksi, status_valid
+                FROM sqlite_scan({_literal(file_partisi(bulan))}, 'transaksi')
+                ORDER BY waktu_transaksi
+            ) TO {_literal(sementara)} (FORMAT parquet, COMPRESSION zstd)
+        """)
+        jumlah = cur.execute("SELECT COUNT(*) FROM read_parquet(?)", [sementara]).fetchone()[0]
+    os.utime(sementara, (waktu_sumber, waktu_sumber))
+    os.replace(sementara, tujuan)
+    return jumlah
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesin analitik DuckDB untuk laporan kantin.")
+    parser.add_argument("--db", default=kantin_db.DB_FILE, help="File database utama.")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Salin partisi arsip yang belum punya Parquet atau Parquet-nya usang.")
+    args = parser.parse_args(argv)
+
+    kantin_db.DB_FILE = args.db
+    kantin_db.init_db()    # Partisi arsip format lama dikonversi dulu sebelum dibaca DuckDB
+    if not tersedia():
+        raise SystemExit(f"DuckDB tidak dapat dipakai: {_galat}")
+    if args.parquet:
+        for bulan in daftar_partisi():
+            if not parquet_terkini(bulan):
+                print(f"{bulan[0]:04d}-{bulan[1]:02d}: {ekspor_parquet(bulan):,} baris -> {file_parquet(bulan)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Titik masuk scan tanpa Streamlit untuk scanner USB/keyboard-wedge dan uji beban.
+
+Menjalankan logika yang sama dengan halaman Scanner (`kantin_db.proses_scan`): cari staf,
+deteksi admin, cek kuota, catat transaksi.
+
+    python kantin_api.py                       # HTTP di 127.0.0.1:8502
+    python kantin_api.py --port 9000 --db /data/kantin_staf.db
+    python kantin_api.py --stdin               # satu ID per baris (scanner yang "mengetik" + Enter)
+
+HTTP (scan hanya lewat POST ber-Content-Type application/json, sehingga halaman lain di browser kios
+tidak bisa mencatat makan lewat link, <img> atau form):
+    POST /scan   body JSON {"barcode_id": "1001A"}
+    POST /scan/batch   body JSON {"barcode_ids": ["1001A", "2002B", ...]}  (satu transaksi)
+    GET  /health
+    GET  /metrics  (format teks Prometheus)
+"""
+import argparse
+import json
+import signal
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
+
+import kantin_arsip
+import kantin_db
+import kantin_metrik
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8502
+
+
+def scan_json(barcode_id: str) -> dict:
+    """Proses satu scan dan kembalikan hasilnya sebagai dict siap-JSON."""
+    mulai = time.perf_counter()
+    status, pesan = kantin_db.proses_scan(barcode_id)
+    return {
+        "barcode_id": barcode_id,
+        "status": status,
+        "pesan": pesan,
+        "valid": status == "Sukses",
+        "admin": status == "Sukses_Admin",
+        "durasi_ms": round((time.perf_counter() - mulai) * 1000, 3),
+    }
+
+
+def scan_batch_json(daftar_barcode: list) -> dict:
+    """Proses banyak scan dalam satu panggilan; hasil per ID dengan urutan yang sama."""
+    mulai = time.perf_counter()
+    hasil = kantin_db.proses_scan_batch(daftar_barcode)
+    return {
+        "hasil": [
+            {"barcode_id": barcode_id, "status": status, "pesan": pesan,
+             "valid": status == "Sukses", "admin": status == "Sukses_Admin"}
+            for barcode_id, (status, pesan) in zip(daftar_barcode, hasil)
+        ],
+        "durasi_ms": round((time.perf_counter() - mulai) * 1000, 3),
+    }
+
+
+class ScanHandler(BaseHTTPRequestHandler):
+    server_version = "KantinScan/1.0"
+
+    def _kirim(self, kode: int, data: dict, header: Optional[dict] = None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(kode)
+        for nama, nilai in (header or {}).items():
+            self.send_header(nama, nilai)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _proses(self, barcode_id):
+        barcode_id = (barcode_id or "").strip()
+        if not barcode_id:
+            self._kirim(400, {"status": "Gagal", "pesan": "barcode_id wajib diisi."})
+            return
+        try:
+            self._kirim(200, scan_json(barcode_id))
+        except Exception as e:
+            self._kirim(500, {"barcode_id": barcode_id, "status": "Gagal", "pesan": f"Terjadi kesalahan: {e}"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._kirim(200, {"status": "ok", "db": kantin_db.DB_FILE})
+        elif url.path == "/metrics":
+            body = kantin_metrik.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path in ("/scan", "/scan/batch"):
+            # Scan mengubah data: GET (link, prefetch, <img>) tidak boleh mencatat makan
+            self._kirim(405, {"status": "Gagal", "pesan": f"Gunakan POST untuk {url.path}."}, {"Allow": "POST"})
+        else:
+            self._kirim(404, {"status": "Gagal", "pesan": f"Path '{url.path}' tidak dikenal."})
+
+    def _proses_batch(self, daftar_barcode):
+        if not isinstance(daftar_barcode, list) or not all(isinstance(b, str) for b in daftar_barcode):
+            self._kirim(400, {"status": "Gagal", "pesan": "barcode_ids wajib berupa daftar string."})
+            return
+        daftar_barcode = [b.strip() for b in daftar_barcode if b.strip()]
+        try:
+            self._kirim(200, scan_batch_json(daftar_barcode))
+        except ValueError as e:
+            self._kirim(400, {"status": "Gagal", "pesan": str(e)})
+        except Exception as e:
+            self._kirim(500, {"status": "Gagal", "pesan": f"Terjadi kesalahan: {e}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path not in ("/scan", "/scan/batch"):
+            self._kirim(404, {"status": "Gagal", "pesan": f"Path '{url.path}' tidak dikenal."})
+            return
+        # Form HTML lintas situs hanya bisa mengirim form/text; JSON memerlukan preflight CORS yang tidak dijawab
+        if self.headers.get_content_type() != "application/json":
+            self._kirim(415, {"status": "Gagal", "pesan": "Content-Type harus application/json."})
+            return
+        panjang = int(self.headers.get("Content-Length") or 0)
+        try:
+            data = json.loads(self.rfile.read(panjang) or b"{}")
+        except ValueError:
+            self._kirim(400, {"status": "Gagal", "pesan": "Body harus berupa JSON."})
+            return
+        if not isinstance(data, dict):
+            data = {}
+        if url.path == "/scan/batch":
+            self._proses_batch(data.get("barcode_ids"))
+        else:
+            self._proses(data.get("barcode_id"))
+
+    def log_message(self, format, *args):
+        # Log per request terlalu berisik untuk scanner berkecepatan tinggi
+        pass
+
+
+def jalankan_http(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), ScanHandler)
+    # SIGTERM -> SystemExit agar handler atexit (flush ScanWriter) tetap berjalan
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"API scan kantin berjalan di http://{host}:{port} (db: {kantin_db.DB_FILE})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def jalankan_stdin():
+    """Baca satu ID per baris dari stdin, tulis satu baris JSON per hasil ke stdout."""
+    for baris in sys.stdin:
+        barcode_id = baris.strip()
+        if not barcode_id:
+            continue
+        # Galat per baris (mis. "database is locked") dilaporkan seperti handler HTTP; loop tetap berjalan
+        try:
+            hasil = scan_json(barcode_id)
+        except Exception as e:
+            hasil = {"barcode_id": barcode_id, "status": "Gagal", "pesan": f"Terjadi kesalahan: {e}"}
+        print(json.dumps(hasil, ensure_ascii=False), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API scan kantin tanpa Streamlit.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", default=kantin_db.DB_FILE, help="Lokasi file database SQLite.")
+    parser.add_argument("--stdin", action="store_true", help="Baca ID dari stdin, bukan HTTP.")
+    args = parser.parse_args(argv)
+
+    kantin_db.DB_FILE = args.db
+    kantin_db.init_db()
+    kantin_arsip.mulai_arsip_latar()
+
+    if args.stdin:
+        jalankan_stdin()
+    else:
+        jalankan_http(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
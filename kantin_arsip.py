@@ -0,0 +1,381 @@
+"""Arsip bulanan transaksi: bulan yang sudah lewat dipindah ke file `arsip/transaksi_YYYY_MM.db`.
+
+Tabel `transaksi` di database utama hanya berisi beberapa bulan terakhir (BULAN_AKTIF), sehingga
+backup, VACUUM dan query scanner tidak ikut membayar riwayat bertahun-tahun. Laporan transaksi
+memakai `partisi_dalam_rentang()` + `lampirkan()` untuk meng-ATTACH hanya partisi yang beririsan
+dengan rentang tanggal. rekap_harian (analitik) tidak berubah oleh pengarsipan.
+
+    python kantin_arsip.py                     # arsipkan semua bulan yang jatuh tempo
+    python kantin_arsip.py --bulan-aktif 6 --db /data/kantin_staf.db
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import kantin_db
+from kantin_db import SQL_KE_EPOCH, SQL_REKAP_TRANSAKSI, dari_epoch, get_db_connection, ke_epoch, logger
+
+BULAN_AKTIF = 3                  # Bulan berjalan + 2 bulan sebelumnya tetap di tabel utama
+NAMA_FOLDER_ARSIP = "arsip"
+INTERVAL_ARSIP_DETIK = 24 * 60 * 60   # Cek bulan jatuh tempo sekali sehari
+ALIAS_ARSIP = "arsip"            # Nama skema saat partisi di-ATTACH
+POLA_FILE_PARTISI = re.compile(r"^transaksi_(\d{4})_(\d{2})\.db$")
+VERSI_PARTISI = 2                # PRAGMA user_version partisi; 1 = waktu epoch, 2 = + departemen_id saat scan
+
+SKEMA_PARTISI = (
+    f"""
+    CREATE TABLE IF NOT EXISTS {ALIAS_ARSIP}.transaksi (
+        id INTEGER PRIMARY KEY,
+        barcode_id TEXT NOT NULL,
+        waktu_transaksi INTEGER NOT NULL,
+        status_valid BOOLEAN NOT NULL,
+        departemen_id INTEGER
+    )
+    """,
+    f"CREATE INDEX IF NOT EXISTS {ALIAS_ARSIP}.idx_transaksi_waktu ON transaksi (waktu_transaksi)",
+    f"PRAGMA {ALIAS_ARSIP}.user_version = {VERSI_PARTISI}",
+)
+
+Bulan = Tuple[int, int]          # (tahun, bulan)
+
+
+def folder_arsip() -> str:
+    """Folder partisi, di samping file database aktif (kantin_db.DB_FILE)."""
+    return os.path.join(os.path.dirname(os.path.abspath(kantin_db.DB_FILE)), NAMA_FOLDER_ARSIP)
+
+
+def file_partisi(bulan: Bulan) -> str:
+    return os.path.join(folder_arsip(), f"transaksi_{bulan[0]:04d}_{bulan[1]:02d}.db")
+
+
+def _bulan_berikutnya(bulan: Bulan) -> Bulan:
+    return (bulan[0] + 1, 1) if bulan[1] == 12 else (bulan[0], bulan[1] + 1)
+
+
+def _bulan_dari(tanggal) -> Bulan:
+    tanggal = date.fromisoformat(str(tanggal))
+    return tanggal.year, tanggal.month
+
+
+def _rentang_bulan(bulan: Bulan) -> Tuple[int, int]:
+    """Batas detik epoch setengah-terbuka [awal bulan, awal bulan berikutnya)."""
+    return ke_epoch(datetime(*bulan, 1)), ke_epoch(datetime(*_bulan_berikutnya(bulan), 1))
+
+
+def daftar_partisi() -> List[Bulan]:
+    """Semua bulan yang sudah diarsipkan, terlama dulu."""
+    try:
+        nama_file = os.listdir(folder_arsip())
+    except FileNotFoundError:
+        return []
+    hasil = []
+    for nama in nama_file:
+        cocok = POLA_FILE_PARTISI.match(nama)
+        if cocok:
+            hasil.append((int(cocok.group(1)), int(cocok.group(2))))
+    return sorted(hasil)
+
+
+def partisi_dalam_rentang(start_date=None, end_date=None) -> List[str]:
+    """Path partisi yang beririsan dengan rentang tanggal inklusif, terbaru dulu.
+
+    Semua baris di partisi lebih lama dari baris mana pun di tabel utama, jadi membaca tabel utama
+    lalu partisi dalam urutan ini menghasilkan urutan waktu menurun tanpa perlu UNION/sort ulang.
+    """
+    awal = _bulan_dari(start_date) if start_date else None
+    akhir = _bulan_dari(end_date) if end_date else None
+    return [
+        file_partisi(bulan) for bulan in reversed(daftar_partisi())
+        if (awal is None or bulan >= awal) and (akhir is None or bulan <= akhir)
+    ]
+
+
+@contextmanager
+def lampirkan(conn: sqlite3.Connection, path: Optional[str]) -> Iterator[str]:
+    """ATTACH satu partisi selama blok `with`, menghasilkan nama tabel transaksinya.
+
+    path None berarti tabel utama (tanpa ATTACH). Satu partisi per waktu agar tidak terbentur
+    batas ATTACH SQLite (bawaan 10), berapa pun panjang rentang laporannya.
+    """
+    if path is None:
+        yield "transaksi"
+        return
+    conn.execute(f"ATTACH DATABASE ? AS {ALIAS_ARSIP}", (path,))
+    try:
+        yield f"{ALIAS_ARSIP}.transaksi"
+    finally:
+        conn.execute(f"DETACH DATABASE {ALIAS_ARSIP}")
+
+
+def migrasi_partisi(conn: sqlite3.Connection) -> int:
+    """Perbarui partisi berformat lama ke VERSI_PARTISI. Mengembalikan jumlah partisi yang diubah.
+
+    Versi 0 (waktu teks ISO) dibangun ulang; versi 1 mendapat kolom departemen_id. Departemen saat scan
+    riwayat lama tidak diketahui, jadi diisi departemen staf saat ini dan rekap_harian bulan itu dihitung
+    ulang dari kolom tersebut, agar pembersihan partisi berikutnya mengurangi departemen yang sama.
+    Dipanggil init_db setelah migrasi database utama, agar tabel utama dan arsip selalu berformat sama.
+    """
+    jumlah = 0
+    for bulan in daftar_partisi():
+        with lampirkan(conn, file_partisi(bulan)) as tabel:
+            versi = conn.execute(f"PRAGMA {ALIAS_ARSIP}.user_version").fetchone()[0]
+            if versi >= VERSI_PARTISI:
+                continue
+            awal, akhir = (dari_epoch(batas).date().isoformat() for batas in _rentang_bulan(bulan))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if versi < 1:
+                    conn.execute(f"DROP INDEX IF EXISTS {ALIAS_ARSIP}.idx_transaksi_waktu")
+                    conn.execute(f"ALTER TABLE {tabel} RENAME TO transaksi_lama")
+                    for sql in SKEMA_PARTISI:
+                        conn.execute(sql)
+                    conn.execute(f"""
+                        INSERT INTO {tabel} (id, barcode_id, waktu_transaksi, status_valid)
+                        SELECT id, barcode_id, {SQL_KE_EPOCH.format(kolom="waktu_transaksi")}, status_valid
+                        FROM {ALIAS_ARSIP}.transaksi_lama
+                    """)
+                    conn.execute(f"DROP TABLE {ALIAS_ARSIP}.transaksi_lama")
+                else:
+                    conn.execute(f"ALTER TABLE {tabel} ADD COLUMN departemen_id INTEGER")
+                    conn.execute(f"PRAGMA {ALIAS_ARSIP}.user_version = {VERSI_PARTISI}")
+                conn.execute(f"""
+                    UPDATE {tabel} AS T SET departemen_id = S.departemen_id
+                    FROM main.staf AS S WHERE S.barcode_id = T.barcode_id
+                """)
+                conn.execute("DELETE FROM rekap_harian WHERE tanggal >= ? AND tanggal < ?", (awal, akhir))
+                conn.execute(
+                    "INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)"
+                    + SQL_REKAP_TRANSAKSI.format(tabel=tabel, kondisi="1")
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if versi < 1:
+                conn.execute(f"VACUUM {ALIAS_ARSIP}")
+        logger.info("Partisi %04d-%02d diperbarui dari versi %d ke %d", *bulan, versi, VERSI_PARTISI)
+        jumlah += 1
+    return jumlah
+
+
+# --- KONSISTENSI REKAP ---
+
+def _batas_tanggal(bulan: Bulan) -> Tuple[str, str]:
+    """Batas tanggal 'YYYY-MM-DD' setengah-terbuka [awal bulan, awal bulan berikutnya) untuk rekap_harian."""
+    return f"{bulan[0]:04d}-{bulan[1]:02d}-01", "{:04d}-{:02d}-01".format(*_bulan_berikutnya(bulan))
+
+
+def _rekap_dihitung(conn: sqlite3.Connection, bulan: Bulan, tabel_partisi: Optional[str]) -> Dict[tuple, tuple]:
+    """Rekap satu bulan yang dihitung ulang dari tabel utama (+ partisinya bila ada)."""
+    hasil: Dict[tuple, tuple] = {}
+    kondisi = "T.waktu_transaksi >= ? AND T.waktu_transaksi < ?"
+    for tabel in filter(None, ("main.transaksi", tabel_partisi)):
+        sql = SQL_REKAP_TRANSAKSI.format(tabel=tabel, kondisi=kondisi)
+        for tanggal, departemen, jam, valid, ditolak in conn.execute(sql, _rentang_bulan(bulan)):
+            lama = hasil.get((tanggal, departemen, jam), (0, 0))
+            hasil[(tanggal, departemen, jam)] = (lama[0] + valid, lama[1] + ditolak)
+    return hasil
+
+
+def _bulan_diperiksa(conn: sqlite3.Connection) -> List[Bulan]:
+    """Bulan yang punya baris rekap, transaksi di tabel utama, atau partisi."""
+    bulan = set(daftar_partisi())
+    bulan.update(_bulan_dari(f"{teks}-01") for (teks,) in conn.execute(
+        "SELECT DISTINCT substr(tanggal, 1, 7) FROM rekap_harian"
+    ))
+    awal, akhir = conn.execute("SELECT MIN(waktu_transaksi), MAX(waktu_transaksi) FROM transaksi").fetchone()
+    if awal is not None:
+        sekarang, terakhir = _bulan_dari(dari_epoch(awal).date()), _bulan_dari(dari_epoch(akhir).date())
+        while sekarang <= terakhir:
+            bulan.add(sekarang)
+            sekarang = _bulan_berikutnya(sekarang)
+    return sorted(bulan)
+
+
+def periksa_rekap(perbaiki: bool = False) -> List[Bulan]:
+    """Bandingkan rekap_harian dengan hitungan ulang dari transaksi (tabel utama & partisi), per bulan.
+
+    Mengembalikan bulan yang berbeda. Pemeriksaan hanya membaca (satu snapshot per bulan);
+    `perbaiki=True` menulis ulang rekap bulan yang berbeda di bawah lock tulis.
+    """
+    partisi = set(daftar_partisi())
+    berbeda = []
+    with get_db_connection() as conn:
+        for bulan in _bulan_diperiksa(conn):
+            awal, akhir = _batas_tanggal(bulan)
+            with lampirkan(conn, file_partisi(bulan) if bulan in partisi else None) as tabel:
+                tabel_partisi = tabel if bulan in partisi else None
+                conn.execute("BEGIN")
+                try:
+                    dihitung = _rekap_dihitung(conn, bulan, tabel_partisi)
+                    tercatat = {
+                        (tanggal, departemen, jam): (valid, ditolak)
+                        for tanggal, departemen, jam, valid, ditolak in conn.execute(
+                            "SELECT tanggal, departemen, jam, valid, ditolak FROM rekap_harian "
+                            "WHERE tanggal >= ? AND tanggal < ? AND (valid != 0 OR ditolak != 0)", (awal, akhir)
+                        )
+                    }
+                finally:
+                    conn.rollback()
+                if dihitung == tercatat:
+                    continue
+                berbeda.append(bulan)
+                if not perbaiki:
+                    continue
+
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("DELETE FROM rekap_harian WHERE tanggal >= ? AND tanggal < ?", (awal, akhir))
+                    conn.executemany(
+                        "INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak) VALUES (?, ?, ?, ?, ?)",
+                        [(*kunci, *nilai) for kunci, nilai in _rekap_dihitung(conn, bulan, tabel_partisi).items()]
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+    return berbeda
+
+
+# --- PEMINDAHAN BULAN KE PARTISI ---
+
+def arsipkan_bulan(bulan: Bulan) -> int:
+    """Pindahkan semua transaksi pada `bulan` ke file partisinya. Mengembalikan jumlah baris.
+
+    Dua tahap: salin ke partisi (INSERT OR IGNORE, commit), lalu hapus dari tabel utama. Bila
+    terputus di antaranya, menjalankan ulang aman; baris yang sudah tersalin tidak terduplikasi.
+    """
+    awal, akhir = _rentang_bulan(bulan)
+    os.makedirs(folder_arsip(), exist_ok=True)
+
+    with get_db_connection() as conn, lampirkan(conn, file_partisi(bulan)) as tabel:
+        for sql in SKEMA_PARTISI:
+            conn.execute(sql)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"""
+                INSERT OR IGNORE INTO {tabel} (id, barcode_id, waktu_transaksi, status_valid, departemen_id)
+                SELECT id, barcode_id, waktu_transaksi, status_valid, departemen_id FROM main.transaksi
+                WHERE waktu_transaksi >= ? AND waktu_transaksi < ?
+            """, (awal, akhir))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # trg_rekap_delete akan mengurangi rekap_harian; tambahkan dulu jumlah yang sama
+            # (departemen dicari dengan cara yang sama seperti trigger) agar hasil bersihnya nol
+            conn.execute(
+                "INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)"
+                + SQL_REKAP_TRANSAKSI.format(
+                    tabel="main.transaksi", kondisi="T.waktu_transaksi >= ? AND T.waktu_transaksi < ?"
+                )
+                + """
+                ON CONFLICT (tanggal, departemen, jam) DO UPDATE
+                SET valid = valid + excluded.valid, ditolak = ditolak + excluded.ditolak
+                """, (awal, akhir))
+            jumlah = conn.execute(
+                "DELETE FROM main.transaksi WHERE waktu_transaksi >= ? AND waktu_transaksi < ?", (awal, akhir)
+            ).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return jumlah
+
+
+def bulan_jatuh_tempo(bulan_aktif: int = BULAN_AKTIF, hari_ini: Optional[date] = None) -> List[Bulan]:
+    """Bulan di tabel utama yang lebih tua dari `bulan_aktif` bulan terakhir, terlama dulu."""
+    hari_ini = hari_ini or date.today()
+    indeks = hari_ini.year * 12 + hari_ini.month - 1 - (bulan_aktif - 1)
+    batas = ke_epoch(datetime(indeks // 12, indeks % 12 + 1, 1))
+
+    hasil: List[Bulan] = []
+    with get_db_connection() as conn:
+        # Lompat antar bulan lewat idx_transaksi_waktu, tanpa memindai baris lama satu per satu
+        dari = 0
+        while True:
+            row = conn.execute(
+                "SELECT MIN(waktu_transaksi) FROM transaksi WHERE waktu_transaksi >= ? AND waktu_transaksi < ?",
+                (dari, batas),
+            ).fetchone()
+            if row[0] is None:
+                return hasil
+            waktu = dari_epoch(row[0])
+            bulan = (waktu.year, waktu.month)
+            hasil.append(bulan)
+            dari = _rentang_bulan(bulan)[1]
+
+
+def arsipkan_otomatis(bulan_aktif: int = BULAN_AKTIF) -> List[Tuple[Bulan, int]]:
+    """Arsipkan semua bulan yang jatuh tempo. Mengembalikan [((tahun, bulan), jumlah_baris), ...]."""
+    hasil = []
+    for bulan in bulan_jatuh_tempo(bulan_aktif):
+        jumlah = arsipkan_bulan(bulan)
+        logger.info("Transaksi %04d-%02d diarsipkan: %d baris", bulan[0], bulan[1], jumlah)
+        hasil.append((bulan, jumlah))
+    return hasil
+
+
+_arsip_latar: Optional[threading.Thread] = None
+_arsip_latar_lock = threading.Lock()
+
+
+def mulai_arsip_latar(bulan_aktif: int = BULAN_AKTIF):
+    """Jalankan arsipkan_otomatis di thread latar: segera, lalu setiap INTERVAL_ARSIP_DETIK.
+
+    Hanya satu thread per proses, berapa kali pun dipanggil (aman dari rerun Streamlit).
+    """
+    global _arsip_latar
+
+    def _jalankan():
+        while True:
+            try:
+                arsipkan_otomatis(bulan_aktif)
+            except Exception:
+                logger.exception("Pengarsipan otomatis gagal")
+            time.sleep(INTERVAL_ARSIP_DETIK)
+
+    with _arsip_latar_lock:
+        if _arsip_latar is None:
+            _arsip_latar = threading.Thread(target=_jalankan, name="arsip-transaksi", daemon=True)
+            _arsip_latar.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arsipkan transaksi bulan lama ke file partisi bulanan.")
+    parser.add_argument("--db", default=kantin_db.DB_FILE, help="Lokasi file database SQLite.")
+    parser.add_argument("--bulan-aktif", type=int, default=BULAN_AKTIF,
+                        help="Jumlah bulan terakhir yang tetap di tabel utama.")
+    parser.add_argument("--periksa-rekap", action="store_true",
+                        help="Hanya bandingkan rekap_harian dengan hitungan ulang transaksi (tidak mengarsipkan).")
+    parser.add_argument("--perbaiki", action="store_true", help="Bersama --periksa-rekap: tulis ulang bulan yang berbeda.")
+    args = parser.parse_args(argv)
+
+    kantin_db.DB_FILE = args.db
+    kantin_db.init_db()
+    if args.periksa_rekap:
+        berbeda = periksa_rekap(perbaiki=args.perbaiki)
+        for tahun, bulan in berbeda:
+            print(f"{tahun:04d}-{bulan:02d}: rekap tidak cocok{' (diperbaiki)' if args.perbaiki else ''}")
+        if not berbeda:
+            print("Rekap cocok dengan transaksi.")
+        return
+    hasil = arsipkan_otomatis(args.bulan_aktif)
+    for (tahun, bulan), jumlah in hasil:
+        print(f"{tahun:04d}-{bulan:02d}: {jumlah} baris -> {file_partisi((tahun, bulan))}")
+    if not hasil:
+        print("Tidak ada bulan yang perlu diarsipkan.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1398 @@
+import sqlite3
+import threading
+import queue
+import atexit
+import time
+import logging
+import bisect
+import heapq
+import re
+import copy
+import functools
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import kantin_metrik as metrik
+
+# --- KONFIGURASI DATABASE ---
+DB_FILE = "kantin_staf.db"
+ADMIN_DEPARTEMEN_NAME = "Admin_Akses"
+ADMIN_BARCODE_ID = "9999Z"
+ADMIN_NAMA = "Admin Master"
+DEFAULT_DEPARTEMEN = ["Produksi", "HRD", "Keuangan", "IT", "Marketing", "Gudang", "Umum", ADMIN_DEPARTEMEN_NAME, "Tidak Ditentukan"]
+POOL_SIZE = 8                    # Jumlah maksimum koneksi yang dibuka bersamaan
+BUSY_TIMEOUT_MS = 5000           # Tunggu lock maksimal 5 detik sebelum "database is locked"
+CHECKOUT_TIMEOUT = 10.0          # Tunggu koneksi bebas dari pool (detik)
+MMAP_SIZE = 256 * 1024 * 1024    # 256 MB memory-mapped I/O
+CACHE_SIZE_KB = 16 * 1024        # 16 MB page cache per koneksi
+
+# Group commit: transaksi scan ditulis per batch oleh satu thread penulis
+GROUP_COMMIT = True
+GROUP_COMMIT_MAKS_BATCH = 100    # Baris maksimum per commit
+# Tunggu tambahan untuk mengisi batch. 0 = batch berisi scan yang antre selama commit sebelumnya:
+# pemanggil menunggu hasilnya, jadi batch tidak bisa melebihi jumlah pemanggil bersamaan dan setiap
+# tunda > 0 hanya menambah latensi (bench/benchmark.py --tunda untuk membandingkan).
+GROUP_COMMIT_MAKS_TUNDA = 0.0
+GROUP_COMMIT_MAKS_PERCOBAAN = 3  # Galat database diteruskan ke pemanggil setelah 3 percobaan
+GROUP_COMMIT_MAKS_TUNGGU = 30.0  # Pemanggil berhenti menunggu penulis setelah 30 detik (> 3 x busy timeout)
+MAKS_SCAN_BATCH = 1000           # ID maksimum per panggilan proses_scan_batch
+MAKS_PARAMETER_IN = 500          # Parameter per klausa IN (di bawah batas variabel SQLite lama, 999)
+
+# Cache hasil laporan/lookup: berlaku selama database tidak berubah
+CACHE_AKTIF = True
+MAKS_ENTRI_CACHE = 64            # Entri terlama (LRU) dibuang setelah batas ini
+
+logger = logging.getLogger(__name__)
+
+# Pragma yang berlaku per koneksi (disetel sekali saat koneksi dibuat)
+PRAGMA_KONEKSI = (
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    f"PRAGMA mmap_size = {MMAP_SIZE}",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KB}",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def buka_koneksi(db_file: str) -> sqlite3.Connection:
+    """Membuka satu koneksi terukur dengan row_factory = sqlite3.Row dan PRAGMA_KONEKSI."""
+    conn = sqlite3.connect(
+        db_file,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        factory=metrik.KoneksiTerukur,    # Durasi setiap statement & commit tercatat di kantin_metrik
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMA_KONEKSI:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Pool koneksi SQLite yang aman dipakai dari banyak thread (Streamlit & worker webrtc)."""
+
+    def __init__(self, db_file: str, size: int = POOL_SIZE):
+        self.db_file = db_file
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._semua: list = []
+        self._lock = threading.Lock()
+        self._wal_aktif = False
+
+    def _buat_koneksi(self) -> sqlite3.Connection:
+        conn = buka_koneksi(self.db_file)
+        # Mode WAL tersimpan permanen di file database, cukup disetel sekali
+        if not self._wal_aktif:
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._wal_aktif = True
+        return conn
+
+    def checkout(self) -> sqlite3.Connection:
+        """Ambil koneksi bebas; buat baru jika pool belum penuh, atau tunggu jika sudah penuh."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._semua) < self.size:
+                conn = self._buat_koneksi()
+                self._semua.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=CHECKOUT_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Pool koneksi database habis (semua koneksi sedang dipakai).")
+
+    def checkin(self, conn: sqlite3.Connection):
+        """Kembalikan koneksi ke pool; transaksi yang belum selesai dibatalkan."""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._semua:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._semua.clear()
+            self._idle = queue.LifoQueue()
+
+
+# --- POOL GLOBAL PER PROSES ---
+# Modul ini hanya di-import sekali per proses, sehingga pool bertahan di antara
+# rerun Streamlit dan dipakai bersama oleh semua sesi browser.
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None or _pool.db_file != DB_FILE:
+        with _pool_lock:
+            if _pool is None or _pool.db_file != DB_FILE:
+                if _pool is not None:
+                    _pool.close_all()
+                _pool = ConnectionPool(DB_FILE)
+    return _pool
+
+
+@contextmanager
+def get_db_connection():
+    """Pinjam koneksi dari pool (row_factory = sqlite3.Row) selama blok `with`."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+
+atexit.register(close_pool)
+
+
+# --- FORMAT PENYIMPANAN ---
+# waktu_transaksi disimpan sebagai INTEGER: detik sejak 1970-01-01 menurut jam dinding lokal (datetime
+# naive diperlakukan seperti UTC). Di SQL, tanggal = date(w, 'unixepoch') dan jam = w / 3600 % 24.
+_EPOCH = datetime(1970, 1, 1)
+
+# Departemen staf disimpan sebagai staf.departemen_id -> departemen.id; nama diubah ke id lewat subquery ini
+SQL_ID_DEPARTEMEN = "(SELECT id FROM departemen WHERE nama_departemen = ?)"
+SQL_TAMBAH_STAF = f"INSERT INTO staf (barcode_id, nama, departemen_id, jatah_harian) VALUES (?, ?, {SQL_ID_DEPARTEMEN}, ?)"
+
+# Departemen staf saat scan ikut disimpan: rekap_harian dihitung dari kolom ini, bukan dari departemen staf
+# saat ini, sehingga staf pindah departemen tidak membuat pengurangan rekap salah alamat. Parameter (barcode_id, waktu, status).
+SQL_TAMBAH_TRANSAKSI = (
+    "INSERT INTO transaksi (barcode_id, departemen_id, waktu_transaksi, status_valid) "
+    "VALUES (?1, (SELECT departemen_id FROM staf WHERE barcode_id = ?1), ?2, ?3)"
+)
+
+# Nilai timestamp lama (teks ISO dari adapter datetime bawaan sqlite3) -> detik epoch; angka dibiarkan.
+# Pecahan detik dibuang dulu: strftime membulatkan ke milidetik, 23:59:59.9996 bisa pindah ke hari berikutnya.
+SQL_KE_EPOCH = (
+    "CASE WHEN typeof({kolom}) = 'text' THEN CAST(strftime('%s', substr({kolom}, 1, 19)) AS INTEGER) ELSE {kolom} END"
+)
+
+
+def ke_epoch(waktu: datetime) -> int:
+    """datetime lokal (naive) -> nilai kolom waktu (detik epoch jam dinding)."""
+    return (waktu - _EPOCH) // timedelta(seconds=1)
+
+
+def dari_epoch(detik: int) -> datetime:
+    return _EPOCH + timedelta(seconds=detik)
+
+
+# --- MIGRASI SKEMA (versi disimpan di PRAGMA user_version) ---
+# Baris rekap (tanggal, departemen, jam, valid, ditolak) dari tabel transaksi mana pun (utama atau partisi),
+# dengan departemen dicari dengan cara yang sama seperti trigger rekap (v8)
+SQL_REKAP_TRANSAKSI = """
+    SELECT date(T.waktu_transaksi, 'unixepoch'), COALESCE(D.nama_departemen, ''), T.waktu_transaksi / 3600 % 24,
+           SUM(T.status_valid = 1), SUM(T.status_valid != 1)
+    FROM {tabel} AS T
+    LEFT JOIN main.departemen AS D ON D.id = T.departemen_id
+    WHERE {kondisi}
+    GROUP BY 1, 2, 3
+"""
+# Hitung ulang rekap_harian dari transaksi (tombol "Bangun Ulang Rekap")
+SQL_ISI_REKAP = (
+    "INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)"
+    + SQL_REKAP_TRANSAKSI.format(tabel="transaksi", kondisi="1")
+)
+
+# Departemen staf saat trigger rekap berjalan (NEW/OLD.barcode_id)
+_SQL_DEPARTEMEN_STAF = """COALESCE((
+                    SELECT D.nama_departemen FROM staf AS S JOIN departemen AS D ON D.id = S.departemen_id
+                    WHERE S.barcode_id = {baris}.barcode_id
+                ), '')"""
+# Departemen transaksi saat trigger rekap berjalan (v8: departemen_id yang disimpan saat scan)
+_SQL_DEPARTEMEN_TRANSAKSI = "COALESCE((SELECT nama_departemen FROM departemen WHERE id = {baris}.departemen_id), '')"
+
+# Setiap entri adalah satu versi skema; jangan ubah entri lama, tambahkan entri baru di akhir.
+MIGRASI = [
+    # v1: tabel dasar (CREATE IF NOT EXISTS agar database lama tanpa versi ikut ter-upgrade)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS staf (
+            id INTEGER PRIMARY KEY,
+            barcode_id TEXT UNIQUE NOT NULL,
+            nama TEXT NOT NULL,
+            departemen TEXT,
+            jatah_harian INTEGER DEFAULT 1
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS transaksi (
+            id INTEGER PRIMARY KEY,
+            barcode_id TEXT NOT NULL,
+            waktu_transaksi TIMESTAMP NOT NULL,
+            status_valid BOOLEAN NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS departemen (
+            id INTEGER PRIMARY KEY,
+            nama_departemen TEXT UNIQUE NOT NULL
+        )
+        """,
+    ),
+    # v2: index untuk cek kuota per scan dan filter tanggal/departemen di laporan
+    (
+        "CREATE INDEX IF NOT EXISTS idx_transaksi_kuota ON transaksi (barcode_id, status_valid, waktu_transaksi)",
+        "CREATE INDEX IF NOT EXISTS idx_transaksi_waktu ON transaksi (waktu_transaksi)",
+        "CREATE INDEX IF NOT EXISTS idx_staf_departemen ON staf (departemen)",
+        "ANALYZE",
+    ),
+    # v3: penghitung jatah harian (barcode_id, tanggal) -> jumlah_ambil, dijaga oleh trigger
+    (
+        """
+        CREATE TABLE IF NOT EXISTS kuota_harian (
+            barcode_id TEXT NOT NULL,
+            tanggal TEXT NOT NULL,
+            jumlah_ambil INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (barcode_id, tanggal)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_kuota_insert AFTER INSERT ON transaksi
+        WHEN NEW.status_valid = 1
+        BEGIN
+            INSERT INTO kuota_harian (barcode_id, tanggal, jumlah_ambil)
+            VALUES (NEW.barcode_id, substr(NEW.waktu_transaksi, 1, 10), 1)
+            ON CONFLICT (barcode_id, tanggal) DO UPDATE SET jumlah_ambil = jumlah_ambil + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_kuota_delete AFTER DELETE ON transaksi
+        WHEN OLD.status_valid = 1
+        BEGIN
+            UPDATE kuota_harian SET jumlah_ambil = jumlah_ambil - 1
+            WHERE barcode_id = OLD.barcode_id AND tanggal = substr(OLD.waktu_transaksi, 1, 10);
+            DELETE FROM kuota_harian
+            WHERE barcode_id = OLD.barcode_id AND tanggal = substr(OLD.waktu_transaksi, 1, 10) AND jumlah_ambil <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_kuota_update AFTER UPDATE OF barcode_id, waktu_transaksi, status_valid ON transaksi
+        BEGIN
+            UPDATE kuota_harian SET jumlah_ambil = jumlah_ambil - 1
+            WHERE OLD.status_valid = 1
+              AND barcode_id = OLD.barcode_id AND tanggal = substr(OLD.waktu_transaksi, 1, 10);
+            INSERT INTO kuota_harian (barcode_id, tanggal, jumlah_ambil)
+            SELECT NEW.barcode_id, substr(NEW.waktu_transaksi, 1, 10), 1 WHERE NEW.status_valid = 1
+            ON CONFLICT (barcode_id, tanggal) DO UPDATE SET jumlah_ambil = jumlah_ambil + 1;
+        END
+        """,
+        # Isi awal dari riwayat yang sudah ada
+        """
+        INSERT OR REPLACE INTO kuota_harian (barcode_id, tanggal, jumlah_ambil)
+        SELECT barcode_id, substr(waktu_transaksi, 1, 10), COUNT(*)
+        FROM transaksi
+        WHERE status_valid = 1
+        GROUP BY barcode_id, substr(waktu_transaksi, 1, 10)
+        """,
+    ),
+    # v4: penghitung versi per tabel, naik setiap kali isi tabel staf berubah (dari proses mana pun)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS meta_versi (
+            nama TEXT PRIMARY KEY,
+            versi INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        "INSERT OR IGNORE INTO meta_versi (nama, versi) VALUES ('staf', 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_versi_staf_insert AFTER INSERT ON staf
+        BEGIN
+            UPDATE meta_versi SET versi = versi + 1 WHERE nama = 'staf';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_versi_staf_update AFTER UPDATE ON staf
+        BEGIN
+            UPDATE meta_versi SET versi = versi + 1 WHERE nama = 'staf';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_versi_staf_delete AFTER DELETE ON staf
+        BEGIN
+            UPDATE meta_versi SET versi = versi + 1 WHERE nama = 'staf';
+        END
+        """,
+    ),
+    # v5: rekap (tanggal, departemen, jam) -> jumlah valid/ditolak untuk analitik, dijaga oleh trigger
+    (
+        """
+        CREATE TABLE IF NOT EXISTS rekap_harian (
+            tanggal TEXT NOT NULL,
+            departemen TEXT NOT NULL,
+            jam INTEGER NOT NULL,
+            valid INTEGER NOT NULL DEFAULT 0,
+            ditolak INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tanggal, departemen, jam)
+        ) WITHOUT ROWID
+        """,
+        # Departemen diambil dari tabel staf saat scan dicatat
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_rekap_insert AFTER INSERT ON transaksi
+        BEGIN
+            INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)
+            VALUES (
+                substr(NEW.waktu_transaksi, 1, 10),
+                COALESCE((SELECT departemen FROM staf WHERE barcode_id = NEW.barcode_id), ''),
+                CAST(substr(NEW.waktu_transaksi, 12, 2) AS INTEGER),
+                NEW.status_valid = 1, NEW.status_valid != 1
+            )
+            ON CONFLICT (tanggal, departemen, jam) DO UPDATE
+            SET valid = valid + excluded.valid, ditolak = ditolak + excluded.ditolak;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_rekap_delete AFTER DELETE ON transaksi
+        BEGIN
+            UPDATE rekap_harian
+            SET valid = valid - (OLD.status_valid = 1), ditolak = ditolak - (OLD.status_valid != 1)
+            WHERE tanggal = substr(OLD.waktu_transaksi, 1, 10)
+              AND departemen = COALESCE((SELECT departemen FROM staf WHERE barcode_id = OLD.barcode_id), '')
+              AND jam = CAST(substr(OLD.waktu_transaksi, 12, 2) AS INTEGER);
+            DELETE FROM rekap_harian
+            WHERE tanggal = substr(OLD.waktu_transaksi, 1, 10) AND valid <= 0 AND ditolak <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_rekap_update AFTER UPDATE OF barcode_id, waktu_transaksi, status_valid ON transaksi
+        BEGIN
+            UPDATE rekap_harian
+            SET valid = valid - (OLD.status_valid = 1), ditolak = ditolak - (OLD.status_valid != 1)
+            WHERE tanggal = substr(OLD.waktu_transaksi, 1, 10)
+              AND departemen = COALESCE((SELECT departemen FROM staf WHERE barcode_id = OLD.barcode_id), '')
+              AND jam = CAST(substr(OLD.waktu_transaksi, 12, 2) AS INTEGER);
+            INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)
+            VALUES (
+                substr(NEW.waktu_transaksi, 1, 10),
+                COALESCE((SELECT departemen FROM staf WHERE barcode_id = NEW.barcode_id), ''),
+                CAST(substr(NEW.waktu_transaksi, 12, 2) AS INTEGER),
+                NEW.status_valid = 1, NEW.status_valid != 1
+            )
+            ON CONFLICT (tanggal, departemen, jam) DO UPDATE
+            SET valid = valid + excluded.valid, ditolak = ditolak + excluded.ditolak;
+        END
+        """,
+        # Isi awal dari riwayat yang sudah ada (format waktu teks, sebelum v7)
+        """
+        INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)
+        SELECT substr(T.waktu_transaksi, 1, 10), COALESCE(S.departemen, ''),
+               CAST(substr(T.waktu_transaksi, 12, 2) AS INTEGER),
+               SUM(T.status_valid = 1), SUM(T.status_valid != 1)
+        FROM transaksi AS T
+        LEFT JOIN staf AS S ON S.barcode_id = T.barcode_id
+        GROUP BY 1, 2, 3
+        """,
+    ),
+    # v6: hapus lunak (tombstone) staf/departemen + antrean pembersihan bertahap (lihat kantin_hapus)
+    (
+        "ALTER TABLE staf ADD COLUMN dihapus_pada TIMESTAMP",
+        "ALTER TABLE departemen ADD COLUMN dihapus_pada TIMESTAMP",
+        """
+        CREATE TABLE IF NOT EXISTS tugas_hapus (
+            id INTEGER PRIMARY KEY,
+            jenis TEXT NOT NULL,
+            target TEXT NOT NULL,
+            dibuat TIMESTAMP NOT NULL,
+            status TEXT NOT NULL DEFAULT 'menunggu',
+            total INTEGER,
+            diproses INTEGER NOT NULL DEFAULT 0,
+            selesai TIMESTAMP,
+            pesan TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_tugas_hapus_status ON tugas_hapus (status)",
+    ),
+    # v7: format ringkas. waktu_transaksi teks ISO -> INTEGER detik epoch, staf.departemen (teks) ->
+    # staf.departemen_id (FK ke departemen). Kedua tabel dibangun ulang; trigger dibuat ulang sesudahnya.
+    (
+        *(f"DROP TRIGGER IF EXISTS {nama}" for nama in (
+            "trg_kuota_insert", "trg_kuota_delete", "trg_kuota_update",
+            "trg_versi_staf_insert", "trg_versi_staf_update", "trg_versi_staf_delete",
+            "trg_rekap_insert", "trg_rekap_delete", "trg_rekap_update",
+        )),
+        # Departemen yang hanya tercatat sebagai teks di staf ikut didaftarkan agar tidak hilang
+        """
+        INSERT OR IGNORE INTO departemen (nama_departemen)
+        SELECT DISTINCT departemen FROM staf WHERE departemen IS NOT NULL AND departemen != ''
+        """,
+        """
+        CREATE TABLE staf_baru (
+            id INTEGER PRIMARY KEY,
+            barcode_id TEXT UNIQUE NOT NULL,
+            nama TEXT NOT NULL,
+            departemen_id INTEGER REFERENCES departemen (id),
+            jatah_harian INTEGER DEFAULT 1,
+            dihapus_pada INTEGER
+        )
+        """,
+        f"""
+        INSERT INTO staf_baru (id, barcode_id, nama, departemen_id, jatah_harian, dihapus_pada)
+        SELECT S.id, S.barcode_id, S.nama, D.id, S.jatah_harian, {SQL_KE_EPOCH.format(kolom="S.dihapus_pada")}
+        FROM staf AS S LEFT JOIN departemen AS D ON D.nama_departemen = S.departemen
+        """,
+        "DROP TABLE staf",
+        "ALTER TABLE staf_baru RENAME TO staf",
+        "CREATE INDEX idx_staf_departemen ON staf (departemen_id)",
+        """
+        CREATE TABLE transaksi_baru (
+            id INTEGER PRIMARY KEY,
+            barcode_id TEXT NOT NULL,
+            waktu_transaksi INTEGER NOT NULL,
+            status_valid BOOLEAN NOT NULL
+        )
+        """,
+        f"""
+        INSERT INTO transaksi_baru (id, barcode_id, waktu_transaksi, status_valid)
+        SELECT id, barcode_id, {SQL_KE_EPOCH.format(kolom="waktu_transaksi")}, status_valid FROM transaksi
+        """,
+        "DROP TABLE transaksi",
+        "ALTER TABLE transaksi_baru RENAME TO transaksi",
+        "CREATE INDEX idx_transaksi_kuota ON transaksi (barcode_id, status_valid, waktu_transaksi)",
+        "CREATE INDEX idx_transaksi_waktu ON transaksi (waktu_transaksi)",
+        f"UPDATE departemen SET dihapus_pada = {SQL_KE_EPOCH.format(kolom='dihapus_pada')}",
+        f"""
+        UPDATE tugas_hapus SET dibuat = {SQL_KE_EPOCH.format(kolom='dibuat')},
+                               selesai = {SQL_KE_EPOCH.format(kolom='selesai')}
+        """,
+        # Trigger v3/v4/v5 dengan tanggal & jam dari detik epoch dan departemen lewat departemen_id
+        """
+        CREATE TRIGGER trg_kuota_insert AFTER INSERT ON transaksi
+        WHEN NEW.status_valid = 1
+        BEGIN
+            INSERT INTO kuota_harian (barcode_id, tanggal, jumlah_ambil)
+            VALUES (NEW.barcode_id, date(NEW.waktu_transaksi, 'unixepoch'), 1)
+            ON CONFLICT (barcode_id, tanggal) DO UPDATE SET jumlah_ambil = jumlah_ambil + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_kuota_delete AFTER DELETE ON transaksi
+        WHEN OLD.status_valid = 1
+        BEGIN
+            UPDATE kuota_harian SET jumlah_ambil = jumlah_ambil - 1
+            WHERE barcode_id = OLD.barcode_id AND tanggal = date(OLD.waktu_transaksi, 'unixepoch');
+            DELETE FROM kuota_harian
+            WHERE barcode_id = OLD.barcode_id AND tanggal = date(OLD.waktu_transaksi, 'unixepoch')
+              AND jumlah_ambil <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_kuota_update AFTER UPDATE OF barcode_id, waktu_transaksi, status_valid ON transaksi
+        BEGIN
+            UPDATE kuota_harian SET jumlah_ambil = jumlah_ambil - 1
+            WHERE OLD.status_valid = 1
+              AND barcode_id = OLD.barcode_id AND tanggal = date(OLD.waktu_transaksi, 'unixepoch');
+            INSERT INTO kuota_harian (barcode_id, tanggal, jumlah_ambil)
+            SELECT NEW.barcode_id, date(NEW.waktu_transaksi, 'unixepoch'), 1 WHERE NEW.status_valid = 1
+            ON CONFLICT (barcode_id, tanggal) DO UPDATE SET jumlah_ambil = jumlah_ambil + 1;
+        END
+        """,
+        *(f"""
+        CREATE TRIGGER trg_versi_staf_{aksi} AFTER {aksi.upper()} ON staf
+        BEGIN
+            UPDATE meta_versi SET versi = versi + 1 WHERE nama = 'staf';
+        END
+        """ for aksi in ("insert", "update", "delete")),
+        f"""
+        CREATE TRIGGER trg_rekap_insert AFTER INSERT ON transaksi
+        BEGIN
+            INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)
+            VALUES (
+                date(NEW.waktu_transaksi, 'unixepoch'),
+                {_SQL_DEPARTEMEN_STAF.format(baris="NEW")},
+                NEW.waktu_transaksi / 3600 % 24,
+                NEW.status_valid = 1, NEW.status_valid != 1
+            )
+            ON CONFLICT (tanggal, departemen, jam) DO UPDATE
+            SET valid = valid + excluded.valid, ditolak = ditolak + excluded.ditolak;
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_rekap_delete AFTER DELETE ON transaksi
+        BEGIN
+            UPDATE rekap_harian
+            SET valid = valid - (OLD.status_valid = 1), ditolak = ditolak - (OLD.status_valid != 1)
+            WHERE tanggal = date(OLD.waktu_transaksi, 'unixepoch')
+              AND departemen = {_SQL_DEPARTEMEN_STAF.format(baris="OLD")}
+              AND jam = OLD.waktu_transaksi / 3600 % 24;
+            DELETE FROM rekap_harian
+            WHERE tanggal = date(OLD.waktu_transaksi, 'unixepoch') AND valid <= 0 AND ditolak <= 0;
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_rekap_update AFTER UPDATE OF barcode_id, waktu_transaksi, status_valid ON transaksi
+        BEGIN
+            UPDATE rekap_harian
+            SET valid = valid - (OLD.status_valid = 1), ditolak = ditolak - (OLD.status_valid != 1)
+            WHERE tanggal = date(OLD.waktu_transaksi, 'unixepoch')
+              AND departemen = {_SQL_DEPARTEMEN_STAF.format(baris="OLD")}
+              AND jam = OLD.waktu_transaksi / 3600 % 24;
+            INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)
+            VALUES (
+                date(NEW.waktu_transaksi, 'unixepoch'),
+                {_SQL_DEPARTEMEN_STAF.format(baris="NEW")},
+                NEW.waktu_transaksi / 3600 % 24,
+                NEW.status_valid = 1, NEW.status_valid != 1
+            )
+            ON CONFLICT (tanggal, departemen, jam) DO UPDATE
+            SET valid = valid + excluded.valid, ditolak = ditolak + excluded.ditolak;
+        END
+        """,
+        "ANALYZE",
+    ),
+    # v8: departemen saat scan disimpan di transaksi; trigger rekap memakai kolom itu sehingga pengurangan
+    # (hapus/ubah transaksi) selalu mengenai departemen yang dulu ditambah, walau staf sudah pindah
+    (
+        "DROP TRIGGER IF EXISTS trg_rekap_insert",
+        "DROP TRIGGER IF EXISTS trg_rekap_delete",
+        "DROP TRIGGER IF EXISTS trg_rekap_update",
+        "ALTER TABLE transaksi ADD COLUMN departemen_id INTEGER REFERENCES departemen (id)",
+        # Departemen saat scan riwayat lama tidak diketahui: pakai departemen staf saat ini
+        """
+        UPDATE transaksi SET departemen_id = (SELECT departemen_id FROM staf WHERE staf.barcode_id = transaksi.barcode_id)
+        """,
+        f"""
+        CREATE TRIGGER trg_rekap_insert AFTER INSERT ON transaksi
+        BEGIN
+            INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)
+            VALUES (
+                date(NEW.waktu_transaksi, 'unixepoch'),
+                {_SQL_DEPARTEMEN_TRANSAKSI.format(baris="NEW")},
+                NEW.waktu_transaksi / 3600 % 24,
+                NEW.status_valid = 1, NEW.status_valid != 1
+            )
+            ON CONFLICT (tanggal, departemen, jam) DO UPDATE
+            SET valid = valid + excluded.valid, ditolak = ditolak + excluded.ditolak;
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_rekap_delete AFTER DELETE ON transaksi
+        BEGIN
+            UPDATE rekap_harian
+            SET valid = valid - (OLD.status_valid = 1), ditolak = ditolak - (OLD.status_valid != 1)
+            WHERE tanggal = date(OLD.waktu_transaksi, 'unixepoch')
+              AND departemen = {_SQL_DEPARTEMEN_TRANSAKSI.format(baris="OLD")}
+              AND jam = OLD.waktu_transaksi / 3600 % 24;
+            DELETE FROM rekap_harian
+            WHERE tanggal = date(OLD.waktu_transaksi, 'unixepoch') AND valid <= 0 AND ditolak <= 0;
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_rekap_update
+        AFTER UPDATE OF barcode_id, waktu_transaksi, status_valid, departemen_id ON transaksi
+        BEGIN
+            UPDATE rekap_harian
+            SET valid = valid - (OLD.status_valid = 1), ditolak = ditolak - (OLD.status_valid != 1)
+            WHERE tanggal = date(OLD.waktu_transaksi, 'unixepoch')
+              AND departemen = {_SQL_DEPARTEMEN_TRANSAKSI.format(baris="OLD")}
+              AND jam = OLD.waktu_transaksi / 3600 % 24;
+            DELETE FROM rekap_harian
+            WHERE tanggal = date(OLD.waktu_transaksi, 'unixepoch') AND valid <= 0 AND ditolak <= 0;
+            INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)
+            VALUES (
+                date(NEW.waktu_transaksi, 'unixepoch'),
+                {_SQL_DEPARTEMEN_TRANSAKSI.format(baris="NEW")},
+                NEW.waktu_transaksi / 3600 % 24,
+                NEW.status_valid = 1, NEW.status_valid != 1
+            )
+            ON CONFLICT (tanggal, departemen, jam) DO UPDATE
+            SET valid = valid + excluded.valid, ditolak = ditolak + excluded.ditolak;
+        END
+        """,
+        # Rekap tanggal yang masih di tabel utama dihitung ulang dari kolom baru (rekap lama bisa sudah bergeser)
+        """
+        DELETE FROM rekap_harian
+        WHERE tanggal >= (SELECT date(MIN(waktu_transaksi), 'unixepoch') FROM transaksi)
+        """,
+        """
+        INSERT INTO rekap_harian (tanggal, departemen, jam, valid, ditolak)
+        SELECT date(T.waktu_transaksi, 'unixepoch'), COALESCE(D.nama_departemen, ''), T.waktu_transaksi / 3600 % 24,
+               SUM(T.status_valid = 1), SUM(T.status_valid != 1)
+        FROM transaksi AS T
+        LEFT JOIN departemen AS D ON D.id = T.departemen_id
+        GROUP BY 1, 2, 3
+        """,
+    ),
+]
+SCHEMA_VERSION = len(MIGRASI)
+VERSI_FORMAT_RINGKAS = 7         # Migrasi yang membangun ulang tabel besar; diikuti VACUUM sekali
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrasi_schema(conn: sqlite3.Connection) -> int:
+    """Menjalankan migrasi yang belum diterapkan, satu transaksi per versi. Mengembalikan versi akhir."""
+    versi = get_schema_version(conn)
+    if versi > SCHEMA_VERSION:
+        raise RuntimeError(f"Versi skema database ({versi}) lebih baru dari aplikasi ({SCHEMA_VERSION}).")
+
+    for nomor in range(versi + 1, SCHEMA_VERSION + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Proses lain mungkin sudah menjalankan migrasi ini selagi kita menunggu lock
+            if get_schema_version(conn) >= nomor:
+                conn.rollback()
+                continue
+            for sql in MIGRASI[nomor - 1]:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {nomor}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # Halaman bekas tabel lama baru kembali ke sistem file setelah VACUUM (tidak bisa di dalam transaksi)
+    if 0 < versi < VERSI_FORMAT_RINGKAS <= SCHEMA_VERSION:
+        conn.execute("VACUUM")
+    return get_schema_version(conn)
+
+
+def rentang_waktu(start_date=None, end_date=None):
+    """Ubah tanggal inklusif 'YYYY-MM-DD' menjadi batas detik epoch setengah-terbuka [awal, akhir).
+
+    Perbandingan `waktu_transaksi >= awal AND waktu_transaksi < akhir` dapat memakai index,
+    berbeda dengan `DATE(waktu_transaksi) = ?` yang memaksa full table scan.
+    """
+    awal = ke_epoch(datetime.fromisoformat(str(start_date))) if start_date else None
+    akhir = None
+    if end_date:
+        akhir = ke_epoch(datetime.fromisoformat(str(end_date)) + timedelta(days=1))
+    return awal, akhir
+
+
+def bangun_ulang_rekap() -> int:
+    """Hitung ulang rekap_harian dari transaksi dengan departemen staf saat ini (mis. setelah staf pindah departemen).
+
+    Hanya tanggal yang masih ada di tabel transaksi utama; rekap bulan yang sudah diarsipkan
+    (lihat kantin_arsip) dibiarkan. Mengembalikan jumlah baris rekap yang terbentuk.
+    """
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Riwayat di tabel utama ikut departemen staf saat ini (staf terhapus/tak dikenal dibiarkan)
+            conn.execute("""
+                UPDATE transaksi SET departemen_id = S.departemen_id
+                FROM staf AS S
+                WHERE S.barcode_id = transaksi.barcode_id AND S.departemen_id IS NOT transaksi.departemen_id
+            """)
+            conn.execute("""
+                DELETE FROM rekap_harian
+                WHERE tanggal >= (SELECT date(MIN(waktu_transaksi), 'unixepoch') FROM transaksi)
+            """)
+            jumlah = conn.execute(SQL_ISI_REKAP).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return jumlah
+
+
+_init_selesai: Dict[str, int] = {}      # DB_FILE -> versi skema yang sudah diinisialisasi di proses ini
+_init_lock = threading.Lock()
+
+
+def init_db(paksa: bool = False):
+    """Menjalankan migrasi skema, lalu membuat data dummy departemen/staf jika belum ada.
+
+    Cukup sekali per proses untuk setiap file database & versi skema: rerun Streamlit berikutnya
+    langsung kembali tanpa menyentuh database. `paksa=True` menjalankan ulang semuanya.
+    """
+    if not paksa and _init_selesai.get(DB_FILE) == SCHEMA_VERSION:
+        return
+    with _init_lock:
+        if not paksa and _init_selesai.get(DB_FILE) == SCHEMA_VERSION:
+            return
+        db_file = DB_FILE
+        with get_db_connection() as conn:
+            # Membuat/meng-upgrade tabel staf, transaksi, departemen & index (lihat MIGRASI)
+            migrasi_schema(conn)
+            # Partisi arsip ikut format tabel utama (import lokal: kantin_arsip meng-import modul ini)
+            from kantin_arsip import migrasi_partisi
+            migrasi_partisi(conn)
+
+            # Data dummy & ID admin dalam satu transaksi; baris yang sudah ada diabaikan
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR IGNORE INTO departemen (nama_departemen) VALUES (?)",
+                                 [(dept,) for dept in DEFAULT_DEPARTEMEN])
+
+                # Tambah Data Dummy Staf (Hanya jika tabel kosong)
+                if conn.execute("SELECT 1 FROM staf LIMIT 1").fetchone() is None:
+                    conn.executemany(SQL_TAMBAH_STAF, [('1001A', 'Budi Santoso', 'Produksi', 1),
+                                                       ('2002B', 'Siti Aminah', 'HRD', 1)])
+
+                # --- VERIFIKASI ID ADMIN SELALU ADA ---
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO staf (barcode_id, nama, departemen_id, jatah_harian)
+                    VALUES (?, ?, {SQL_ID_DEPARTEMEN}, ?)
+                """, (ADMIN_BARCODE_ID, ADMIN_NAMA, ADMIN_DEPARTEMEN_NAME, 0))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        _init_selesai[db_file] = SCHEMA_VERSION
+
+
+# --- DIREKTORI STAF DI MEMORI ---
+
+class Staf(NamedTuple):
+    """Satu baris tabel staf dalam bentuk tuple ringkas (immutable, tanpa __dict__)."""
+    barcode_id: str
+    nama: str
+    departemen: Optional[str]
+    jatah_harian: int
+
+
+def _tokenisasi(teks: str) -> List[str]:
+    """Pecah teks menjadi kata huruf kecil (pemisah: apa pun selain huruf/angka)."""
+    return [kata for kata in re.split(r"[\W_]+", teks.lower()) if kata]
+
+
+class DirektoriStaf:
+    """Salinan tabel staf di memori (dict barcode_id -> Staf) yang dibagi semua sesi dalam satu proses.
+
+    Validitas dicek lewat `PRAGMA data_version` pada koneksi khusus milik direktori: nilainya hanya
+    berubah jika koneksi lain (di proses ini maupun proses lain) melakukan commit. Karena setiap scan
+    juga commit, perubahan data_version diikuti pengecekan `meta_versi.staf`, dan tabel staf baru
+    dimuat ulang bila versi itu benar-benar berubah.
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data: Dict[str, Staf] = {}
+        self._urut_nama: Optional[List[Staf]] = None
+        self._indeks: Optional[List[Tuple[str, str]]] = None   # (token, barcode_id), terurut
+        self._kunci_indeks: List[str] = []
+        self._data_version: Optional[int] = None
+        self._versi_staf: Optional[int] = None
+
+    def _segarkan(self):
+        """Pastikan isi direktori sesuai database. Harus dipanggil dengan self._lock."""
+        if self._conn is None:
+            self._conn = buka_koneksi(self.db_file)
+
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._versi_staf is not None and data_version == self._data_version:
+            return
+
+        # Baca versi & isi tabel dalam satu snapshot agar keduanya konsisten
+        self._conn.execute("BEGIN")
+        try:
+            row = self._conn.execute("SELECT versi FROM meta_versi WHERE nama = 'staf'").fetchone()
+            versi_staf = row[0] if row else 0
+            if versi_staf != self._versi_staf:
+                # Staf yang sudah di-tombstone langsung hilang dari scan & daftar
+                rows = self._conn.execute("""
+                    SELECT S.barcode_id, S.nama, D.nama_departemen, S.jatah_harian
+                    FROM staf AS S LEFT JOIN departemen AS D ON D.id = S.departemen_id
+                    WHERE S.dihapus_pada IS NULL
+                """).fetchall()
+                self._data = {row[0]: Staf(*row) for row in rows}
+                self._urut_nama = None
+                self._indeks = None
+                self._versi_staf = versi_staf
+        finally:
+            self._conn.rollback()
+        self._data_version = data_version
+
+    def get(self, barcode_id: str) -> Optional[Staf]:
+        with self._lock:
+            self._segarkan()
+            return self._data.get(barcode_id)
+
+    def semua(self) -> List[Staf]:
+        """Semua staf, diurutkan berdasarkan nama."""
+        with self._lock:
+            self._segarkan()
+            if self._urut_nama is None:
+                self._urut_nama = sorted(self._data.values(), key=lambda s: s.nama)
+            return self._urut_nama
+
+    def _bangun_indeks(self):
+        """Indeks prefiks: token kecil (barcode, kata nama, kata departemen) -> barcode_id."""
+        indeks = sorted(
+            (token, staf.barcode_id)
+            for staf in self._data.values()
+            for token in {staf.barcode_id.lower(), *_tokenisasi(staf.barcode_id),
+                          *_tokenisasi(staf.nama), *_tokenisasi(staf.departemen or "")}
+        )
+        self._indeks = indeks
+        self._kunci_indeks = [token for token, _ in indeks]
+
+    def cari(self, kueri: str, batas: int = 20, kecuali_departemen: Optional[str] = None) -> List[Staf]:
+        """Cari staf berdasarkan awalan kata pada nama, barcode, atau departemen.
+
+        Setiap kata di `kueri` harus cocok dengan awalan salah satu token (AND). Urutan hasil:
+        barcode persis, awalan barcode, awalan nama, lalu sisanya; masing-masing urut nama.
+        """
+        kata_kueri = _tokenisasi(kueri)
+        if not kata_kueri:
+            return []
+        with self._lock:
+            self._segarkan()
+            if self._indeks is None:
+                self._bangun_indeks()
+
+            cocok: Optional[set] = None
+            for kata in kata_kueri:
+                ditemukan = set()
+                i = bisect.bisect_left(self._kunci_indeks, kata)
+                while i < len(self._indeks) and self._kunci_indeks[i].startswith(kata):
+                    ditemukan.add(self._indeks[i][1])
+                    i += 1
+                cocok = ditemukan if cocok is None else cocok & ditemukan
+                if not cocok:
+                    return []
+            hasil = [self._data[b] for b in cocok]
+        if kecuali_departemen is not None:
+            hasil = [staf for staf in hasil if staf.departemen != kecuali_departemen]
+
+        kueri_kecil = kueri.strip().lower()
+
+        def peringkat(staf: Staf):
+            barcode = staf.barcode_id.lower()
+            if barcode == kueri_kecil:
+                tingkat = 0
+            elif barcode.startswith(kueri_kecil):
+                tingkat = 1
+            elif staf.nama.lower().startswith(kueri_kecil):
+                tingkat = 2
+            else:
+                tingkat = 3
+            return tingkat, staf.nama.lower()
+
+        return heapq.nsmallest(batas, hasil, key=peringkat)
+
+    def invalidate(self):
+        """Paksa muat ulang pada akses berikutnya (dipanggil setelah CRUD staf/departemen)."""
+        with self._lock:
+            self._versi_staf = None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._versi_staf = None
+
+
+_direktori: Optional[DirektoriStaf] = None
+_direktori_lock = threading.Lock()
+
+
+def direktori_staf() -> DirektoriStaf:
+    global _direktori
+    if _direktori is None or _direktori.db_file != DB_FILE:
+        with _direktori_lock:
+            if _direktori is None or _direktori.db_file != DB_FILE:
+                if _direktori is not None:
+                    _direktori.close()
+                _direktori = DirektoriStaf(DB_FILE)
+    return _direktori
+
+
+# --- CACHE HASIL (DIKUNCI VERSI DATA) ---
+
+class CacheVersi:
+    """Cache LRU hasil fungsi baca, dikunci argumen + versi data database.
+
+    Versi data = (DB_FILE, `PRAGMA data_version` pada koneksi khusus, penghitung tulis proses ini).
+    data_version berubah setiap koneksi lain (termasuk scan & proses lain) melakukan commit; penghitung
+    tulis dinaikkan oleh helper CRUD lewat `tandai_perubahan()`. Begitu versi berubah seluruh isi
+    cache dibuang, jadi hasil basi tidak pernah dikembalikan.
+    """
+
+    def __init__(self, maks_entri: int = MAKS_ENTRI_CACHE):
+        self.maks_entri = maks_entri
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_file: Optional[str] = None
+        self._penghitung_tulis = 0
+        self._versi: Optional[Tuple[str, int, int]] = None
+        self._data: "OrderedDict[tuple, Any]" = OrderedDict()
+
+    def _versi_data(self) -> Tuple[str, int, int]:
+        """Harus dipanggil dengan self._lock."""
+        if self._conn is None or self._db_file != DB_FILE:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn, self._db_file = buka_koneksi(DB_FILE), DB_FILE
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return DB_FILE, data_version, self._penghitung_tulis
+
+    def ambil(self, kunci: tuple) -> Tuple[bool, Any]:
+        """(True, nilai) bila ada untuk versi data saat ini; (False, None) bila tidak."""
+        with self._lock:
+            versi = self._versi_data()
+            if versi != self._versi:
+                self._data.clear()
+                self._versi = versi
+                return False, None
+            if kunci not in self._data:
+                return False, None
+            self._data.move_to_end(kunci)
+            return True, self._data[kunci]
+
+    def simpan(self, kunci: tuple, nilai: Any, versi: Tuple[str, int, int]):
+        """Simpan hanya bila versi data belum berubah sejak sebelum query dijalankan."""
+        with self._lock:
+            if versi != self._versi:
+                return
+            self._data[kunci] = nilai
+            self._data.move_to_end(kunci)
+            while len(self._data) > self.maks_entri:
+                self._data.popitem(last=False)
+
+    def versi(self) -> Optional[Tuple[str, int, int]]:
+        with self._lock:
+            return self._versi
+
+    def tandai_perubahan(self):
+        with self._lock:
+            self._penghitung_tulis += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._versi = None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache_hasil = CacheVersi()
+
+
+def tandai_perubahan():
+    """Dipanggil helper CRUD setelah commit: semua hasil di cache dianggap basi."""
+    _cache_hasil.tandai_perubahan()
+
+
+def _salin(nilai):
+    """Salinan hasil cache agar pemanggil bebas mengubahnya (DataFrame, list, dict; tuple per elemen)."""
+    if isinstance(nilai, tuple):
+        return tuple(_salin(v) for v in nilai)
+    if isinstance(nilai, (str, int, float, type(None))):
+        return nilai
+    return copy.copy(nilai)
+
+
+def cache_versi(fungsi):
+    """Decorator: hasil `fungsi` di-cache per argumen (+ tanggal hari ini) selama database tidak berubah.
+
+    Disimpan di cache global per proses dengan kunci nama modul & fungsi, sehingga fungsi yang
+    didefinisikan ulang di setiap rerun Streamlit tetap berbagi entri yang sama.
+    """
+    nama = f"{fungsi.__module__}.{fungsi.__qualname__}"
+
+    @functools.wraps(fungsi)
+    def pembungkus(*args, **kwargs):
+        if not CACHE_AKTIF:
+            return fungsi(*args, **kwargs)
+        # Laporan "hari ini" ikut berganti saat tanggal berganti walau database diam
+        kunci = (nama, date.today().isoformat(), args, tuple(sorted(kwargs.items())))
+        try:
+            ada, nilai = _cache_hasil.ambil(kunci)
+        except TypeError:        # Argumen tidak hashable: jalankan tanpa cache
+            return fungsi(*args, **kwargs)
+        metrik.tambah("kantin_cache_total", fungsi=fungsi.__name__, hasil="hit" if ada else "miss")
+        if ada:
+            return _salin(nilai)
+
+        versi = _cache_hasil.versi()
+        nilai = fungsi(*args, **kwargs)
+        _cache_hasil.simpan(kunci, _salin(nilai), versi)
+        return nilai
+
+    return pembungkus
+
+
+# --- PENULIS SCAN DENGAN GROUP COMMIT ---
+
+class ScanWriter:
+    """Thread penulis tunggal yang menggabungkan scan dari banyak pemanggil ke sedikit commit.
+
+    Keputusan kuota diambil oleh thread ini di dalam transaksi BEGIN IMMEDIATE yang juga menulis
+    barisnya, jadi lock tulis database melindungi cek + catat seperti pada _catat_scan_langsung,
+    termasuk terhadap proses lain. Pemanggil menunggu sampai batch-nya ter-commit; scan yang
+    datang selama commit berjalan ikut batch berikutnya.
+    """
+
+    def __init__(self, db_file: str, maks_batch: int = GROUP_COMMIT_MAKS_BATCH,
+                 maks_tunda: float = GROUP_COMMIT_MAKS_TUNDA,
+                 maks_percobaan: int = GROUP_COMMIT_MAKS_PERCOBAAN,
+                 maks_tunggu: float = GROUP_COMMIT_MAKS_TUNGGU):
+        self.db_file = db_file
+        self.maks_batch = maks_batch
+        self.maks_tunda = maks_tunda
+        self.maks_percobaan = maks_percobaan
+        self.maks_tunggu = maks_tunggu
+        # Satu item = satu panggilan catat_banyak(): (entri, waktu_scan, future hasil keputusan)
+        self._antrean: "queue.Queue[Optional[Tuple[List[Tuple[str, int]], datetime, Future]]]" = queue.Queue()
+        self._metrik = {
+            "batch": 0,
+            "baris": 0,
+            "batch_terbesar": 0,
+            "total_commit_detik": 0.0,
+            "commit_terlama_detik": 0.0,
+            "commit_gagal": 0,
+        }
+        self._thread = threading.Thread(target=self._loop, name="scan-writer", daemon=True)
+        self._thread.start()
+
+    def catat(self, barcode_id: str, jatah_harian: int, waktu_scan: datetime) -> Tuple[int, int]:
+        """Putuskan status scan dan catat transaksinya. Mengembalikan (status_valid, jumlah_sebelumnya)."""
+        return self.catat_banyak([(barcode_id, jatah_harian)], waktu_scan)[0]
+
+    def catat_banyak(self, entri: List[Tuple[str, int]], waktu_scan: datetime) -> List[Tuple[int, int]]:
+        """Seperti catat() untuk banyak (barcode_id, jatah_harian) sekaligus, selalu dalam commit yang sama.
+
+        Menunggu sampai batch ter-commit; galat database yang tidak pulih setelah beberapa percobaan
+        diteruskan ke pemanggil. Bila penulis tidak menjawab dalam maks_tunggu detik, scan yang belum
+        mulai ditulis dibatalkan dan sqlite3.OperationalError dilempar (bukan menunggu selamanya).
+        """
+        hasil: Future = Future()
+        self._antrean.put((entri, waktu_scan, hasil))
+        try:
+            return hasil.result(timeout=self.maks_tunggu)
+        except FutureTimeoutError:
+            pass
+        if not hasil.cancel():
+            # Sudah diambil penulis: tunggu sekali lagi agar tidak melaporkan gagal untuk scan yang ter-commit
+            try:
+                return hasil.result(timeout=self.maks_tunggu)
+            except FutureTimeoutError:
+                pass
+        logger.error("ScanWriter tidak merespons dalam %g detik (thread hidup: %s).",
+                     self.maks_tunggu, self._thread.is_alive())
+        raise sqlite3.OperationalError("Penulis scan tidak merespons, scan tidak dicatat.")
+
+    def _loop(self):
+        berhenti = False
+        while not berhenti:
+            item = self._antrean.get()
+            if item is None:
+                self._antrean.task_done()
+                return
+            batch = [item]
+            jumlah_baris = len(item[0])
+            batas = time.monotonic() + self.maks_tunda
+            while jumlah_baris < self.maks_batch:
+                sisa = batas - time.monotonic()
+                try:
+                    item = self._antrean.get(timeout=sisa) if sisa > 0 else self._antrean.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    berhenti = True
+                    break
+                batch.append(item)
+                jumlah_baris += len(item[0])
+            try:
+                self._tulis(batch)
+            except Exception as e:
+                # Jangan biarkan thread mati: pemanggil batch ini menerima galatnya, antrean tetap dilayani
+                logger.exception("Group commit %d scan gagal tak terduga.", len(batch))
+                for _, _, hasil in batch:
+                    if not hasil.done():
+                        hasil.set_exception(e)
+            for _ in range(len(batch) + (1 if berhenti else 0)):
+                self._antrean.task_done()
+
+    def _tulis(self, batch: List[Tuple[List[Tuple[str, int]], datetime, Future]]):
+        # Scan yang sudah dibatalkan pemanggil (batas tunggu habis) tidak ditulis
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        for percobaan in range(1, self.maks_percobaan + 1):
+            try:
+                with get_db_connection() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        keputusan = _putuskan_batch(conn, [(entri, waktu_scan) for entri, waktu_scan, _ in batch])
+                        # Trigger trg_kuota_insert menaikkan kuota_harian untuk setiap baris valid
+                        conn.executemany(
+                            SQL_TAMBAH_TRANSAKSI,
+                            [(barcode_id, ke_epoch(waktu_scan), status_valid)
+                             for (entri, waktu_scan, _), hasil in zip(batch, keputusan)
+                             for (barcode_id, _), (status_valid, _) in zip(entri, hasil)]
+                        )
+                        mulai = time.perf_counter()
+                        conn.commit()
+                        durasi = time.perf_counter() - mulai
+                    except Exception:
+                        conn.rollback()
+                        raise
+                break
+            except sqlite3.Error as e:
+                self._metrik["commit_gagal"] += 1
+                if percobaan == self.maks_percobaan:
+                    logger.error("Group commit %d scan gagal setelah %d percobaan: %s", len(batch), percobaan, e)
+                    for _, _, hasil in batch:
+                        hasil.set_exception(e)
+                    return
+                logger.warning("Group commit %d scan gagal (%s), mencoba lagi.", len(batch), e)
+                time.sleep(0.1 * percobaan)
+            except Exception as e:
+                # Bukan galat database (data scan tidak valid, bug): mengulang tidak akan menolong
+                self._metrik["commit_gagal"] += 1
+                logger.exception("Group commit %d scan gagal tanpa dicoba ulang.", len(batch))
+                for _, _, hasil in batch:
+                    hasil.set_exception(e)
+                return
+
+        metrik.amati("kantin_commit_detik", durasi)
+        for (_, _, hasil), keputusan_item in zip(batch, keputusan):
+            hasil.set_result(keputusan_item)
+
+        jumlah_baris = sum(len(entri) for entri, _, _ in batch)
+        m = self._metrik
+        m["batch"] += 1
+        m["baris"] += jumlah_baris
+        m["batch_terbesar"] = max(m["batch_terbesar"], jumlah_baris)
+        m["total_commit_detik"] += durasi
+        m["commit_terlama_detik"] = max(m["commit_terlama_detik"], durasi)
+
+    def flush(self):
+        """Tunggu sampai semua scan yang sudah diantrekan selesai diproses."""
+        self._antrean.join()
+
+    def stop(self):
+        """Proses sisa antrean lalu hentikan thread penulis."""
+        if self._thread.is_alive():
+            self._antrean.put(None)
+            self._thread.join()
+
+    def statistik(self) -> Dict[str, Any]:
+        m = dict(self._metrik)
+        m["rata_rata_batch"] = m["baris"] / m["batch"] if m["batch"] else 0.0
+        m["rata_rata_commit_ms"] = 1000 * m["total_commit_detik"] / m["batch"] if m["batch"] else 0.0
+        m["antrean"] = self._antrean.qsize()
+        return m
+
+
+_scan_writer: Optional[ScanWriter] = None
+_scan_writer_lock = threading.Lock()
+
+
+def get_scan_writer() -> ScanWriter:
+    global _scan_writer
+    if _scan_writer is None or _scan_writer.db_file != DB_FILE:
+        with _scan_writer_lock:
+            if _scan_writer is None or _scan_writer.db_file != DB_FILE:
+                if _scan_writer is not None:
+                    _scan_writer.stop()
+                _scan_writer = ScanWriter(DB_FILE, maks_tunda=GROUP_COMMIT_MAKS_TUNDA)
+    return _scan_writer
+
+
+def stop_scan_writer():
+    global _scan_writer
+    with _scan_writer_lock:
+        if _scan_writer is not None:
+            _scan_writer.stop()
+            _scan_writer = None
+
+
+# Didaftarkan setelah close_pool sehingga dijalankan lebih dulu saat proses keluar (LIFO)
+atexit.register(stop_scan_writer)
+metrik.registry.gauge(
+    "kantin_antrean_penulis",
+    lambda: _scan_writer.statistik()["antrean"] if _scan_writer is not None else 0,
+    "Scan yang menunggu di-commit oleh ScanWriter.",
+)
+
+
+# --- LOGIKA INTI SCANNING (TANPA STREAMLIT) ---
+
+def proses_scan(barcode_id: str) -> Tuple[str, str]:
+    """Cari staf, deteksi admin, cek kuota, lalu catat transaksi.
+
+    Mengembalikan (status, pesan) dengan status "Sukses", "Peringatan", "Gagal" atau "Sukses_Admin".
+    Tidak menyentuh state UI, sehingga bisa dipanggil dari Streamlit, thread pemroses lajur, atau API.
+    """
+    mulai = time.perf_counter()
+    status, pesan = _proses_scan(barcode_id)
+    metrik.catat_scan(status, time.perf_counter() - mulai)
+    return status, pesan
+
+
+def _proses_scan(barcode_id: str) -> Tuple[str, str]:
+    with metrik.rentang("kantin_scan_detik", tahap="cari_staf"):
+        staf = direktori_staf().get(barcode_id)
+
+    if not staf:
+        return _pesan_scan(barcode_id, None)
+
+    # 1. CEK HAK AKSES ADMIN (tidak dicatat sebagai transaksi makan)
+    if staf.departemen == ADMIN_DEPARTEMEN_NAME:
+        return _pesan_scan(barcode_id, staf)
+
+    # 2. LOGIKA TRANSAKSI MAKANAN (untuk staf biasa)
+    waktu_scan = datetime.now()
+    jatah_staf = staf.jatah_harian
+
+    with metrik.rentang("kantin_scan_detik", tahap="kuota"):
+        if GROUP_COMMIT:
+            # Cek + catat di transaksi ScanWriter, digabung dengan scan lain yang antre (satu fsync per batch)
+            keputusan = get_scan_writer().catat(barcode_id, jatah_staf, waktu_scan)
+        else:
+            keputusan = _catat_scan_langsung([(barcode_id, jatah_staf)], waktu_scan)[0]
+
+    return _pesan_scan(barcode_id, staf, *keputusan)
+
+
+def _pesan_scan(barcode_id: str, staf: Optional[Staf], status_valid: int = 0,
+                transaksi_hari_ini: int = 0) -> Tuple[str, str]:
+    """Susun (status, pesan) hasil satu scan dari staf (None = tidak terdaftar) & keputusan kuota."""
+    if staf is None:
+        return "Gagal", f"❌ ID Staf '{barcode_id}' tidak terdaftar!"
+
+    nama_staf = staf.nama
+    departemen_staf = staf.departemen
+    jatah_staf = staf.jatah_harian
+
+    if departemen_staf == ADMIN_DEPARTEMEN_NAME:
+        return "Sukses_Admin", f"✅ Akses Admin untuk {nama_staf} berhasil."
+
+    if not status_valid:
+        # Transaksi Ditolak (status_valid = 0)
+        return "Peringatan", f"⚠️ {nama_staf} ({departemen_staf}) sudah mengambil {transaksi_hari_ini}/{jatah_staf} jatah harian!"
+
+    # Transaksi Diterima (status_valid = 1)
+    return "Sukses", f"✅ Makanan untuk {nama_staf} ({departemen_staf}) berhasil dicatat. Jatah tersisa: {jatah_staf - (transaksi_hari_ini + 1)}"
+
+
+def proses_scan_batch(daftar_barcode: List[str]) -> List[Tuple[str, str]]:
+    """Proses banyak ID sekaligus (daftar hadir acara, buffer scanner). Hasil (status, pesan) per ID, urutan sama.
+
+    Staf dicari di direktori memori, kuota seluruh batch dibaca dengan satu query IN lalu diputuskan
+    di memori secara berurutan (ID yang muncul dua kali memakai jatah dua kali), dan semua transaksi
+    ditulis dengan executemany dalam satu transaksi. ValueError bila melebihi MAKS_SCAN_BATCH.
+    """
+    if len(daftar_barcode) > MAKS_SCAN_BATCH:
+        raise ValueError(f"Maksimal {MAKS_SCAN_BATCH} ID per batch (diterima {len(daftar_barcode)}).")
+    if not daftar_barcode:
+        return []
+
+    mulai = time.perf_counter()
+    with metrik.rentang("kantin_scan_detik", tahap="cari_staf"):
+        direktori = direktori_staf()
+        daftar_staf = [direktori.get(barcode_id) for barcode_id in daftar_barcode]
+
+    # Hanya staf biasa yang dicatat sebagai transaksi makan
+    dicatat = [i for i, staf in enumerate(daftar_staf) if staf and staf.departemen != ADMIN_DEPARTEMEN_NAME]
+    keputusan: Dict[int, Tuple[int, int]] = {}
+    if dicatat:
+        waktu_scan = datetime.now()
+        entri = [(daftar_staf[i].barcode_id, daftar_staf[i].jatah_harian) for i in dicatat]
+        with metrik.rentang("kantin_scan_detik", tahap="kuota"):
+            if GROUP_COMMIT:
+                hasil_kuota = get_scan_writer().catat_banyak(entri, waktu_scan)
+            else:
+                hasil_kuota = _catat_scan_langsung(entri, waktu_scan)
+        keputusan = dict(zip(dicatat, hasil_kuota))
+
+    hasil = [
+        _pesan_scan(barcode_id, staf, *keputusan.get(i, (0, 0)))
+        for i, (barcode_id, staf) in enumerate(zip(daftar_barcode, daftar_staf))
+    ]
+    durasi_per_scan = (time.perf_counter() - mulai) / len(hasil)
+    for status, _ in hasil:
+        metrik.catat_scan(status, durasi_per_scan)
+    return hasil
+
+
+def _kuota_tercatat(conn: sqlite3.Connection, daftar_barcode, tanggal: str) -> Dict[str, int]:
+    """jumlah_ambil ter-commit per barcode_id pada `tanggal` (0 bila belum ada), lewat query IN per potongan."""
+    daftar_barcode = list(daftar_barcode)
+    terpakai = dict.fromkeys(daftar_barcode, 0)
+    for i in range(0, len(daftar_barcode), MAKS_PARAMETER_IN):
+        potongan = daftar_barcode[i:i + MAKS_PARAMETER_IN]
+        rows = conn.execute(
+            f"SELECT barcode_id, jumlah_ambil FROM kuota_harian "
+            f"WHERE tanggal = ? AND barcode_id IN ({', '.join('?' * len(potongan))})",
+            [tanggal, *potongan]
+        )
+        for barcode_id, jumlah_ambil in rows:
+            terpakai[barcode_id] = jumlah_ambil
+    return terpakai
+
+
+def _putuskan_batch(conn: sqlite3.Connection,
+                    permintaan: List[Tuple[List[Tuple[str, int]], datetime]]) -> List[List[Tuple[int, int]]]:
+    """Keputusan kuota untuk beberapa (entri, waktu_scan) berurutan, dengan satu query IN per tanggal."""
+    per_tanggal: Dict[str, set] = {}
+    for entri, waktu_scan in permintaan:
+        per_tanggal.setdefault(waktu_scan.date().isoformat(), set()).update(barcode_id for barcode_id, _ in entri)
+    terpakai = {tanggal: _kuota_tercatat(conn, ids, tanggal) for tanggal, ids in per_tanggal.items()}
+    return [_putuskan_kuota(entri, terpakai[waktu_scan.date().isoformat()]) for entri, waktu_scan in permintaan]
+
+
+def _putuskan_kuota(entri: List[Tuple[str, int]], terpakai: Dict[str, int]) -> List[Tuple[int, int]]:
+    """(status_valid, jumlah_sebelumnya) untuk setiap (barcode_id, jatah_harian), berurutan.
+
+    `terpakai` ikut diperbarui, sehingga scan kedua untuk ID yang sama dalam batch melihat scan pertama.
+    """
+    keputusan = []
+    for barcode_id, jatah_harian in entri:
+        jumlah = terpakai[barcode_id]
+        status_valid = 0 if jumlah >= jatah_harian else 1
+        terpakai[barcode_id] = jumlah + status_valid
+        keputusan.append((status_valid, jumlah))
+    return keputusan
+
+
+def _catat_scan_langsung(entri: List[Tuple[str, int]], waktu_scan: datetime) -> List[Tuple[int, int]]:
+    """Cek & catat (barcode_id, jatah_harian) dalam satu transaksi BEGIN IMMEDIATE (satu commit).
+
+    Lock tulis diambil di awal, sehingga dua terminal yang memindai ID yang sama tidak bisa
+    sama-sama lolos cek kuota.
+    """
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            terpakai = _kuota_tercatat(conn, {barcode_id for barcode_id, _ in entri}, waktu_scan.date().isoformat())
+            keputusan = _putuskan_kuota(entri, terpakai)
+
+            # Trigger trg_kuota_insert menaikkan kuota_harian bila status_valid = 1
+            conn.executemany(
+                SQL_TAMBAH_TRANSAKSI,
+                [(barcode_id, ke_epoch(waktu_scan), status_valid)
+                 for (barcode_id, _), (status_valid, _) in zip(entri, keputusan)]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return keputusan
@@ -0,0 +1,301 @@
+"""Hapus lunak staf/departemen: tombstone seketika, pembersihan data di thread latar per potongan kecil.
+
+`hapus_staf` dan `hapus_departemen` hanya menandai baris (`dihapus_pada`) dan mengantrekan tugas di
+tabel `tugas_hapus`; staf langsung hilang dari scan & daftar, departemen dari pilihan. Thread
+pembersih lalu menghapus transaksi staf (tabel utama & partisi arsip) atau memindahkan staf
+departemen ke "Tidak Ditentukan" dalam transaksi pendek berukuran UKURAN_CHUNK_HAPUS, dengan jeda
+di antaranya, sehingga lock tulis tidak pernah ditahan lama dan terminal scan tetap lancar.
+Tugas tersimpan di database: bila proses berhenti, pembersihan dilanjutkan saat proses berikutnya mulai.
+Baris departemen tetap ada sebagai tombstone karena riwayat transaksi & rekap masih merujuknya;
+`pulihkan_departemen` mengaktifkannya lagi bila nama yang sama ditambahkan kembali.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from kantin_arsip import daftar_partisi, file_partisi, lampirkan
+from kantin_db import (ADMIN_BARCODE_ID, ADMIN_DEPARTEMEN_NAME, SQL_ID_DEPARTEMEN, SQL_REKAP_TRANSAKSI,
+                       direktori_staf, get_db_connection, ke_epoch, logger, tandai_perubahan)
+
+DEPARTEMEN_PENGGANTI = "Tidak Ditentukan"
+DEPARTEMEN_TERLINDUNGI = (ADMIN_DEPARTEMEN_NAME, DEPARTEMEN_PENGGANTI)
+UKURAN_CHUNK_HAPUS = 500         # Baris per transaksi pembersihan
+JEDA_CHUNK_DETIK = 0.05          # Beri kesempatan penulis scan mengambil lock di antara potongan
+INTERVAL_CEK_DETIK = 30          # Cek tugas tertunda (mis. dari proses lain) walau tidak dibangunkan
+STATUS_AKTIF = ("menunggu", "berjalan")
+
+
+# --- TOMBSTONE (DIPANGGIL DARI HALAMAN ADMIN) ---
+
+def _antrekan(conn, jenis: str, target: str, waktu: int):
+    conn.execute(
+        "INSERT INTO tugas_hapus (jenis, target, dibuat) VALUES (?, ?, ?)", (jenis, target, waktu)
+    )
+
+
+def hapus_staf(barcode_id: str) -> Tuple[bool, str]:
+    """Tandai staf terhapus dan antrekan pembersihan riwayat transaksinya."""
+    if barcode_id == ADMIN_BARCODE_ID:
+        return False, f"❌ Gagal: Barcode Admin ({ADMIN_BARCODE_ID}) tidak dapat dihapus."
+
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            waktu = ke_epoch(datetime.now())
+            diubah = conn.execute(
+                "UPDATE staf SET dihapus_pada = ? WHERE barcode_id = ? AND dihapus_pada IS NULL", (waktu, barcode_id)
+            ).rowcount
+            if not diubah:
+                conn.rollback()
+                return False, f"❌ Gagal: Barcode ID '{barcode_id}' tidak ditemukan."
+            _antrekan(conn, "staf", barcode_id, waktu)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return False, f"❌ Terjadi kesalahan saat menghapus staf: {e}"
+
+    direktori_staf().invalidate()
+    tandai_perubahan()
+    bangunkan_pembersih()
+    return True, f"✅ Staf {barcode_id} berhasil dihapus. Riwayat transaksinya dibersihkan bertahap di latar."
+
+
+def hapus_departemen(nama: str) -> Tuple[bool, str]:
+    """Tandai departemen terhapus dan antrekan pemindahan stafnya ke DEPARTEMEN_PENGGANTI."""
+    if nama in DEPARTEMEN_TERLINDUNGI:
+        return False, f"❌ Gagal: Departemen '{nama}' tidak dapat dihapus."
+
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            waktu = ke_epoch(datetime.now())
+            diubah = conn.execute(
+                "UPDATE departemen SET dihapus_pada = ? WHERE nama_departemen = ? AND dihapus_pada IS NULL",
+                (waktu, nama)
+            ).rowcount
+            if not diubah:
+                conn.rollback()
+                return False, f"❌ Gagal: Departemen '{nama}' tidak ditemukan."
+            _antrekan(conn, "departemen", nama, waktu)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return False, f"❌ Terjadi kesalahan saat menghapus departemen: {e}"
+
+    tandai_perubahan()
+    bangunkan_pembersih()
+    return True, f"✅ Departemen '{nama}' berhasil dihapus. Staf di dalamnya dipindah ke '{DEPARTEMEN_PENGGANTI}' di latar."
+
+
+def pulihkan_departemen(nama: str) -> bool:
+    """Aktifkan lagi tombstone departemen yang pembersihannya sudah selesai. True bila berhasil."""
+    with get_db_connection() as conn:
+        diubah = conn.execute(f"""
+            UPDATE departemen SET dihapus_pada = NULL
+            WHERE nama_departemen = ? AND dihapus_pada IS NOT NULL AND NOT EXISTS (
+                SELECT 1 FROM tugas_hapus
+                WHERE jenis = 'departemen' AND target = departemen.nama_departemen AND status != 'selesai'
+            )
+        """, (nama,)).rowcount
+        conn.commit()
+    return bool(diubah)
+
+
+def sedang_dihapus(tabel: str, kolom: str, nilai: str) -> bool:
+    """True bila baris dengan `kolom` = `nilai` masih ada sebagai tombstone (menunggu pembersihan)."""
+    with get_db_connection() as conn:
+        return conn.execute(
+            f"SELECT 1 FROM {tabel} WHERE {kolom} = ? AND dihapus_pada IS NOT NULL", (nilai,)
+        ).fetchone() is not None
+
+
+# --- PEMBERSIHAN BERTAHAP ---
+
+def _potongan(sql: str, params: tuple, id_tugas: int) -> int:
+    """Jalankan satu potongan dalam transaksi pendek dan catat progresnya. Mengembalikan jumlah baris."""
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            jumlah = conn.execute(sql, params).rowcount
+            conn.execute("UPDATE tugas_hapus SET diproses = diproses + ? WHERE id = ?", (jumlah, id_tugas))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return jumlah
+
+
+def _ulangi_potongan(sql: str, params: tuple, id_tugas: int):
+    while _potongan(sql, params, id_tugas) >= UKURAN_CHUNK_HAPUS:
+        time.sleep(JEDA_CHUNK_DETIK)
+
+
+def _bersihkan_partisi_staf(barcode_id: str, id_tugas: int):
+    """Hapus transaksi staf di setiap partisi arsip; rekap_harian dikurangi manual (tidak ada trigger di partisi)."""
+    for bulan in daftar_partisi():
+        with get_db_connection() as conn, lampirkan(conn, file_partisi(bulan)) as tabel:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Departemen saat scan (departemen_id baris partisi), sama seperti trg_rekap_delete
+                rows = conn.execute(
+                    SQL_REKAP_TRANSAKSI.format(tabel=tabel, kondisi="T.barcode_id = ?"), (barcode_id,)
+                ).fetchall()
+                if rows:
+                    conn.executemany("""
+                        UPDATE rekap_harian SET valid = valid - ?, ditolak = ditolak - ?
+                        WHERE tanggal = ? AND departemen = ? AND jam = ?
+                    """, [(valid, ditolak, tanggal, departemen, jam) for tanggal, departemen, jam, valid, ditolak in rows])
+                    conn.execute("DELETE FROM rekap_harian WHERE valid <= 0 AND ditolak <= 0")
+                    jumlah = conn.execute(f"DELETE FROM {tabel} WHERE barcode_id = ?", (barcode_id,)).rowcount
+                    conn.execute("UPDATE tugas_hapus SET diproses = diproses + ? WHERE id = ?", (jumlah, id_tugas))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        time.sleep(JEDA_CHUNK_DETIK)
+
+
+def _hitung_total(jenis: str, target: str) -> int:
+    """Perkiraan jumlah baris yang akan diproses (untuk progress bar)."""
+    with get_db_connection() as conn:
+        if jenis == "departemen":
+            return conn.execute(
+                f"SELECT COUNT(*) FROM staf WHERE departemen_id = {SQL_ID_DEPARTEMEN}", (target,)
+            ).fetchone()[0]
+        total = conn.execute("SELECT COUNT(*) FROM transaksi WHERE barcode_id = ?", (target,)).fetchone()[0]
+        for bulan in daftar_partisi():
+            with lampirkan(conn, file_partisi(bulan)) as tabel:
+                total += conn.execute(f"SELECT COUNT(*) FROM {tabel} WHERE barcode_id = ?", (target,)).fetchone()[0]
+    return total
+
+
+def _jalankan_tugas(id_tugas: int, jenis: str, target: str):
+    with get_db_connection() as conn:
+        conn.execute(
+            "UPDATE tugas_hapus SET status = 'berjalan', total = ? WHERE id = ?", (_hitung_total(jenis, target), id_tugas)
+        )
+        conn.commit()
+
+    if jenis == "staf":
+        # Tombstone staf baru dihapus di akhir, agar barcode tidak bisa didaftarkan ulang selama pembersihan
+        _ulangi_potongan("""
+            DELETE FROM transaksi WHERE id IN (SELECT id FROM transaksi WHERE barcode_id = ? LIMIT ?)
+        """, (target, UKURAN_CHUNK_HAPUS), id_tugas)
+        _bersihkan_partisi_staf(target, id_tugas)
+        # Sisa scan yang masuk di antara potongan ikut dihapus bersama baris staf, dalam satu transaksi
+        langkah_akhir = (
+            ("DELETE FROM transaksi WHERE barcode_id = ?", (target,)),
+            ("DELETE FROM staf WHERE barcode_id = ? AND dihapus_pada IS NOT NULL", (target,)),
+        )
+    else:
+        _ulangi_potongan(f"""
+            UPDATE staf SET departemen_id = {SQL_ID_DEPARTEMEN}
+            WHERE id IN (SELECT id FROM staf WHERE departemen_id = {SQL_ID_DEPARTEMEN} LIMIT ?)
+        """, (DEPARTEMEN_PENGGANTI, target, UKURAN_CHUNK_HAPUS), id_tugas)
+        # Baris departemen tidak dihapus: transaksi lama (dan rekapnya) tetap tercatat atas namanya
+        langkah_akhir = (
+            (f"UPDATE staf SET departemen_id = {SQL_ID_DEPARTEMEN} WHERE departemen_id = {SQL_ID_DEPARTEMEN}",
+             (DEPARTEMEN_PENGGANTI, target)),
+        )
+
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in langkah_akhir:
+                conn.execute(sql, params)
+            conn.execute(
+                "UPDATE tugas_hapus SET status = 'selesai', selesai = ? WHERE id = ?", (ke_epoch(datetime.now()), id_tugas)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    direktori_staf().invalidate()
+    tandai_perubahan()
+
+
+def jalankan_tugas_tertunda() -> int:
+    """Kerjakan semua tugas berstatus menunggu/berjalan (terlama dulu). Mengembalikan jumlah tugas selesai."""
+    with get_db_connection() as conn:
+        tugas = conn.execute(
+            f"SELECT id, jenis, target FROM tugas_hapus WHERE status IN ({', '.join('?' * len(STATUS_AKTIF))}) ORDER BY id",
+            STATUS_AKTIF
+        ).fetchall()
+
+    selesai = 0
+    for id_tugas, jenis, target in tugas:
+        try:
+            _jalankan_tugas(id_tugas, jenis, target)
+            selesai += 1
+        except Exception as e:
+            logger.exception("Tugas hapus #%d (%s %s) gagal", id_tugas, jenis, target)
+            with get_db_connection() as conn:
+                conn.execute("UPDATE tugas_hapus SET status = 'gagal', pesan = ? WHERE id = ?", (str(e), id_tugas))
+                conn.commit()
+    return selesai
+
+
+def ulangi_tugas_gagal() -> int:
+    """Kembalikan tugas yang gagal ke antrean (semua langkah aman dijalankan ulang)."""
+    with get_db_connection() as conn:
+        jumlah = conn.execute(
+            "UPDATE tugas_hapus SET status = 'menunggu', pesan = NULL WHERE status = 'gagal'"
+        ).rowcount
+        conn.commit()
+    if jumlah:
+        bangunkan_pembersih()
+    return jumlah
+
+
+def daftar_tugas_hapus(batas: int = 20) -> pd.DataFrame:
+    """Tugas terbaru untuk panel admin (aktif dulu), dengan persentase progres."""
+    with get_db_connection() as conn:
+        df = pd.read_sql_query(f"""
+            SELECT id, jenis, target, dibuat, status, total, diproses, selesai, pesan
+            FROM tugas_hapus
+            ORDER BY status IN ({', '.join('?' * len(STATUS_AKTIF))}) DESC, id DESC
+            LIMIT ?
+        """, conn, params=[*STATUS_AKTIF, batas])
+    df['dibuat'] = pd.to_datetime(df['dibuat'], unit='s')
+    df['selesai'] = pd.to_datetime(df['selesai'], unit='s')
+    total = df['total'].fillna(0)
+    df['progres'] = (df['diproses'] / total.where(total > 0)).clip(upper=1.0).fillna(
+        (df['status'] == 'selesai').astype(float)
+    )
+    return df
+
+
+# --- THREAD PEMBERSIH (SATU PER PROSES) ---
+
+_pembersih: Optional[threading.Thread] = None
+_pembersih_lock = threading.Lock()
+_bangunkan = threading.Event()
+
+
+def bangunkan_pembersih():
+    _bangunkan.set()
+
+
+def mulai_pembersih_latar():
+    """Jalankan jalankan_tugas_tertunda di thread latar: segera, saat dibangunkan, dan tiap INTERVAL_CEK_DETIK.
+
+    Hanya satu thread per proses, berapa kali pun dipanggil (aman dari rerun Streamlit).
+    """
+    global _pembersih
+
+    def _jalankan():
+        while True:
+            _bangunkan.clear()
+            try:
+                jalankan_tugas_tertunda()
+            except Exception:
+                logger.exception("Pembersihan data terhapus gagal")
+            _bangunkan.wait(INTERVAL_CEK_DETIK)
+
+    with _pembersih_lock:
+        if _pembersih is None:
+            _pembersih = threading.Thread(target=_jalankan, name="pembersih-hapus", daemon=True)
+            _pembersih.start()
@@ -0,0 +1,207 @@
+"""Impor massal staf dari CSV: validasi di memori, pratinjau perubahan, lalu satu transaksi executemany.
+
+Kolom wajib: barcode_id, nama, departemen. Kolom jatah_harian opsional (staf baru: 1, staf lama:
+tetap). Pemisah koma, titik koma, atau tab dikenali otomatis.
+"""
+import csv
+import io
+import sqlite3
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from kantin_db import (ADMIN_BARCODE_ID, ADMIN_DEPARTEMEN_NAME, SQL_ID_DEPARTEMEN, Staf, direktori_staf,
+                       get_db_connection, tandai_perubahan)
+
+KOLOM_WAJIB = ("barcode_id", "nama", "departemen")
+KOLOM_IMPOR = KOLOM_WAJIB + ("jatah_harian",)
+JATAH_DEFAULT = 1
+MAKS_JATAH = 10                  # Batas wajar jatah harian per staf
+
+
+class GalatImpor(NamedTuple):
+    baris: int                   # Nomor baris di file (header = baris 1)
+    barcode_id: str
+    pesan: str
+
+
+@dataclass
+class RencanaImpor:
+    """Hasil dry-run: baris yang akan ditambah/diubah, yang tidak berubah, dan yang ditolak."""
+    tambah: List[Staf] = field(default_factory=list)
+    ubah: List[Tuple[Staf, Staf]] = field(default_factory=list)     # (lama, baru)
+    tetap: int = 0
+    galat: List[GalatImpor] = field(default_factory=list)
+    baris: Dict[str, int] = field(default_factory=dict)             # barcode_id -> nomor baris di file
+
+    @property
+    def ada_perubahan(self) -> bool:
+        return bool(self.tambah or self.ubah)
+
+    def pratinjau(self) -> pd.DataFrame:
+        """Tabel diff untuk ditampilkan sebelum impor diterapkan."""
+        data = [("Tambah", s.barcode_id, s.nama, s.departemen, s.jatah_harian, "") for s in self.tambah]
+        for lama, baru in self.ubah:
+            perubahan = [
+                f"{kolom}: {getattr(lama, kolom)} → {getattr(baru, kolom)}"
+                for kolom in ("nama", "departemen", "jatah_harian")
+                if getattr(lama, kolom) != getattr(baru, kolom)
+            ]
+            data.append(("Ubah", baru.barcode_id, baru.nama, baru.departemen, baru.jatah_harian, "; ".join(perubahan)))
+        return pd.DataFrame(data, columns=["Aksi", "ID Barcode", "Nama Staf", "Departemen", "Jatah Harian", "Perubahan"])
+
+    def laporan_galat(self) -> pd.DataFrame:
+        return pd.DataFrame(self.galat, columns=["Baris", "ID Barcode", "Kesalahan"])
+
+
+def _normalisasi_header(nama: str) -> str:
+    return nama.strip().lower().replace(" ", "_")
+
+
+def baca_csv(file: BinaryIO) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Baca file CSV (bytes) baris per baris tanpa memuat seluruh isi ke memori.
+
+    Menghasilkan (nomor_baris, dict kolom -> nilai). ValueError bila kolom wajib tidak ada.
+    """
+    teks = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        contoh = teks.read(4096)
+        teks.seek(0)
+        try:
+            dialek = csv.Sniffer().sniff(contoh, delimiters=",;\t")
+        except csv.Error:
+            dialek = csv.excel
+
+        reader = csv.reader(teks, dialek)
+        header = [_normalisasi_header(h) for h in next(reader, [])]
+        kurang = [kolom for kolom in KOLOM_WAJIB if kolom not in header]
+        if kurang:
+            raise ValueError(f"Kolom wajib tidak ditemukan: {', '.join(kurang)}.")
+
+        for nomor, baris in enumerate(reader, start=2):
+            if not any(nilai.strip() for nilai in baris):
+                continue
+            yield nomor, {kolom: nilai.strip() for kolom, nilai in zip(header, baris) if kolom in KOLOM_IMPOR}
+    finally:
+        # Lepas wrapper tanpa menutup file asli (UploadedFile milik Streamlit)
+        teks.detach()
+
+
+def rencanakan_impor(file: BinaryIO) -> RencanaImpor:
+    """Dry-run: validasi setiap baris terhadap direktori staf & tabel departemen, tanpa menulis apa pun."""
+    with get_db_connection() as conn:
+        departemen = {
+            row['nama_departemen'].lower(): row['nama_departemen']
+            for row in conn.execute("SELECT nama_departemen FROM departemen WHERE dihapus_pada IS NULL")
+        }
+        sedang_dihapus = {row[0] for row in conn.execute("SELECT barcode_id FROM staf WHERE dihapus_pada IS NOT NULL")}
+    staf_lama = {s.barcode_id: s for s in direktori_staf().semua()}
+
+    rencana = RencanaImpor()
+    sudah_dibaca: Dict[str, int] = {}
+    for nomor, data in baca_csv(file):
+        barcode_id = data.get("barcode_id", "")
+        nama = data.get("nama", "")
+        nama_dept = departemen.get(data.get("departemen", "").lower())
+
+        if not barcode_id or not nama:
+            rencana.galat.append(GalatImpor(nomor, barcode_id, "barcode_id dan nama wajib diisi."))
+            continue
+        if barcode_id in sudah_dibaca:
+            rencana.galat.append(GalatImpor(nomor, barcode_id, f"Duplikat barcode_id (sudah ada di baris {sudah_dibaca[barcode_id]})."))
+            continue
+        sudah_dibaca[barcode_id] = nomor
+        if barcode_id == ADMIN_BARCODE_ID:
+            rencana.galat.append(GalatImpor(nomor, barcode_id, "Barcode Admin tidak dapat diubah lewat impor."))
+            continue
+        if barcode_id in sedang_dihapus:
+            rencana.galat.append(GalatImpor(nomor, barcode_id, "Staf masih dalam proses penghapusan; impor ulang setelah selesai."))
+            continue
+        if nama_dept is None:
+            rencana.galat.append(GalatImpor(nomor, barcode_id, f"Departemen '{data.get('departemen', '')}' tidak terdaftar."))
+            continue
+        if nama_dept == ADMIN_DEPARTEMEN_NAME:
+            rencana.galat.append(GalatImpor(nomor, barcode_id, f"Departemen '{ADMIN_DEPARTEMEN_NAME}' tidak dapat dipakai."))
+            continue
+
+        lama = staf_lama.get(barcode_id)
+        jatah: Optional[int] = lama.jatah_harian if lama else JATAH_DEFAULT
+        if data.get("jatah_harian"):
+            try:
+                jatah = int(data["jatah_harian"])
+            except ValueError:
+                jatah = None
+            if jatah is None or not 0 <= jatah <= MAKS_JATAH:
+                rencana.galat.append(GalatImpor(nomor, barcode_id, f"jatah_harian harus bilangan 0-{MAKS_JATAH}."))
+                continue
+
+        baru = Staf(barcode_id, nama, nama_dept, jatah)
+        rencana.baris[barcode_id] = nomor
+        if lama is None:
+            rencana.tambah.append(baru)
+        elif lama != baru:
+            rencana.ubah.append((lama, baru))
+        else:
+            rencana.tetap += 1
+    return rencana
+
+
+def terapkan_impor(rencana: RencanaImpor) -> Tuple[bool, str]:
+    """Tulis semua tambah/ubah dalam satu transaksi (semua berhasil atau tidak sama sekali).
+
+    Baris divalidasi ulang di dalam transaksi: staf yang dihapus atau departemen yang dihapus sejak
+    pratinjau dilewati dan ditambahkan ke `rencana.galat`, bukan dilaporkan sebagai berhasil.
+    """
+    if not rencana.ada_perubahan:
+        return False, "❌ Tidak ada perubahan untuk diimpor."
+
+    data = rencana.tambah + [baru for _, baru in rencana.ubah]
+    dilewati: List[GalatImpor] = []
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            sedang_dihapus = {row[0] for row in conn.execute("SELECT barcode_id FROM staf WHERE dihapus_pada IS NOT NULL")}
+            departemen = {row[0] for row in conn.execute("SELECT nama_departemen FROM departemen WHERE dihapus_pada IS NULL")}
+            valid = []
+            for staf in data:
+                if staf.barcode_id in sedang_dihapus:
+                    pesan = "Staf dihapus setelah pratinjau; tidak diimpor."
+                elif staf.departemen not in departemen:
+                    pesan = f"Departemen '{staf.departemen}' dihapus setelah pratinjau; tidak diimpor."
+                else:
+                    valid.append(staf)
+                    continue
+                dilewati.append(GalatImpor(rencana.baris.get(staf.barcode_id, 0), staf.barcode_id, pesan))
+
+            # Upsert: staf yang ditambahkan orang lain sejak pratinjau ikut diperbarui, bukan gagal
+            tertulis = conn.executemany(f"""
+                INSERT INTO staf (barcode_id, nama, departemen_id, jatah_harian) VALUES (?, ?, {SQL_ID_DEPARTEMEN}, ?)
+                ON CONFLICT (barcode_id) DO UPDATE
+                SET nama = excluded.nama, departemen_id = excluded.departemen_id, jatah_harian = excluded.jatah_harian
+                WHERE staf.dihapus_pada IS NULL
+            """, valid).rowcount
+            if valid and tertulis != len(valid):
+                raise sqlite3.DatabaseError(f"{len(valid) - tertulis} baris tidak tertulis; impor dibatalkan.")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return False, f"❌ Terjadi kesalahan saat mengimpor staf: {e}"
+    rencana.galat.extend(sorted(dilewati))
+    if not valid:
+        return False, f"❌ Tidak ada staf yang diimpor: {len(dilewati)} baris dilewati (lihat laporan kesalahan)."
+
+    direktori_staf().invalidate()
+    tandai_perubahan()
+    id_dilewati = {g.barcode_id for g in dilewati}
+    jumlah_tambah = sum(1 for s in rencana.tambah if s.barcode_id not in id_dilewati)
+    jumlah_ubah = sum(1 for _, s in rencana.ubah if s.barcode_id not in id_dilewati)
+    pesan = f"✅ Impor selesai: {jumlah_tambah} staf ditambahkan, {jumlah_ubah} staf diperbarui."
+    if dilewati:
+        pesan += f" {len(dilewati)} baris dilewati (lihat laporan kesalahan)."
+    return True, pesan
+
+
+def templat_csv() -> bytes:
+    """Contoh file impor (header + satu baris) untuk diunduh."""
+    return (",".join(KOLOM_IMPOR) + "\n3003C,Nama Staf,Produksi,1\n").encode("utf-8")
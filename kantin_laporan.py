@@ -0,0 +1,404 @@
+import csv
+import os
+import tempfile
+from datetime import date
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+import kantin_metrik as metrik
+from kantin_arsip import lampirkan, partisi_dalam_rentang
+from kantin_db import ADMIN_DEPARTEMEN_NAME, SQL_ID_DEPARTEMEN, cache_versi, get_db_connection, rentang_waktu
+
+SEMUA_DEPARTEMEN = "Semua Departemen"
+KOLOM_TRANSAKSI = ['Waktu', 'Nama Staf', 'Departemen', 'ID Barcode', 'Status']
+KOLOM_JATAH_HARIAN = ['Nama Staf', 'Departemen', 'ID Barcode', 'Jatah Harian', 'Sudah Diambil', 'Sisa Jatah', 'Status']
+STATUS_TRANSAKSI = ['BATAS (Ditolak)', 'VALID']    # Indeks = nilai status_valid
+STATUS_JATAH = ['Tersedia', 'Selesai']
+
+UKURAN_CHUNK_EKSPOR = 10_000   # Baris per fetchmany() saat ekspor
+FORMAT_EKSPOR = {"CSV": ".csv", "Parquet": ".parquet"}
+MESIN_ANALITIK = "sqlite"      # "sqlite" (bawaan) atau "duckdb" (opsional, lihat kantin_analitik)
+
+# Kursor keyset untuk riwayat transaksi: (waktu_transaksi, id) baris terakhir di halaman sebelumnya
+Kursor = Tuple[int, int]
+
+
+def _filter_transaksi(departemen_filter=None, start_date=None, end_date=None, tanpa_admin=False):
+    """Susun klausa WHERE (tanpa kata WHERE) & parameter untuk query transaksi JOIN staf."""
+    # Staf yang sudah dihapus (tombstone) tidak tampil, walau transaksinya belum selesai dibersihkan
+    where_clauses = ["S.dihapus_pada IS NULL"]
+    params = []
+    
+    if departemen_filter and departemen_filter != SEMUA_DEPARTEMEN:
+        where_clauses.append(f"S.departemen_id = {SQL_ID_DEPARTEMEN}")
+        params.append(departemen_filter)
+    elif tanpa_admin:
+        where_clauses.append(f"S.departemen_id IS NOT {SQL_ID_DEPARTEMEN}")
+        params.append(ADMIN_DEPARTEMEN_NAME)
+    
+    # Rentang setengah-terbuka [awal, akhir+1 hari) agar idx_transaksi_waktu terpakai
+    waktu_awal, waktu_akhir = rentang_waktu(start_date, end_date)
+    
+    if waktu_awal:
+        where_clauses.append("T.waktu_transaksi >= ?")
+        params.append(waktu_awal) 
+    
+    if waktu_akhir:
+        where_clauses.append("T.waktu_transaksi < ?")
+        params.append(waktu_akhir) 
+
+    return where_clauses, params
+
+
+def _mesin_duckdb():
+    """Modul kantin_analitik bila MESIN_ANALITIK = "duckdb" dan DuckDB dapat dipakai; selain itu None."""
+    if MESIN_ANALITIK != "duckdb":
+        return None
+    import kantin_analitik
+    return kantin_analitik if kantin_analitik.tersedia() else None
+
+
+def _bentuk_transaksi(df: pd.DataFrame) -> pd.DataFrame:
+    """Ubah hasil query transaksi (kolom mentah) menjadi kolom laporan secara vektor.
+
+    Kolom selalu lengkap meskipun hasil kosong.
+    """
+    return pd.DataFrame({
+        'Waktu': pd.to_datetime(df['waktu_transaksi'], unit='s'),
+        'Nama Staf': df['nama'],
+        'Departemen': df['departemen'].astype('category'),
+        'ID Barcode': df['barcode_id'],
+        # status_valid 0/1 langsung menjadi kode kategori
+        'Status': pd.Categorical.from_codes(df['status_valid'].astype('int8'), categories=STATUS_TRANSAKSI),
+    }, columns=KOLOM_TRANSAKSI)
+
+
+# --- FUNGSI get_all_transaksi (Stabil) ---
+@cache_versi
+@metrik.diukur("kantin_laporan_detik")
+def get_all_transaksi(departemen_filter=None, start_date=None, end_date=None, tanpa_admin=False):
+    mesin = _mesin_duckdb()
+    if mesin:
+        return mesin.get_all_transaksi(departemen_filter, start_date, end_date, tanpa_admin)
+
+    query = """
+        SELECT T.waktu_transaksi, S.nama, D.nama_departemen AS departemen, T.barcode_id, T.status_valid
+        FROM {tabel} AS T 
+        JOIN staf AS S ON T.barcode_id = S.barcode_id
+        LEFT JOIN departemen AS D ON D.id = S.departemen_id
+    """
+    where_clauses, params = _filter_transaksi(departemen_filter, start_date, end_date, tanpa_admin)
+        
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+        
+    query += " ORDER BY T.waktu_transaksi DESC"
+        
+    # Tabel utama lalu partisi arsip (terbaru dulu): hasil gabungan tetap urut waktu menurun
+    bagian = []
+    with get_db_connection() as conn:
+        for path in [None, *partisi_dalam_rentang(start_date, end_date)]:
+            with lampirkan(conn, path) as tabel:
+                bagian.append(pd.read_sql_query(query.format(tabel=tabel), conn, params=params))
+    
+    return _bentuk_transaksi(pd.concat(bagian, ignore_index=True) if len(bagian) > 1 else bagian[0])
+
+
+@cache_versi
+@metrik.diukur("kantin_laporan_detik")
+def hitung_transaksi(departemen_filter=None, start_date=None, end_date=None):
+    """Ringkasan murah untuk header laporan: total, valid, dan ditolak (tanpa departemen admin)."""
+    mesin = _mesin_duckdb()
+    if mesin:
+        return mesin.hitung_transaksi(departemen_filter, start_date, end_date)
+
+    query = """
+        SELECT COUNT(*) AS total, COALESCE(SUM(T.status_valid = 1), 0) AS valid
+        FROM {tabel} AS T 
+        JOIN staf AS S ON T.barcode_id = S.barcode_id
+    """
+    where_clauses, params = _filter_transaksi(departemen_filter, start_date, end_date, tanpa_admin=True)
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+
+    total = valid = 0
+    with get_db_connection() as conn:
+        for path in [None, *partisi_dalam_rentang(start_date, end_date)]:
+            with lampirkan(conn, path) as tabel:
+                row = conn.execute(query.format(tabel=tabel), params).fetchone()
+            total += row['total']
+            valid += row['valid']
+    return {'total': total, 'valid': valid, 'ditolak': total - valid}
+
+
+@cache_versi
+@metrik.diukur("kantin_laporan_detik")
+def get_halaman_transaksi(departemen_filter=None, start_date=None, end_date=None,
+                          page_size=50, kursor: Optional[Kursor] = None):
+    """Satu halaman riwayat transaksi (terbaru dulu) dengan paginasi keyset pada (waktu_transaksi, id).
+
+    `kursor` adalah kunci baris terakhir halaman sebelumnya (None untuk halaman pertama). Biaya
+    query sebanding dengan `page_size`, bukan dengan panjang rentang tanggal atau nomor halaman.
+    Mengembalikan (DataFrame, kursor_berikutnya); kursor_berikutnya None jika ini halaman terakhir.
+    """
+    query = """
+        SELECT T.id, T.waktu_transaksi, S.nama, D.nama_departemen AS departemen, T.barcode_id, T.status_valid
+        FROM {tabel} AS T 
+        JOIN staf AS S ON T.barcode_id = S.barcode_id
+        LEFT JOIN departemen AS D ON D.id = S.departemen_id
+    """
+    # Kursor selalu berada di dalam rentang, jadi batas atasnya menggantikan batas end_date:
+    # index idx_transaksi_waktu langsung melompat ke posisi kursor, tanpa melewati halaman sebelumnya
+    where_clauses, params = _filter_transaksi(
+        departemen_filter, start_date, end_date if kursor is None else None, tanpa_admin=True
+    )
+    if kursor is not None:
+        where_clauses.append("T.waktu_transaksi <= ?")
+        where_clauses.append("(T.waktu_transaksi, T.id) < (?, ?)")
+        params.append(kursor[0])
+        params.extend(kursor)
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+
+    # Ambil satu baris ekstra untuk mengetahui apakah masih ada halaman berikutnya
+    query += " ORDER BY T.waktu_transaksi DESC, T.id DESC LIMIT ?"
+
+    # Tabel utama lalu partisi arsip (terbaru dulu) sampai halaman terisi
+    bagian, jumlah = [], 0
+    with get_db_connection() as conn:
+        for path in [None, *partisi_dalam_rentang(start_date, end_date)]:
+            with lampirkan(conn, path) as tabel:
+                df = pd.read_sql_query(query.format(tabel=tabel), conn, params=[*params, page_size + 1 - jumlah])
+            bagian.append(df)
+            jumlah += len(df)
+            if jumlah > page_size:
+                break
+    df = pd.concat(bagian, ignore_index=True) if len(bagian) > 1 else bagian[0]
+
+    kursor_berikutnya = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        kursor_berikutnya = (int(df['waktu_transaksi'].iat[-1]), int(df['id'].iat[-1]))
+
+    return _bentuk_transaksi(df), kursor_berikutnya
+
+
+@cache_versi
+@metrik.diukur("kantin_laporan_detik")
+def get_jatah_harian_staf(departemen_filter=None, tanpa_admin=False):
+    mesin = _mesin_duckdb()
+    if mesin:
+        return mesin.get_jatah_harian_staf(departemen_filter, tanpa_admin)
+
+    query = """
+        SELECT 
+            S.barcode_id, 
+            S.nama, 
+            D.nama_departemen AS departemen,  
+            S.jatah_harian, 
+            COALESCE(K.jumlah_ambil, 0) as sudah_ambil
+        FROM staf AS S
+        LEFT JOIN departemen AS D ON D.id = S.departemen_id
+        LEFT JOIN kuota_harian AS K 
+            ON K.barcode_id = S.barcode_id AND K.tanggal = ?
+    """
+    query += " WHERE S.dihapus_pada IS NULL"
+    params = [date.today().isoformat()]
+    if departemen_filter and departemen_filter != SEMUA_DEPARTEMEN:
+        query += f" AND S.departemen_id = {SQL_ID_DEPARTEMEN}"
+        params.append(departemen_filter)
+    elif tanpa_admin:
+        query += f" AND S.departemen_id IS NOT {SQL_ID_DEPARTEMEN}"
+        params.append(ADMIN_DEPARTEMEN_NAME)
+        
+    query += " ORDER BY S.nama"
+    
+    with get_db_connection() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+    
+    sisa_jatah = df['jatah_harian'] - df['sudah_ambil']
+    return pd.DataFrame({
+        'Nama Staf': df['nama'],
+        'Departemen': df['departemen'].astype('category'),
+        'ID Barcode': df['barcode_id'],
+        'Jatah Harian': df['jatah_harian'],
+        'Sudah Diambil': df['sudah_ambil'],
+        'Sisa Jatah': sisa_jatah,
+        # Kode 0 = Tersedia, 1 = Selesai
+        'Status': pd.Categorical.from_codes((sisa_jatah <= 0).astype('int8'), categories=STATUS_JATAH),
+    }, columns=KOLOM_JATAH_HARIAN)
+
+
+# --- ANALITIK DARI REKAP_HARIAN (tanpa menyentuh tabel transaksi) ---
+
+def _filter_rekap(departemen_filter=None, start_date=None, end_date=None):
+    """Klausa WHERE & parameter untuk rekap_harian; departemen admin selalu dikecualikan."""
+    where_clauses = ["departemen != ?"]
+    params = [ADMIN_DEPARTEMEN_NAME]
+    if departemen_filter and departemen_filter != SEMUA_DEPARTEMEN:
+        where_clauses.append("departemen = ?")
+        params.append(departemen_filter)
+    if start_date:
+        where_clauses.append("tanggal >= ?")
+        params.append(str(start_date))
+    if end_date:
+        where_clauses.append("tanggal <= ?")
+        params.append(str(end_date))
+    return " AND ".join(where_clauses), params
+
+
+@cache_versi
+@metrik.diukur("kantin_laporan_detik")
+def get_rekap_harian(departemen_filter=None, start_date=None, end_date=None) -> pd.DataFrame:
+    """Jumlah valid/ditolak per tanggal & departemen (kolom: Tanggal, Departemen, Valid, Ditolak)."""
+    where_sql, params = _filter_rekap(departemen_filter, start_date, end_date)
+    with get_db_connection() as conn:
+        df = pd.read_sql_query(f"""
+            SELECT tanggal, departemen, SUM(valid) AS valid, SUM(ditolak) AS ditolak
+            FROM rekap_harian WHERE {where_sql}
+            GROUP BY tanggal, departemen
+            ORDER BY tanggal, departemen
+        """, conn, params=params)
+    return pd.DataFrame({
+        'Tanggal': pd.to_datetime(df['tanggal']),
+        'Departemen': df['departemen'].astype('category'),
+        'Valid': df['valid'].astype('int64'),
+        'Ditolak': df['ditolak'].astype('int64'),
+    })
+
+
+@cache_versi
+@metrik.diukur("kantin_laporan_detik")
+def get_rekap_jam(departemen_filter=None, start_date=None, end_date=None) -> pd.DataFrame:
+    """Jumlah valid/ditolak per jam (0-23) dalam rentang tanggal, untuk histogram jam sibuk."""
+    where_sql, params = _filter_rekap(departemen_filter, start_date, end_date)
+    with get_db_connection() as conn:
+        df = pd.read_sql_query(f"""
+            SELECT jam, SUM(valid) AS valid, SUM(ditolak) AS ditolak
+            FROM rekap_harian WHERE {where_sql}
+            GROUP BY jam
+        """, conn, params=params)
+    # Jam tanpa transaksi tetap muncul dengan nilai 0
+    return (df.set_index('jam').reindex(range(24), fill_value=0).astype('int64')
+              .rename_axis('Jam').rename(columns={'valid': 'Valid', 'ditolak': 'Ditolak'}))
+
+
+# --- EKSPOR BERTAHAP (CSV / PARQUET) ---
+
+def _chunk_query(conn, query, params, partisi: List[str]) -> Iterator[list]:
+    """Hasil query per chunk fetchmany(); `{tabel}` di query diisi tabel utama lalu tiap partisi."""
+    for path in [None, *partisi]:
+        with lampirkan(conn, path) as tabel:
+            cursor = conn.execute(query.format(tabel=tabel), params)
+            while True:
+                chunk = cursor.fetchmany(UKURAN_CHUNK_EKSPOR)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def _tulis_ekspor(query, params, kolom: List[str], format_file: str, total: int,
+                  progress: Optional[Callable[[int, int], None]] = None,
+                  kolom_angka: Tuple[str, ...] = (), partisi: List[str] = ()) -> Tuple[str, int]:
+    """Alirkan hasil query ke file sementara per chunk; hanya satu chunk yang ada di memori.
+
+    Untuk Parquet, kolom di `kolom_angka` bertipe int64 dan sisanya string. Bila `partisi` diisi,
+    query (dengan `{tabel}`) dijalankan juga pada setiap partisi arsip secara berurutan.
+
+    Mengembalikan (path file, jumlah baris). Pemanggil bertanggung jawab menghapus file.
+    """
+    if format_file not in FORMAT_EKSPOR:
+        raise ValueError(f"Format ekspor '{format_file}' tidak dikenal.")
+
+    fd, path = tempfile.mkstemp(prefix="kantin_ekspor_", suffix=FORMAT_EKSPOR[format_file])
+    os.close(fd)
+    jumlah = 0
+    try:
+        with get_db_connection() as conn:
+            chunks = _chunk_query(conn, query, params, partisi)
+            if format_file == "CSV":
+                with open(path, "w", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(kolom)
+                    for chunk in chunks:
+                        writer.writerows(chunk)
+                        jumlah += len(chunk)
+                        if progress:
+                            progress(jumlah, total)
+            else:
+                # pyarrow hanya diperlukan untuk Parquet (sudah terpasang bersama Streamlit)
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                schema = pa.schema([
+                    (nama, pa.int64() if nama in kolom_angka else pa.string()) for nama in kolom
+                ])
+                with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+                    for chunk in chunks:
+                        kolom_chunk = [
+                            pa.array(nilai, type=field.type) for nilai, field in zip(zip(*chunk), schema)
+                        ]
+                        writer.write_table(pa.Table.from_arrays(kolom_chunk, schema=schema))
+                        jumlah += len(chunk)
+                        if progress:
+                            progress(jumlah, total)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, jumlah
+
+
+@metrik.diukur("kantin_laporan_detik")
+def ekspor_transaksi(format_file="CSV", departemen_filter=None, start_date=None, end_date=None,
+                     progress: Optional[Callable[[int, int], None]] = None) -> Tuple[str, int]:
+    """Ekspor riwayat transaksi (tanpa departemen admin) ke file CSV/Parquet sementara."""
+    query = """
+        SELECT datetime(T.waktu_transaksi, 'unixepoch'), S.nama, D.nama_departemen, T.barcode_id,
+               CASE WHEN T.status_valid THEN 'VALID' ELSE 'BATAS (Ditolak)' END
+        FROM {tabel} AS T 
+        JOIN staf AS S ON T.barcode_id = S.barcode_id
+        LEFT JOIN departemen AS D ON D.id = S.departemen_id
+    """
+    where_clauses, params = _filter_transaksi(departemen_filter, start_date, end_date, tanpa_admin=True)
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    query += " ORDER BY T.waktu_transaksi DESC"
+
+    total = hitung_transaksi(departemen_filter, start_date, end_date)['total']
+    return _tulis_ekspor(query, params, KOLOM_TRANSAKSI, format_file, total, progress,
+                         partisi=partisi_dalam_rentang(start_date, end_date))
+
+
+@metrik.diukur("kantin_laporan_detik")
+def ekspor_jatah_harian(format_file="CSV", departemen_filter=None,
+                        progress: Optional[Callable[[int, int], None]] = None) -> Tuple[str, int]:
+    """Ekspor laporan jatah harian hari ini (tanpa departemen admin) ke file CSV/Parquet sementara."""
+    if departemen_filter and departemen_filter != SEMUA_DEPARTEMEN:
+        where_sql, where_params = f"S.departemen_id = {SQL_ID_DEPARTEMEN}", [departemen_filter]
+    else:
+        where_sql, where_params = f"S.departemen_id IS NOT {SQL_ID_DEPARTEMEN}", [ADMIN_DEPARTEMEN_NAME]
+    where_sql += " AND S.dihapus_pada IS NULL"
+
+    query = f"""
+        SELECT 
+            S.nama, 
+            D.nama_departemen,  
+            S.barcode_id, 
+            S.jatah_harian, 
+            COALESCE(K.jumlah_ambil, 0),
+            S.jatah_harian - COALESCE(K.jumlah_ambil, 0),
+            CASE WHEN S.jatah_harian - COALESCE(K.jumlah_ambil, 0) <= 0 THEN 'Selesai' ELSE 'Tersedia' END
+        FROM staf AS S
+        LEFT JOIN departemen AS D ON D.id = S.departemen_id
+        LEFT JOIN kuota_harian AS K 
+            ON K.barcode_id = S.barcode_id AND K.tanggal = ?
+        WHERE {where_sql}
+        ORDER BY S.nama
+    """
+    params = [date.today().isoformat()] + where_params
+
+    with get_db_connection() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM staf AS S WHERE {where_sql}", where_params).fetchone()[0]
+    return _tulis_ekspor(query, params, KOLOM_JATAH_HARIAN, format_file, total, progress,
+                         kolom_angka=('Jatah Harian', 'Sudah Diambil', 'Sisa Jatah'))
@@ -0,0 +1,351 @@
+"""Instrumentasi ringan per proses: counter, histogram latensi, pencatat SQL lambat, endpoint Prometheus.
+
+Semua metrik disimpan di memori proses (dibagi semua sesi Streamlit / thread API) dan bisa dibaca
+lewat `render_prometheus()` (format teks Prometheus), `ringkasan()` (untuk tab Kinerja), atau
+HTTP `GET /metrics` dari `mulai_server_metrik()` / kantin_api.
+"""
+import bisect
+import functools
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+METRIK_AKTIF = True
+METRIK_HOST = "127.0.0.1"
+METRIK_PORT = 9108               # Endpoint /metrics untuk proses Streamlit (None = tidak dijalankan)
+SQL_LAMBAT_DETIK = 0.1           # Statement yang lebih lama dari ini dicatat di daftar SQL lambat
+MAKS_SQL_LAMBAT = 50
+JENDELA_LAJU_DETIK = 60          # Jendela untuk menghitung scan/detik di tab Kinerja
+
+# Batas atas bucket histogram (detik), dari 0.1 ms sampai 5 detik
+BUCKET_DETIK = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+Label = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Histogram kumulatif bergaya Prometheus dengan estimasi kuantil dari bucket."""
+
+    def __init__(self, bucket: Tuple[float, ...] = BUCKET_DETIK):
+        self.bucket = bucket
+        self.jumlah_bucket = [0] * (len(bucket) + 1)    # Elemen terakhir = +Inf
+        self.total = 0.0
+        self.n = 0
+
+    def amati(self, nilai: float):
+        self.jumlah_bucket[bisect.bisect_left(self.bucket, nilai)] += 1
+        self.total += nilai
+        self.n += 1
+
+    def salin(self) -> "Histogram":
+        salinan = Histogram(self.bucket)
+        salinan.jumlah_bucket, salinan.total, salinan.n = list(self.jumlah_bucket), self.total, self.n
+        return salinan
+
+    def kuantil(self, q: float) -> float:
+        """Perkiraan kuantil dengan interpolasi linear di dalam bucket."""
+        if not self.n:
+            return 0.0
+        target = q * self.n
+        kumulatif = 0
+        for i, jumlah in enumerate(self.jumlah_bucket):
+            if kumulatif + jumlah >= target and jumlah:
+                bawah = self.bucket[i - 1] if i > 0 else 0.0
+                atas = self.bucket[i] if i < len(self.bucket) else self.bucket[-1]
+                return bawah + (atas - bawah) * (target - kumulatif) / jumlah
+            kumulatif += jumlah
+        return self.bucket[-1]
+
+
+class SqlLambat(NamedTuple):
+    waktu: datetime
+    durasi: float
+    sql: str
+
+
+class Registry:
+    """Tempat semua metrik satu proses. Aman dipakai dari banyak thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counter: Dict[str, Dict[Label, float]] = {}
+        self._histogram: Dict[str, Dict[Label, Histogram]] = {}
+        self._gauge: Dict[str, Callable[[], float]] = {}
+        self._bantuan: Dict[str, str] = {}
+        self._waktu_scan: Deque[float] = deque(maxlen=100_000)
+        self.sql_lambat: Deque[SqlLambat] = deque(maxlen=MAKS_SQL_LAMBAT)
+        self.mulai = time.time()
+
+    def jelaskan(self, nama: str, bantuan: str):
+        self._bantuan[nama] = bantuan
+
+    def tambah(self, nama: str, nilai: float = 1, **label: str):
+        kunci = tuple(sorted(label.items()))
+        with self._lock:
+            seri = self._counter.setdefault(nama, {})
+            seri[kunci] = seri.get(kunci, 0) + nilai
+
+    def amati(self, nama: str, detik: float, **label: str):
+        kunci = tuple(sorted(label.items()))
+        with self._lock:
+            seri = self._histogram.setdefault(nama, {})
+            histogram = seri.get(kunci)
+            if histogram is None:
+                histogram = seri[kunci] = Histogram()
+            histogram.amati(detik)
+
+    def gauge(self, nama: str, fungsi: Callable[[], float], bantuan: str = ""):
+        """Daftarkan gauge yang nilainya dibaca saat metrik diambil."""
+        self._gauge[nama] = fungsi
+        if bantuan:
+            self._bantuan[nama] = bantuan
+
+    def catat_scan(self):
+        with self._lock:
+            self._waktu_scan.append(time.monotonic())
+
+    def laju_scan(self, jendela: float = JENDELA_LAJU_DETIK) -> float:
+        """Scan per detik rata-rata dalam `jendela` detik terakhir."""
+        batas = time.monotonic() - jendela
+        with self._lock:
+            jumlah = len(self._waktu_scan) - bisect.bisect_left(self._waktu_scan, batas)
+        return jumlah / jendela
+
+    def catat_sql(self, sql: str, durasi: float):
+        perintah = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "?"
+        self.amati("kantin_sql_detik", durasi, perintah=perintah)
+        if perintah == "BEGIN":
+            self.amati("kantin_sql_tunggu_lock_detik", durasi)
+        if durasi >= SQL_LAMBAT_DETIK:
+            with self._lock:
+                self.sql_lambat.appendleft(SqlLambat(datetime.now(), durasi, " ".join(sql.split())))
+
+    def salinan(self):
+        """Salinan counter & histogram (untuk dibaca di luar lock)."""
+        with self._lock:
+            counter = {nama: dict(seri) for nama, seri in self._counter.items()}
+            histogram = {
+                nama: {kunci: h.salin() for kunci, h in seri.items()} for nama, seri in self._histogram.items()
+            }
+        return counter, histogram
+
+
+registry = Registry()
+registry.jelaskan("kantin_scan_total", "Jumlah scan yang diproses, per status.")
+registry.jelaskan("kantin_scan_detik", "Latensi proses_scan, per tahap.")
+registry.jelaskan("kantin_recv_detik", "Waktu BarcodeProcessor.recv per frame (thread video).")
+registry.jelaskan("kantin_decode_detik", "Waktu decode barcode per frame (thread worker).")
+registry.jelaskan("kantin_decode_total", "Hasil decode frame: ditemukan, kosong, atau gagal.")
+registry.jelaskan("kantin_frame_dibuang_total", "Frame yang ditimpa sebelum sempat di-decode.")
+registry.jelaskan("kantin_commit_detik", "Durasi commit batch oleh ScanWriter.")
+registry.jelaskan("kantin_laporan_detik", "Durasi fungsi laporan, per fungsi.")
+registry.jelaskan("kantin_cache_total", "Pemanggilan fungsi ber-cache (kantin_db.cache_versi), per fungsi & hit/miss.")
+registry.jelaskan("kantin_scan_ui_detik", "Durasi process_barcode_scan di halaman Streamlit (termasuk login admin).")
+registry.jelaskan("kantin_rerun_detik", "Durasi satu eksekusi skrip Streamlit, per mode.")
+registry.jelaskan("kantin_sql_detik", "Durasi eksekusi statement SQL, per perintah.")
+registry.jelaskan("kantin_sql_tunggu_lock_detik", "Waktu menunggu BEGIN (lock tulis database).")
+registry.jelaskan("kantin_laju_scan_per_detik", f"Rata-rata scan per detik dalam {JENDELA_LAJU_DETIK} detik terakhir.")
+registry.jelaskan("kantin_sql_terkunci_total", "Statement yang gagal karena database terkunci.")
+
+
+# --- API SINGKAT UNTUK MODUL LAIN ---
+
+def tambah(nama: str, nilai: float = 1, **label: str):
+    if METRIK_AKTIF:
+        registry.tambah(nama, nilai, **label)
+
+
+def amati(nama: str, detik: float, **label: str):
+    if METRIK_AKTIF:
+        registry.amati(nama, detik, **label)
+
+
+def catat_scan(status: str, detik: float):
+    """Satu scan selesai diproses: counter per status, latensi total, dan laju scan/detik."""
+    if METRIK_AKTIF:
+        registry.tambah("kantin_scan_total", status=status)
+        registry.amati("kantin_scan_detik", detik, tahap="total")
+        registry.catat_scan()
+
+
+@contextmanager
+def rentang(nama: str, **label: str):
+    """Ukur durasi blok `with` ke histogram `nama`."""
+    mulai = time.perf_counter()
+    try:
+        yield
+    finally:
+        amati(nama, time.perf_counter() - mulai, **label)
+
+
+def diukur(nama: str, **label: str):
+    """Dekorator: ukur durasi setiap panggilan fungsi (label `fungsi` = nama fungsinya)."""
+    def dekorator(fungsi):
+        label_fungsi = {"fungsi": fungsi.__name__, **label}
+
+        @functools.wraps(fungsi)
+        def pembungkus(*args, **kwargs):
+            with rentang(nama, **label_fungsi):
+                return fungsi(*args, **kwargs)
+        return pembungkus
+    return dekorator
+
+
+# --- INSTRUMENTASI SQLITE ---
+
+class CursorTerukur(sqlite3.Cursor):
+    """Cursor yang mencatat durasi setiap execute/executemany ke registry."""
+
+    def _jalankan(self, metode, sql, *args):
+        mulai = time.perf_counter()
+        try:
+            return metode(sql, *args)
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                tambah("kantin_sql_terkunci_total")
+            raise
+        finally:
+            if METRIK_AKTIF:
+                registry.catat_sql(sql, time.perf_counter() - mulai)
+
+    def execute(self, sql, parameters=()):
+        return self._jalankan(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._jalankan(super().executemany, sql, seq_of_parameters)
+
+
+class KoneksiTerukur(sqlite3.Connection):
+    """Koneksi yang semua cursor-nya CursorTerukur (dipakai lewat `sqlite3.connect(factory=...)`).
+
+    Untuk SELECT, yang terukur adalah langkah pertama eksekusi, bukan waktu fetch seluruh baris.
+    """
+
+    def cursor(self, factory=CursorTerukur):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        mulai = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            if METRIK_AKTIF:
+                registry.catat_sql("COMMIT", time.perf_counter() - mulai)
+
+
+# --- EKSPOR ---
+
+def _escape(nilai) -> str:
+    return str(nilai).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_label(kunci: Label, tambahan: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pasangan = list(kunci) + list(tambahan)
+    if not pasangan:
+        return ""
+    isi = ",".join(f'{k}="{_escape(v)}"' for k, v in pasangan)
+    return "{" + isi + "}"
+
+
+def render_prometheus() -> str:
+    """Semua metrik dalam format teks Prometheus (text/plain; version=0.0.4)."""
+    counter, histogram = registry.salinan()
+    baris: List[str] = []
+    for nama, seri in sorted(counter.items()):
+        baris += [f"# HELP {nama} {registry._bantuan.get(nama, nama)}", f"# TYPE {nama} counter"]
+        baris += [f"{nama}{_format_label(k)} {v:g}" for k, v in sorted(seri.items())]
+    for nama, seri in sorted(histogram.items()):
+        baris += [f"# HELP {nama} {registry._bantuan.get(nama, nama)}", f"# TYPE {nama} histogram"]
+        for kunci, h in sorted(seri.items(), key=lambda x: x[0]):
+            kumulatif = 0
+            for batas, jumlah in zip(list(h.bucket) + ["+Inf"], h.jumlah_bucket):
+                kumulatif += jumlah
+                le = batas if isinstance(batas, str) else f"{batas:g}"
+                baris.append(f"{nama}_bucket{_format_label(kunci, (('le', le),))} {kumulatif}")
+            baris.append(f"{nama}_sum{_format_label(kunci)} {h.total:.6f}")
+            baris.append(f"{nama}_count{_format_label(kunci)} {h.n}")
+    for nama, fungsi in sorted(registry._gauge.items()):
+        try:
+            nilai = float(fungsi())
+        except Exception:
+            continue
+        baris += [f"# HELP {nama} {registry._bantuan.get(nama, nama)}", f"# TYPE {nama} gauge", f"{nama} {nilai:g}"]
+    baris.append(f"# HELP kantin_laju_scan_per_detik {registry._bantuan['kantin_laju_scan_per_detik']}")
+    baris.append("# TYPE kantin_laju_scan_per_detik gauge")
+    baris.append(f"kantin_laju_scan_per_detik {registry.laju_scan():.4f}")
+    return "\n".join(baris) + "\n"
+
+
+def ringkasan() -> Dict[str, list]:
+    """Data untuk tab Kinerja: counter, histogram (n, rata-rata, p50, p95, p99 dalam ms), gauge."""
+    counter, histogram = registry.salinan()
+    data_counter = [
+        {"Metrik": nama, "Label": _format_label(kunci), "Nilai": nilai}
+        for nama, seri in sorted(counter.items()) for kunci, nilai in sorted(seri.items())
+    ]
+    data_histogram = [
+        {
+            "Metrik": nama, "Label": _format_label(kunci), "Jumlah": h.n,
+            "Rata-rata (ms)": h.total / h.n * 1000 if h.n else 0.0,
+            "p50 (ms)": h.kuantil(0.5) * 1000, "p95 (ms)": h.kuantil(0.95) * 1000, "p99 (ms)": h.kuantil(0.99) * 1000,
+        }
+        for nama, seri in sorted(histogram.items()) for kunci, h in sorted(seri.items(), key=lambda x: x[0])
+    ]
+    data_gauge = []
+    for nama, fungsi in sorted(registry._gauge.items()):
+        try:
+            data_gauge.append({"Metrik": nama, "Nilai": float(fungsi())})
+        except Exception:
+            pass
+    return {"counter": data_counter, "histogram": data_histogram, "gauge": data_gauge}
+
+
+class MetrikHandler(BaseHTTPRequestHandler):
+    server_version = "KantinMetrik/1.0"
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server_metrik: Optional[ThreadingHTTPServer] = None
+_server_metrik_dicoba = False
+_server_metrik_lock = threading.Lock()
+
+
+def mulai_server_metrik(host: str = METRIK_HOST, port: Optional[int] = METRIK_PORT) -> Optional[ThreadingHTTPServer]:
+    """Jalankan endpoint /metrics di thread latar, sekali per proses. None bila port dipakai/dimatikan."""
+    global _server_metrik, _server_metrik_dicoba
+    if port is None or not METRIK_AKTIF:
+        return None
+    with _server_metrik_lock:
+        if not _server_metrik_dicoba:
+            _server_metrik_dicoba = True
+            try:
+                _server_metrik = ThreadingHTTPServer((host, port), MetrikHandler)
+            except OSError:
+                # Port dipakai proses lain (mis. dua instance Streamlit); metrik tetap ada di tab Kinerja
+                return None
+            threading.Thread(target=_server_metrik.serve_forever, name="metrik-http", daemon=True).start()
+        return _server_metrik
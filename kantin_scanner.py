@@ -0,0 +1,299 @@
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import av
+import numpy as np
+from pyzbar.pyzbar import decode
+from streamlit_webrtc import VideoProcessorBase
+
+import kantin_metrik as metrik
+from kantin_db import proses_scan
+
+# Format frame yang plane pertamanya adalah luma (Y) 8-bit, bisa dipakai langsung tanpa konversi warna
+LUMA_FORMATS = ("yuv420p", "yuvj420p", "yuv422p", "yuvj422p", "yuv444p", "yuvj444p", "nv12", "nv21", "gray")
+
+# Hasil lajur di ScanHub dibuang bila tidak ada scan/pembacaan selama ini (sesi ditutup/di-reload)
+LAJUR_KEDALUWARSA_DETIK = 15 * 60
+MAKS_LAJUR_HUB = 256             # Lajur terlama (LRU) dibuang setelah batas ini
+
+
+@dataclass
+class DecodeConfig:
+    """Pengaturan pipeline decode barcode per frame."""
+    roi_fraction: float = 0.6         # Lebar/tinggi area tengah yang di-decode (0-1]
+    downscale: int = 2                # Ambil setiap piksel ke-N pada pass murah (1 = resolusi penuh)
+    frame_stride: int = 3             # Decode hanya setiap frame ke-N
+    full_res_fallback: bool = True    # Ulangi di resolusi penuh bila pass murah tidak menemukan apa pun
+    workers: int = 1                  # Jumlah decode yang boleh berjalan bersamaan
+    use_processes: bool = False       # True: decode di ProcessPoolExecutor, False: di thread latar
+
+
+def ambil_luma(frame: av.VideoFrame) -> np.ndarray:
+    """Ambil plane Y (grayscale) sebagai array 2D uint8 tanpa konversi warna bila memungkinkan."""
+    if frame.format.name in LUMA_FORMATS:
+        plane = frame.planes[0]
+        buf = np.frombuffer(plane, np.uint8).reshape(-1, plane.line_size)
+        return buf[:frame.height, :frame.width]
+    return frame.to_ndarray(format="gray")
+
+
+def crop_tengah(gray: np.ndarray, fraction: float) -> np.ndarray:
+    if fraction >= 1:
+        return gray
+    h, w = gray.shape
+    dy, dx = int(h * (1 - fraction) / 2), int(w * (1 - fraction) / 2)
+    return gray[dy:h - dy, dx:w - dx]
+
+
+def decode_gray(gray: np.ndarray) -> List[str]:
+    """Decode array grayscale 2D dengan pyzbar (format tuple: piksel, lebar, tinggi)."""
+    h, w = gray.shape
+    if h == 0 or w == 0:
+        return []
+    hasil = decode((np.ascontiguousarray(gray).tobytes(), w, h))
+    return [obj.data.decode("utf-8") for obj in hasil]
+
+
+def decode_luma(gray: np.ndarray, config: DecodeConfig) -> List[str]:
+    """Pass murah (ROI tengah, resolusi dikurangi), lalu resolusi penuh hanya jika pass murah gagal."""
+    roi = crop_tengah(gray, config.roi_fraction)
+    if config.downscale > 1:
+        roi = roi[::config.downscale, ::config.downscale]
+    hasil = decode_gray(roi)
+    if not hasil and config.full_res_fallback and (config.downscale > 1 or config.roi_fraction < 1):
+        hasil = decode_gray(gray)
+    return hasil
+
+
+# --- WORKER DECODE LATAR BELAKANG ---
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool bersama per proses (dibuat sekali, dipakai semua stream kamera)."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=workers)
+        return _process_pool
+
+
+class DecodeWorker:
+    """Menjalankan decode di luar thread video; hanya frame terbaru yang diproses, frame lama dibuang."""
+
+    def __init__(self, config: DecodeConfig, on_hasil: Callable[[List[str]], None]):
+        self.config = config
+        self.on_hasil = on_hasil
+        self.frame_dibuang: int = 0
+        self._kondisi = threading.Condition()
+        self._frame_terbaru: Optional[np.ndarray] = None
+        self._berhenti = False
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"barcode-decode-{i}", daemon=True)
+            for i in range(max(1, config.workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, gray: np.ndarray):
+        """Titipkan frame untuk di-decode. Tidak pernah memblokir; frame yang belum sempat diproses ditimpa."""
+        with self._kondisi:
+            if self._frame_terbaru is not None:
+                self.frame_dibuang += 1
+                metrik.tambah("kantin_frame_dibuang_total")
+            self._frame_terbaru = gray
+            self._kondisi.notify()
+
+    def _decode(self, gray: np.ndarray) -> List[str]:
+        if self.config.use_processes:
+            return get_process_pool(self.config.workers).submit(decode_luma, gray, self.config).result()
+        return decode_luma(gray, self.config)
+
+    def _loop(self):
+        while True:
+            with self._kondisi:
+                while self._frame_terbaru is None and not self._berhenti:
+                    self._kondisi.wait()
+                if self._berhenti:
+                    return
+                gray, self._frame_terbaru = self._frame_terbaru, None
+            mulai = time.perf_counter()
+            try:
+                hasil = self._decode(gray)
+            except Exception:
+                metrik.tambah("kantin_decode_total", hasil="gagal")
+                continue
+            finally:
+                metrik.amati("kantin_decode_detik", time.perf_counter() - mulai)
+            metrik.tambah("kantin_decode_total", hasil="ditemukan" if hasil else "kosong")
+            if hasil:
+                self.on_hasil(hasil)
+
+    def stop(self):
+        with self._kondisi:
+            self._berhenti = True
+            self._kondisi.notify_all()
+
+
+# --- MODE MULTI-LAJUR: SEMUA KAMERA -> SATU PEMROSES SCAN ---
+
+class HasilScan(NamedTuple):
+    nomor: int          # Nomor urut global, naik terus (untuk mendeteksi hasil baru)
+    lajur: str
+    waktu: datetime
+    barcode_id: str
+    status: str
+    pesan: str
+
+
+class ScanHub:
+    """Antrean bersama untuk semua lajur kamera dalam satu proses.
+
+    Setiap lajur mengirim ID hasil decode ke `kirim()`; satu thread pemroses mengambil ID secara
+    berurutan dan memanggil `proses_fn` (default `kantin_db.proses_scan`), sehingga hanya ada satu
+    penulis ke database. Hasil terakhir per lajur disimpan untuk ditampilkan di UI; lajur yang tidak
+    dipakai (ditulis atau dibaca) selama `kedaluwarsa` detik, atau yang terlama di atas `maks_lajur`, dibuang.
+    """
+
+    def __init__(self, proses_fn: Callable[[str], Tuple[str, str]] = proses_scan, riwayat_per_lajur: int = 10,
+                 kedaluwarsa: float = LAJUR_KEDALUWARSA_DETIK, maks_lajur: int = MAKS_LAJUR_HUB):
+        self.proses_fn = proses_fn
+        self.riwayat_per_lajur = riwayat_per_lajur
+        self.kedaluwarsa = kedaluwarsa
+        self.maks_lajur = maks_lajur
+        self.antrean: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        # lajur -> (waktu terakhir dipakai, riwayat); urutan = terlama dipakai lebih dulu
+        self._hasil: "OrderedDict[str, Tuple[float, Deque[HasilScan]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._nomor = 0
+        self._thread = threading.Thread(target=self._loop, name="scan-hub", daemon=True)
+        self._thread.start()
+
+    def kirim(self, lajur: str, barcode_id: str):
+        self.antrean.put((lajur, barcode_id.strip()))
+
+    def _loop(self):
+        while True:
+            lajur, barcode_id = self.antrean.get()
+            try:
+                status, pesan = self.proses_fn(barcode_id)
+            except Exception as e:
+                status, pesan = "Gagal", f"❌ Terjadi kesalahan saat memproses '{barcode_id}': {e}"
+            with self._lock:
+                self._nomor += 1
+                riwayat = self._hasil.pop(lajur, (0.0, deque(maxlen=self.riwayat_per_lajur)))[1]
+                riwayat.appendleft(HasilScan(self._nomor, lajur, datetime.now(), barcode_id, status, pesan))
+                self._hasil[lajur] = (time.monotonic(), riwayat)
+                self._buang_lajur_lama()
+
+    def _buang_lajur_lama(self):
+        """Buang lajur kedaluwarsa dan lajur terlama di atas maks_lajur (dipanggil dengan _lock)."""
+        batas = time.monotonic() - self.kedaluwarsa
+        while self._hasil:
+            lajur, (dipakai, _) = next(iter(self._hasil.items()))
+            if dipakai >= batas and len(self._hasil) <= self.maks_lajur:
+                break
+            del self._hasil[lajur]
+
+    @property
+    def nomor_terakhir(self) -> int:
+        with self._lock:
+            return self._nomor
+
+    def hasil_lajur(self, lajur: str) -> List[HasilScan]:
+        """Hasil terbaru lebih dulu. Membaca menandai lajur masih dipakai."""
+        with self._lock:
+            self._buang_lajur_lama()
+            if lajur not in self._hasil:
+                return []
+            riwayat = self._hasil[lajur][1]
+            self._hasil[lajur] = (time.monotonic(), riwayat)
+            self._hasil.move_to_end(lajur)
+            return list(riwayat)
+
+
+_scan_hub: Optional[ScanHub] = None
+_scan_hub_lock = threading.Lock()
+
+
+def get_scan_hub() -> ScanHub:
+    """ScanHub tunggal per proses, dipakai bersama oleh semua sesi dan lajur.
+
+    Hasil disimpan per nama lajur, jadi nama lajur harus unik per sesi browser (mis. diawali ID sesi);
+    hasil lajur sesi yang sudah ditutup dibuang setelah LAJUR_KEDALUWARSA_DETIK.
+    """
+    global _scan_hub
+    with _scan_hub_lock:
+        if _scan_hub is None:
+            _scan_hub = ScanHub()
+        return _scan_hub
+
+
+# --- FUNGSI WEBRTC: PEMROSESAN BARCODE DARI KAMERA ---
+
+class BarcodeProcessor(VideoProcessorBase):
+    """Kelas untuk memproses frame video dan mendeteksi barcode/QR code.
+
+    `recv` hanya menyalin plane luma ke DecodeWorker lalu langsung mengembalikan frame; ID yang
+    berhasil di-decode dikirim lewat antrean `hasil_scan` (ambil dengan `ambil_hasil()`), atau ke
+    ScanHub bersama bila `lajur` diisi (mode multi-lajur).
+    """
+
+    def __init__(self, config: Union[DecodeConfig, None] = None, lajur: Union[str, None] = None,
+                 hub: Union[ScanHub, None] = None):
+        self.lajur = lajur
+        self.hub = hub
+        self.last_scan_time: float = 0
+        self.debounce_period: float = 3.0
+        self.config = config or DecodeConfig()
+        self.frame_count: int = 0
+        self.hasil_scan: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = DecodeWorker(self.config, self._terima_hasil)
+
+    def recv(self, frame: av.VideoFrame) -> av.VideoFrame:
+        with metrik.rentang("kantin_recv_detik"):
+            return self._recv(frame)
+
+    def _recv(self, frame: av.VideoFrame) -> av.VideoFrame:
+        self.frame_count += 1
+
+        # Tidak perlu decode selama periode debounce, dan hanya setiap frame ke-N
+        if time.time() - self.last_scan_time <= self.debounce_period:
+            return frame
+        if self.frame_count % self.config.frame_stride:
+            return frame
+
+        # Salin plane Y: buffer frame bisa dipakai ulang decoder setelah recv selesai
+        self._worker.submit(np.array(ambil_luma(frame)))
+        return frame
+
+    def _terima_hasil(self, hasil: List[str]):
+        """Dipanggil dari thread worker; menerapkan debounce sebelum ID masuk antrean."""
+        with self._lock:
+            current_time = time.time()
+            if current_time - self.last_scan_time <= self.debounce_period:
+                return
+            self.last_scan_time = current_time
+        if self.hub is not None:
+            self.hub.kirim(self.lajur or "Lajur", hasil[0])
+        else:
+            self.hasil_scan.put(hasil[0])
+
+    def ambil_hasil(self) -> Optional[str]:
+        """Ambil satu ID hasil scan tanpa menunggu (None jika belum ada)."""
+        try:
+            return self.hasil_scan.get_nowait()
+        except queue.Empty:
+            return None
+
+    def on_ended(self):
+        self._worker.stop()
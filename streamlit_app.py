@@ -1,23 +1,46 @@
 import streamlit as st
 import sqlite3
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 import pandas as pd
 import time 
 import re 
-from typing import Union
+import os
+import shutil
+import uuid
 
 # --- PUSTAKA KHUSUS SCANNER KAMERA ---
-from streamlit_webrtc import webrtc_streamer, WebRtcMode, VideoProcessorBase
-import av
-from PIL import Image
-from pyzbar.pyzbar import decode
+# streamlit_webrtc, av, pyzbar & kantin_scanner baru di-import di Mode Scanner (lihat bawah),
+# sehingga halaman Admin tidak menanggung biaya import tumpukan kamera.
+from functools import partial
+
+# --- KONEKSI DATABASE (POOL BERSAMA PER PROSES) ---
+from kantin_db import get_db_connection, init_db, direktori_staf, proses_scan, proses_scan_batch, bangun_ulang_rekap
+from kantin_db import cache_versi, tandai_perubahan, SQL_ID_DEPARTEMEN, SQL_TAMBAH_STAF
+from kantin_arsip import mulai_arsip_latar, periksa_rekap
+from kantin_impor import rencanakan_impor, terapkan_impor, templat_csv
+from kantin_hapus import hapus_staf, hapus_departemen, pulihkan_departemen, sedang_dihapus, daftar_tugas_hapus, ulangi_tugas_gagal, mulai_pembersih_latar
+
+# --- INSTRUMENTASI (METRIK PER PROSES) ---
+import kantin_metrik as metrik
+import kantin_db
+
+# --- FUNGSI LAPORAN ---
+from kantin_laporan import get_jatah_harian_staf, hitung_transaksi, get_halaman_transaksi
+from kantin_laporan import ekspor_transaksi, ekspor_jatah_harian, FORMAT_EKSPOR
+from kantin_laporan import get_rekap_harian, get_rekap_jam
 
 # --- KONFIGURASI DAN INISIALISASI ---
-DB_FILE = "kantin_staf.db" 
-ADMIN_DEPARTEMEN_NAME = "Admin_Akses" 
-ADMIN_BARCODE_ID = "9999Z"
-ADMIN_NAMA = "Admin Master"
-DEFAULT_DEPARTEMEN = ["Produksi", "HRD", "Keuangan", "IT", "Marketing", "Gudang", "Umum", ADMIN_DEPARTEMEN_NAME, "Tidak Ditentukan"]
+from kantin_db import ADMIN_DEPARTEMEN_NAME, ADMIN_BARCODE_ID
+MAKS_LAJUR = 4                 # Jumlah kamera maksimum pada mode multi-lajur
+MAKS_FEED_SCAN = 10            # Jumlah hasil scan terakhir yang ditampilkan di halaman Scanner
+UKURAN_HALAMAN = [25, 50, 100, 250]   # Pilihan baris per halaman di Laporan Semua Transaksi
+RENTANG_ANALITIK_HARI = 30     # Rentang bawaan tab Analitik Departemen
+MAKS_HASIL_CARI = 20           # Jumlah maksimum hasil pencarian staf di Edit Staf
+RTC_CONFIGURATION = {"iceServers": [{"urls": ["stun:stun.l.google.com:19302"]}]}
+# File ekspor diunduh lewat static serving Streamlit (.streamlit/config.toml), dialirkan dari disk
+FOLDER_UNDUHAN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "ekspor")
+UMUR_UNDUHAN_DETIK = 10 * 60   # File ekspor di FOLDER_UNDUHAN dihapus setelah 10 menit
+MAKS_UNDUH_MEMORI_MB = 50      # Tanpa static serving, file sebesar ini masih dikirim lewat st.download_button
 
 def initialize_session_state():
     """Memastikan semua kunci st.session_state ada sebelum digunakan."""
@@ -27,103 +50,22 @@ def initialize_session_state():
         st.session_state['is_admin_logged_in'] = False
     if 'processing' not in st.session_state:
         st.session_state['processing'] = False
+    if 'feed_scan' not in st.session_state:
+        st.session_state['feed_scan'] = []
+    if 'hasil_batch' not in st.session_state:
+        st.session_state['hasil_batch'] = []
 
-def get_db_connection():
-    """Membuka koneksi database dengan row_factory untuk akses kolom bernama."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row 
-    return conn
-
-def init_db():
-    """Membuat tabel staf, transaksi, dan departemen, serta data dummy jika belum ada."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Membuat Tabel Staf 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS staf (
-            id INTEGER PRIMARY KEY,
-            barcode_id TEXT UNIQUE NOT NULL,
-            nama TEXT NOT NULL,
-            departemen TEXT,  
-            jatah_harian INTEGER DEFAULT 1
-        )
-    """)
-    
-    # Membuat Tabel Transaksi 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS transaksi (
-            id INTEGER PRIMARY KEY,
-            barcode_id TEXT NOT NULL,
-            waktu_transaksi TIMESTAMP NOT NULL,
-            status_valid BOOLEAN NOT NULL 
-        )
-    """)
-    
-    # Membuat Tabel Departemen
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS departemen (
-            id INTEGER PRIMARY KEY,
-            nama_departemen TEXT UNIQUE NOT NULL
-        )
-    """)
-    conn.commit()
+# --- FUNGSI LOGOUT & CRUD (Sudah Diperbaiki dengan 'finally') ---
 
-    # Tambah Data Dummy Departemen
-    for dept in DEFAULT_DEPARTEMEN:
-        try:
-            cursor.execute("INSERT INTO departemen (nama_departemen) VALUES (?)", (dept,))
-        except sqlite3.IntegrityError:
-            pass 
-    conn.commit()
-    
-    # Tambah Data Dummy Staf (Hanya jika tabel kosong)
-    cursor.execute("SELECT COUNT(*) FROM staf")
-    if cursor.fetchone()[0] == 0:
-        cursor.execute("INSERT INTO staf (barcode_id, nama, departemen, jatah_harian) VALUES (?, ?, ?, ?)", 
-                       ('1001A', 'Budi Santoso', 'Produksi', 1))
-        cursor.execute("INSERT INTO staf (barcode_id, nama, departemen, jatah_harian) VALUES (?, ?, ?, ?)", 
-                       ('2002B', 'Siti Aminah', 'HRD', 1)) 
-        conn.commit()
-
-    # --- VERIFIKASI ID ADMIN SELALU ADA ---
-    cursor.execute("SELECT COUNT(*) FROM staf WHERE barcode_id = ?", (ADMIN_BARCODE_ID,))
-    if cursor.fetchone()[0] == 0:
-        try:
-            cursor.execute("INSERT INTO staf (barcode_id, nama, departemen, jatah_harian) VALUES (?, ?, ?, ?)", 
-                           (ADMIN_BARCODE_ID, ADMIN_NAMA, ADMIN_DEPARTEMEN_NAME, 0)) 
-            conn.commit()
-        except sqlite3.IntegrityError:
-            pass
-    # --- AKHIR VERIFIKASI ID ADMIN ---
+def login_admin():
+    """Set state login admin lalu muat ulang halaman ke Mode Admin."""
+    st.session_state['is_admin_logged_in'] = True
+    st.session_state['mode'] = 'Admin' 
     
-    conn.close()
-
-# --- FUNGSI WEBRTC: PEMROSESAN BARCODE DARI KAMERA ---
+    if 'mode_radio_selection' in st.session_state:
+        del st.session_state['mode_radio_selection'] 
 
-class BarcodeProcessor(VideoProcessorBase):
-    """Kelas untuk memproses frame video dan mendeteksi barcode/QR code."""
-    
-    def __init__(self):
-        self.scanned_id: Union[str, None] = None
-        self.last_scan_time: float = 0
-        self.debounce_period: float = 3.0 
-        
-    def recv(self, frame: av.VideoFrame) -> av.VideoFrame:
-        img = frame.to_ndarray(format="bgr24")
-        decoded_objects = decode(Image.fromarray(img))
-        current_time = time.time()
-        
-        for obj in decoded_objects:
-            barcode_data = obj.data.decode("utf-8")
-            
-            if (self.scanned_id is None) and (current_time - self.last_scan_time > self.debounce_period):
-                self.scanned_id = barcode_data
-                self.last_scan_time = current_time
-                
-        return frame
-        
-# --- FUNGSI LOGOUT & CRUD (Sudah Diperbaiki dengan 'finally') ---
+    st.rerun() 
 
 def logout_admin():
     """Reset state login."""
@@ -133,272 +75,304 @@ def logout_admin():
         del st.session_state['mode_radio_selection']
     st.rerun()
 
+@cache_versi
 def get_departemen_list():
-    conn = get_db_connection()
-    dept_data = conn.execute("SELECT nama_departemen FROM departemen ORDER BY nama_departemen").fetchall()
-    conn.close()
+    with get_db_connection() as conn:
+        dept_data = conn.execute(
+            "SELECT nama_departemen FROM departemen WHERE dihapus_pada IS NULL ORDER BY nama_departemen"
+        ).fetchall()
     return [row['nama_departemen'] for row in dept_data]
 
 def tambah_departemen(nama):
-    conn = get_db_connection()
-    try:
-        conn.execute("INSERT INTO departemen (nama_departemen) VALUES (?)", (nama,))
-        conn.commit()
-        return True, f"✅ Departemen '{nama}' berhasil ditambahkan."
-    except sqlite3.IntegrityError:
-        return False, f"❌ Gagal: Departemen '{nama}' sudah ada."
-    finally:
-        conn.close()
-
-def hapus_departemen(nama):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        if nama == ADMIN_DEPARTEMEN_NAME or nama == "Tidak Ditentukan":
-            return False, f"❌ Gagal: Departemen '{nama}' tidak dapat dihapus."
-
-        cursor.execute("UPDATE staf SET departemen = 'Tidak Ditentukan' WHERE departemen = ?", (nama,))
-        staf_affected = cursor.rowcount
-        cursor.execute("DELETE FROM departemen WHERE nama_departemen = ?", (nama,))
-        
-        conn.commit()
-        return True, f"✅ Departemen '{nama}' berhasil dihapus. ({staf_affected} staf diperbarui)."
-    except Exception as e:
-        conn.rollback()
-        return False, f"❌ Terjadi kesalahan saat menghapus departemen: {e}"
-    finally:
-        conn.close()
+    with get_db_connection() as conn:
+        try:
+            conn.execute("INSERT INTO departemen (nama_departemen) VALUES (?)", (nama,))
+            conn.commit()
+            tandai_perubahan()
+            return True, f"✅ Departemen '{nama}' berhasil ditambahkan."
+        except sqlite3.IntegrityError:
+            if pulihkan_departemen(nama):
+                tandai_perubahan()
+                return True, f"✅ Departemen '{nama}' berhasil ditambahkan."
+            if sedang_dihapus("departemen", "nama_departemen", nama):
+                return False, f"❌ Gagal: Departemen '{nama}' masih dalam proses penghapusan. Coba lagi setelah selesai."
+            return False, f"❌ Gagal: Departemen '{nama}' sudah ada."
 
 def tambah_staf(barcode_id, nama, departemen, jatah=1):
-    conn = get_db_connection()
-    try:
-        conn.execute(
-            "INSERT INTO staf (barcode_id, nama, departemen, jatah_harian) VALUES (?, ?, ?, ?)",
-            (barcode_id, nama, departemen, jatah)
-        )
-        conn.commit()
-        return True, f"✅ Staf {nama} ({barcode_id}) berhasil ditambahkan."
-    except sqlite3.IntegrityError:
-        return False, f"❌ Gagal: Barcode ID '{barcode_id}' sudah terdaftar."
-    finally:
-        conn.close() 
+    with get_db_connection() as conn:
+        try:
+            conn.execute(SQL_TAMBAH_STAF, (barcode_id, nama, departemen, jatah))
+            conn.commit()
+            direktori_staf().invalidate()
+            tandai_perubahan()
+            return True, f"✅ Staf {nama} ({barcode_id}) berhasil ditambahkan."
+        except sqlite3.IntegrityError:
+            if sedang_dihapus("staf", "barcode_id", barcode_id):
+                return False, f"❌ Gagal: Barcode ID '{barcode_id}' masih dalam proses penghapusan. Coba lagi setelah selesai."
+            return False, f"❌ Gagal: Barcode ID '{barcode_id}' sudah terdaftar."
 
 def edit_staf(barcode_id, nama, departemen):
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE staf SET nama = ?, departemen = ? WHERE barcode_id = ?",
-            (nama, departemen, barcode_id)
-        )
-        conn.commit()
-        
-        if cursor.rowcount > 0: 
-            return True, f"✅ Data staf {barcode_id} berhasil diperbarui."
-        else:
-            return False, f"❌ Gagal: Barcode ID '{barcode_id}' tidak ditemukan."
-            
-    except Exception as e:
-        conn.rollback()
-        return False, f"❌ Terjadi kesalahan saat mengedit staf: {e}"
-        
-    finally:
-        conn.close()
-
-def hapus_staf(barcode_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        if barcode_id == ADMIN_BARCODE_ID:
-            return False, f"❌ Gagal: Barcode Admin ({ADMIN_BARCODE_ID}) tidak dapat dihapus."
-            
-        cursor.execute("DELETE FROM transaksi WHERE barcode_id = ?", (barcode_id,))
-        transaksi_count = cursor.rowcount
-        cursor.execute("DELETE FROM staf WHERE barcode_id = ?", (barcode_id,))
-        conn.commit()
-        
-        if cursor.rowcount > 0:
-            return True, f"✅ Staf {barcode_id} dan {transaksi_count} transaksi terkait berhasil dihapus."
-        else:
-            return False, f"❌ Gagal: Barcode ID '{barcode_id}' tidak ditemukan."
+    with get_db_connection() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE staf SET nama = ?, departemen_id = {SQL_ID_DEPARTEMEN} WHERE barcode_id = ? AND dihapus_pada IS NULL",
+                (nama, departemen, barcode_id)
+            )
+            conn.commit()
+            direktori_staf().invalidate()
+            tandai_perubahan()
             
-    except Exception as e:
-        conn.rollback()
-        return False, f"❌ Terjadi kesalahan saat menghapus staf: {e}"
-    finally:
-        conn.close()
+            if cursor.rowcount > 0: 
+                return True, f"✅ Data staf {barcode_id} berhasil diperbarui."
+            else:
+                return False, f"❌ Gagal: Barcode ID '{barcode_id}' tidak ditemukan."
+                
+        except Exception as e:
+            conn.rollback()
+            return False, f"❌ Terjadi kesalahan saat mengedit staf: {e}"
 
 def get_staf_by_barcode(barcode_id):
-    conn = get_db_connection()
-    staf = conn.execute("SELECT barcode_id, nama, departemen, jatah_harian FROM staf WHERE barcode_id = ?", (barcode_id,)).fetchone()
-    conn.close()
-    return staf
+    """Cari staf di direktori memori (kantin_db.Staf atau None), tanpa query ke disk."""
+    return direktori_staf().get(barcode_id)
 
+@cache_versi
 def tampil_data_staf():
-    conn = get_db_connection()
-    staf_data = conn.execute("SELECT barcode_id, nama, departemen, jatah_harian FROM staf ORDER BY nama").fetchall()
-    conn.close()
-    return pd.DataFrame([dict(row) for row in staf_data])
-
-# --- FUNGSI get_all_transaksi (Stabil) ---
-def get_all_transaksi(departemen_filter=None, start_date=None, end_date=None):
-    conn = get_db_connection()
-    query = """
-        SELECT T.waktu_transaksi, S.nama, S.departemen, T.barcode_id, T.status_valid
-        FROM transaksi AS T 
-        JOIN staf AS S ON T.barcode_id = S.barcode_id
+    staf_data = direktori_staf().semua()
+    return pd.DataFrame(staf_data, columns=['barcode_id', 'nama', 'departemen', 'jatah_harian'])
+
+# --- FUNGSI UTAMA SCANNING (LOGIKA LOGIN & TRANSAKSI) ---
+
+@metrik.diukur("kantin_scan_ui_detik")
+def process_barcode_scan(barcode_id):
+    status, pesan = proses_scan(barcode_id)
+
+    # CEK HAK AKSES ADMIN: login hanya berlaku untuk sesi browser yang memindai
+    if status == "Sukses_Admin":
+        login_admin()
+
+    return status, pesan
+
+
+def tampil_pesan_scan(status, pesan):
+    """Tampilkan pesan hasil scan dengan warna sesuai status."""
+    if status == "Sukses":
+        st.success(pesan)
+    elif status == "Peringatan":
+        st.warning(pesan)
+    elif status == "Sukses_Admin":
+        st.info(pesan)
+    else:
+        st.error(pesan)
+
+
+def catat_feed_scan(barcode_id):
+    """Proses satu ID lalu simpan hasilnya di feed sesi (terbaru di depan)."""
+    status, pesan = process_barcode_scan(barcode_id)
+    feed = st.session_state['feed_scan']
+    feed.insert(0, {'Waktu': datetime.now().strftime('%H:%M:%S'), 'ID Barcode': barcode_id,
+                    'Status': status, 'Pesan': pesan})
+    del feed[MAKS_FEED_SCAN:]
+
+
+def catat_feed_scan_batch(daftar_barcode):
+    """Proses banyak ID dalam satu transaksi; simpan ringkasan batch dan masukkan hasilnya ke feed."""
+    try:
+        hasil = proses_scan_batch(daftar_barcode)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+
+    waktu = datetime.now().strftime('%H:%M:%S')
+    baris = [{'Waktu': waktu, 'ID Barcode': barcode_id, 'Status': status, 'Pesan': pesan}
+             for barcode_id, (status, pesan) in zip(daftar_barcode, hasil)]
+    st.session_state['hasil_batch'] = baris
+    feed = st.session_state['feed_scan']
+    feed[:0] = baris[::-1][:MAKS_FEED_SCAN]
+    del feed[MAKS_FEED_SCAN:]
+
+    # Kartu admin di dalam daftar tetap membuka Mode Admin, setelah semua ID lain tercatat
+    if any(status == "Sukses_Admin" for status, _ in hasil):
+        login_admin()
+
+
+@st.fragment(run_every=0.5)
+def panel_scan(webrtc_ctx=None):
+    """Ambil hasil kamera & input manual lalu tampilkan feed scan terakhir.
+
+    Berjalan sebagai fragment yang menyegarkan diri setiap 0,5 detik: tidak ada time.sleep()
+    dan tidak ada rerun seluruh halaman per scan.
     """
-    params = []
-    
-    where_clauses = []
-    
-    if departemen_filter and departemen_filter != "Semua Departemen":
-        where_clauses.append("S.departemen = ?")
-        params.append(departemen_filter)
-    
-    if start_date:
-        where_clauses.append("DATE(T.waktu_transaksi) >= ?")
-        params.append(start_date) 
-    
-    if end_date:
-        where_clauses.append("DATE(T.waktu_transaksi) <= ?")
-        params.append(end_date) 
-        
-    if where_clauses:
-        query += " WHERE " + " AND ".join(where_clauses)
-        
-    query += " ORDER BY T.waktu_transaksi DESC"
-        
-    transaksi = conn.execute(query, params).fetchall()
-    conn.close()
-    
-    # Definisikan Kolom yang Diharapkan
-    expected_columns = ['Waktu', 'Nama Staf', 'Departemen', 'ID Barcode', 'Status']
+    if webrtc_ctx is not None and webrtc_ctx.video_processor:
+        while (scanned_id := webrtc_ctx.video_processor.ambil_hasil()):
+            catat_feed_scan(scanned_id.strip())
+
+    # --- Opsional: Text Input sebagai Fallback ---
+    st.caption("Atau, Masukkan ID secara Manual:")
     
-    data = []
-    for row in transaksi:
-        data.append({
-            'Waktu': row['waktu_transaksi'], 
-            'Nama Staf': row['nama'], 
-            'Departemen': row['departemen'],
-            'ID Barcode': row['barcode_id'],
-            'Status': 'VALID' if row['status_valid'] else 'BATAS (Ditolak)'
-        })
+    input_batch = st.toggle("Banyak ID sekaligus", key='input_batch_manual',
+                            help="Tempel daftar ID (satu per baris, atau dipisah koma) untuk acara/katering.")
+    with st.form(key='manual_scan_form', clear_on_submit=True):
+        if input_batch:
+            manual_barcode_input = st.text_area(
+                "Daftar Barcode ID Staf (satu per baris):",
+                placeholder="1001A\n2002B\n..."
+            )
+        else:
+            manual_barcode_input = st.text_input(
+                "Masukkan Barcode ID Staf (Manual):", 
+                placeholder="Ketik ID Barcode di sini..."
+            )
+        submit_manual = st.form_submit_button(label='Proses Manual')
         
-    # Pastikan DataFrame dikembalikan dengan kolom yang benar, meskipun kosong
-    if not data:
-        return pd.DataFrame(data, columns=expected_columns) 
+    if submit_manual and manual_barcode_input:
+        if input_batch:
+            daftar_barcode = [b.strip() for b in re.split(r"[\r\n,;]+", manual_barcode_input) if b.strip()]
+            catat_feed_scan_batch(daftar_barcode)
+        else:
+            catat_feed_scan(manual_barcode_input.strip())
+
+    hasil_batch = st.session_state['hasil_batch']
+    if hasil_batch:
+        jumlah_status = pd.Series([h['Status'] for h in hasil_batch]).value_counts()
+        with st.expander(f"Batch terakhir: {len(hasil_batch)} ID — "
+                         f"{jumlah_status.get('Sukses', 0)} sukses, {jumlah_status.get('Peringatan', 0)} ditolak, "
+                         f"{jumlah_status.get('Gagal', 0)} tidak terdaftar"):
+            st.dataframe(pd.DataFrame(hasil_batch), width='stretch', hide_index=True)
+
+    feed = st.session_state['feed_scan']
+    if not feed:
+        st.info("Menunggu Barcode/QR Code untuk dipindai...")
+        return
+
+    terakhir = feed[0]
+    tampil_pesan_scan(terakhir['Status'], f"{terakhir['Waktu']} — {terakhir['Pesan']}")
+    if len(feed) > 1:
+        st.dataframe(pd.DataFrame(feed[1:]), width='stretch', hide_index=True)
+
+
+MIME_EKSPOR = {"CSV": "text/csv", "Parquet": "application/vnd.apache.parquet"}
+
+def _bersihkan_unduhan_lama():
+    """Hapus file ekspor di FOLDER_UNDUHAN yang lebih tua dari UMUR_UNDUHAN_DETIK."""
+    batas = time.time() - UMUR_UNDUHAN_DETIK
+    for nama in os.listdir(FOLDER_UNDUHAN):
+        path = os.path.join(FOLDER_UNDUHAN, nama)
+        try:
+            if os.path.getmtime(path) < batas:
+                os.remove(path)
+        except OSError:
+            pass
 
-    return pd.DataFrame(data)
 
-def get_jatah_harian_staf(departemen_filter=None):
-    conn = get_db_connection()
-    today_str = date.today().strftime('%Y-%m-%d')
-    
-    query = f"""
-        SELECT 
-            S.barcode_id, 
-            S.nama, 
-            S.departemen,  
-            S.jatah_harian, 
-            COALESCE(T.jumlah_ambil, 0) as sudah_ambil
-        FROM staf AS S
-        LEFT JOIN (
-            SELECT barcode_id, COUNT(*) as jumlah_ambil 
-            FROM transaksi
-            WHERE status_valid = 1 AND DATE(waktu_transaksi) = '{today_str}'
-            GROUP BY barcode_id
-        ) AS T ON S.barcode_id = T.barcode_id
+def tombol_download_ekspor(label, key, nama_file, fungsi_ekspor, **filter_laporan):
+    """Pilih format, buat file ekspor bertahap (dengan progress bar) hanya saat diminta, lalu tampilkan tautan download.
+
+    Dengan static serving aktif, file dipindah ke FOLDER_UNDUHAN dengan nama acak dan diunduh langsung dari
+    disk, tidak lewat memori proses. Tanpa static serving, st.download_button membaca seluruh file ke
+    memori, sehingga hanya dipakai sampai MAKS_UNDUH_MEMORI_MB.
     """
-    params = []
-    if departemen_filter and departemen_filter != "Semua Departemen":
-        query += " WHERE S.departemen = ?"
-        params.append(departemen_filter)
-        
-    query += " ORDER BY S.nama"
-    
-    data = conn.execute(query, params).fetchall()
-    conn.close()
-    
-    df_data = []
-    for row in data:
-        row_dict = dict(row)
-        sudah_ambil = row_dict['sudah_ambil']
-        jatah_harian = row_dict['jatah_harian']
-        sisa_jatah = jatah_harian - sudah_ambil
-        
-        df_data.append({
-            'Nama Staf': row_dict['nama'],
-            'Departemen': row_dict['departemen'],
-            'ID Barcode': row_dict['barcode_id'],
-            'Jatah Harian': jatah_harian,
-            'Sudah Diambil': sudah_ambil,
-            'Sisa Jatah': sisa_jatah,
-            'Status': 'Selesai' if sisa_jatah <= 0 else 'Tersedia'
-        })
-    
-    return pd.DataFrame(df_data)
+    format_file = st.radio("Format File:", list(FORMAT_EKSPOR), horizontal=True, key=f"{key}_format")
 
-# --- FUNGSI UTAMA SCANNING (LOGIKA LOGIN & TRANSAKSI) ---
+    if st.button(f"Siapkan File {label}", key=f"{key}_siapkan"):
+        progress_bar = st.progress(0.0, text="Menyiapkan file...")
 
-def process_barcode_scan(barcode_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    today_str = date.today().strftime('%Y-%m-%d')
-    
-    staf = cursor.execute("SELECT * FROM staf WHERE barcode_id = ?", (barcode_id,)).fetchone()
-    
-    if not staf:
-        conn.close()
-        return "Gagal", f"❌ ID Staf '{barcode_id}' tidak terdaftar!"
-
-    nama_staf = staf['nama']
-    departemen_staf = staf['departemen']
-
-    # 1. CEK HAK AKSES ADMIN
-    if departemen_staf == ADMIN_DEPARTEMEN_NAME:
-        conn.close()
-        st.session_state['is_admin_logged_in'] = True
-        st.session_state['mode'] = 'Admin' 
-        
-        if 'mode_radio_selection' in st.session_state:
-            del st.session_state['mode_radio_selection'] 
-
-        st.rerun() 
-        return "Sukses_Admin", f"✅ Akses Admin untuk {nama_staf} berhasil."
-
-    # 2. LOGIKA TRANSAKSI MAKANAN (untuk staf biasa)
-    cursor.execute("""
-        SELECT COUNT(id) FROM transaksi 
-        WHERE barcode_id = ? AND status_valid = 1 
-        AND DATE(waktu_transaksi) = ?
-    """, (barcode_id, today_str))
-    
-    transaksi_hari_ini = cursor.fetchone()[0]
-    jatah_staf = staf['jatah_harian']
-    
-    if transaksi_hari_ini >= jatah_staf:
-        # Catat transaksi Ditolak (status_valid = 0)
-        cursor.execute("INSERT INTO transaksi (barcode_id, waktu_transaksi, status_valid) VALUES (?, ?, ?)",
-                       (barcode_id, datetime.now(), 0))
-        conn.commit()
-        conn.close()
-        return "Peringatan", f"⚠️ {nama_staf} ({departemen_staf}) sudah mengambil {transaksi_hari_ini}/{jatah_staf} jatah harian!"
-
-    # Catat transaksi Diterima (status_valid = 1)
-    cursor.execute("INSERT INTO transaksi (barcode_id, waktu_transaksi, status_valid) VALUES (?, ?, ?)",
-                   (barcode_id, datetime.now(), 1))
-    conn.commit()
-    conn.close()
-    return "Sukses", f"✅ Makanan untuk {nama_staf} ({departemen_staf}) berhasil dicatat. Jatah tersisa: {jatah_staf - (transaksi_hari_ini + 1)}"
+        def lapor_progress(selesai, total):
+            progress_bar.progress(min(1.0, selesai / total) if total else 1.0, text=f"{selesai}/{total} baris")
+
+        path, jumlah = fungsi_ekspor(format_file, progress=lapor_progress, **filter_laporan)
+        nama_unduhan = nama_file + FORMAT_EKSPOR[format_file]
+        try:
+            progress_bar.progress(1.0, text=f"{jumlah} baris siap diunduh.")
+            if st.get_option("server.enableStaticServing"):
+                os.makedirs(FOLDER_UNDUHAN, exist_ok=True)
+                _bersihkan_unduhan_lama()
+                nama_acak = uuid.uuid4().hex + FORMAT_EKSPOR[format_file]
+                shutil.move(path, os.path.join(FOLDER_UNDUHAN, nama_acak))
+                st.markdown(f'<a href="app/static/ekspor/{nama_acak}" download="{nama_unduhan}">📥 Download {label}</a>',
+                            unsafe_allow_html=True)
+                st.caption(f"Tautan berlaku {UMUR_UNDUHAN_DETIK // 60} menit.")
+            elif os.path.getsize(path) <= MAKS_UNDUH_MEMORI_MB * 1024 * 1024:
+                with open(path, 'rb') as f:
+                    st.download_button(
+                        label=f"📥 Download {label}",
+                        data=f,
+                        file_name=nama_unduhan,
+                        mime=MIME_EKSPOR[format_file],
+                        key=f"{key}_download",
+                    )
+            else:
+                st.error(f"❌ File lebih dari {MAKS_UNDUH_MEMORI_MB} MB. Aktifkan server.enableStaticServing "
+                         "(lihat .streamlit/config.toml) atau persempit filter laporan.")
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@st.fragment(run_every=1.0)
+def tampil_hasil_lajur(daftar_lajur):
+    """Panel hasil per lajur; diperbarui tiap detik dari ScanHub tanpa rerun seluruh halaman.
+
+    `daftar_lajur` berisi (kunci, label); kunci memuat ID sesi sehingga hasil kiosk lain tidak ikut tampil.
+    """
+    hub = get_scan_hub()
+    nomor_dilihat = st.session_state['nomor_hasil_lajur']
+    nomor_terbaru = nomor_dilihat
+    admin_terdeteksi = False
+
+    for (lajur, label), kolom in zip(daftar_lajur, st.columns(len(daftar_lajur))):
+        with kolom:
+            riwayat = hub.hasil_lajur(lajur)
+            if not riwayat:
+                st.info(f"{label}: Menunggu Barcode/QR Code...")
+                continue
+
+            terakhir = riwayat[0]
+            tampil_pesan_scan(terakhir.status, f"{terakhir.waktu.strftime('%H:%M:%S')} — {terakhir.pesan}")
+
+            for h in riwayat[1:5]:
+                st.caption(f"{h.waktu.strftime('%H:%M:%S')} · {h.barcode_id} · {h.status}")
+
+            for h in riwayat:
+                if h.nomor > nomor_dilihat and h.status == "Sukses_Admin":
+                    admin_terdeteksi = True
+            nomor_terbaru = max(nomor_terbaru, terakhir.nomor)
+
+    st.session_state['nomor_hasil_lajur'] = nomor_terbaru
+    if admin_terdeteksi:
+        login_admin()
+
+
+@st.fragment(run_every=2.0)
+def tampil_tugas_hapus(jenis):
+    """Progres pembersihan latar untuk hapus staf/departemen; diperbarui tiap 2 detik."""
+    df_tugas = daftar_tugas_hapus()
+    df_tugas = df_tugas[df_tugas['jenis'] == jenis]
+    if df_tugas.empty:
+        return
+
+    st.caption("Pembersihan Data Terhapus")
+    for tugas in df_tugas.head(5).to_dict('records'):
+        label = f"{tugas['target']} — {tugas['status']} ({tugas['diproses']:,}/{int(tugas['total'] or 0):,} baris)"
+        if tugas['status'] == 'gagal':
+            st.error(f"{label}: {tugas['pesan']}")
+        else:
+            st.progress(float(tugas['progres']), text=label)
+    if (df_tugas['status'] == 'gagal').any() and st.button("Ulangi Pembersihan yang Gagal", key=f"ulangi_hapus_{jenis}"):
+        st.success(f"✅ {ulangi_tugas_gagal()} tugas dijadwalkan ulang.")
 
 
 # =====================================================================
 # --- LOGIKA TAMPILAN UTAMA STREAMLIT ---
 # =====================================================================
 
+_mulai_rerun = time.perf_counter()
+
 initialize_session_state() 
 init_db() 
+mulai_arsip_latar()
+mulai_pembersih_latar()
+metrik.mulai_server_metrik()
 
 st.title("🍽️ Sistem Scan Kantin Staf")
 
@@ -435,76 +409,64 @@ st.sidebar.markdown("---")
 # 1. SCANNER / KANTIN VIEW (DENGAN KAMERA SCANNER)
 # ===================================================
 if st.session_state['mode'] == 'Scanner':
-    
+    # Import tertunda: hanya dibayar sekali per proses, saat Mode Scanner pertama kali dibuka
+    from streamlit_webrtc import webrtc_streamer, WebRtcMode
+    from kantin_scanner import BarcodeProcessor, get_scan_hub
+
     st.header("Mode: Operasional Kantin (Scan ID)")
     st.subheader("Area Pemindaian Barcode via Kamera/Webcam")
     
     st.caption(f"Arahkan kamera ke Barcode/QR Code. Scan ID **{ADMIN_BARCODE_ID}** untuk Akses Admin.")
 
-    webrtc_ctx = webrtc_streamer(
-        key="barcode-scanner",
-        mode=WebRtcMode.SENDRECV,
-        rtc_configuration={"iceServers": [{"urls": ["stun:stun.l.google.com:19302"]}]},
-        video_processor_factory=BarcodeProcessor,
-        media_stream_constraints={
-            "video": True, 
-            "audio": False
-        },
-        async_processing=True,
+    jumlah_lajur = st.sidebar.number_input(
+        "Jumlah Lajur Kamera:", min_value=1, max_value=MAKS_LAJUR, value=1, key='jumlah_lajur',
+        help="Lebih dari 1: beberapa kamera di halaman ini berbagi satu pemroses scan."
     )
-    
-    output_placeholder = st.empty() 
-    scanned_id = None
 
-    if webrtc_ctx.video_processor:
-        scanned_id = webrtc_ctx.video_processor.scanned_id
-        
-        if scanned_id:
-            webrtc_ctx.video_processor.scanned_id = None 
-            
-            status, pesan = process_barcode_scan(scanned_id.strip())
-            
-            if status == "Sukses":
-                output_placeholder.success(pesan)
-            elif status == "Peringatan":
-                output_placeholder.warning(pesan)
-            elif status == "Sukses_Admin":
-                pass 
-            else: 
-                output_placeholder.error(pesan)
-            
-            if status != "Sukses_Admin":
-                time.sleep(1.5) 
-                st.rerun() 
-        else:
-            output_placeholder.info("Menunggu Barcode/QR Code untuk dipindai...")
-            
-    # --- Opsional: Text Input sebagai Fallback ---
-    st.markdown("---")
-    st.caption("Atau, Masukkan ID secara Manual:")
-    
-    with st.form(key='manual_scan_form'):
-        manual_barcode_input = st.text_input(
-            "Masukkan Barcode ID Staf (Manual):", 
-            placeholder="Ketik ID Barcode di sini..."
+    if jumlah_lajur > 1:
+        # --- MODE MULTI-LAJUR: setiap kamera mengirim ID ke ScanHub bersama ---
+        hub = get_scan_hub()
+        if 'nomor_hasil_lajur' not in st.session_state:
+            st.session_state['nomor_hasil_lajur'] = hub.nomor_terakhir
+        if 'id_sesi_lajur' not in st.session_state:
+            # Hub dipakai bersama semua sesi: kunci lajur per sesi agar hasil & login admin tidak bocor ke kiosk lain
+            st.session_state['id_sesi_lajur'] = uuid.uuid4().hex
+
+        id_sesi = st.session_state['id_sesi_lajur']
+        daftar_lajur = [(f"{id_sesi}/Lajur {i}", f"Lajur {i}") for i in range(1, jumlah_lajur + 1)]
+        for i, ((lajur, label), kolom) in enumerate(zip(daftar_lajur, st.columns(jumlah_lajur)), start=1):
+            with kolom:
+                st.markdown(f"**{label}**")
+                webrtc_streamer(
+                    key=f"barcode-scanner-lajur-{i}",
+                    mode=WebRtcMode.SENDRECV,
+                    rtc_configuration=RTC_CONFIGURATION,
+                    video_processor_factory=partial(BarcodeProcessor, lajur=lajur, hub=hub),
+                    media_stream_constraints={
+                        "video": True, 
+                        "audio": False
+                    },
+                    async_processing=True,
+                )
+
+        tampil_hasil_lajur(daftar_lajur)
+        webrtc_ctx = None
+
+    else:
+        webrtc_ctx = webrtc_streamer(
+            key="barcode-scanner",
+            mode=WebRtcMode.SENDRECV,
+            rtc_configuration=RTC_CONFIGURATION,
+            video_processor_factory=BarcodeProcessor,
+            media_stream_constraints={
+                "video": True, 
+                "audio": False
+            },
+            async_processing=True,
         )
-        submit_manual = st.form_submit_button(label='Proses Manual')
-        
-    if submit_manual and manual_barcode_input:
-        status, pesan = process_barcode_scan(manual_barcode_input.strip())
-        
-        if status == "Sukses":
-            output_placeholder.success(pesan)
-        elif status == "Peringatan":
-            output_placeholder.warning(pesan)
-        elif status == "Sukses_Admin":
-            pass 
-        else: 
-            output_placeholder.error(pesan)
-        
-        if status != "Sukses_Admin":
-            time.sleep(1.5) 
-            st.rerun() 
+
+    st.markdown("---")
+    panel_scan(webrtc_ctx)
 
 
 # ===================================================
@@ -520,14 +482,14 @@ elif st.session_state['mode'] == 'Admin':
     else:
         DEPARTEMEN_LIST_DYNAMIC = get_departemen_list()
         
-        tab1, tab2, tab3, tab4 = st.tabs(["Manajemen Staf (CRUD)", "Manajemen Departemen", "Laporan Jatah Harian", "Laporan Semua Transaksi"])
+        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Manajemen Staf (CRUD)", "Manajemen Departemen", "Laporan Jatah Harian", "Laporan Semua Transaksi", "Analitik Departemen", "Kinerja"])
 
         # === TAB 1: MANAJEMEN STAF (CREATE, READ, UPDATE, DELETE) ===
         with tab1:
             st.subheader("Kelola Data Staf")
             
             crud_tab = st.selectbox("Pilih Operasi:", 
-                                    ["Tambah Staf Baru", "Edit Staf", "Hapus Staf"],
+                                    ["Tambah Staf Baru", "Edit Staf", "Hapus Staf", "Impor Massal (CSV)"],
                                     key="crud_select")
             st.markdown("---")
             
@@ -570,77 +532,67 @@ elif st.session_state['mode'] == 'Admin':
             elif crud_tab == "Edit Staf":
                 st.caption("Cari staf berdasarkan Nama atau Barcode ID, lalu ubah data staf.")
                 
-                df_staf_all = tampil_data_staf()
-                df_staf_all = df_staf_all[df_staf_all['departemen'] != ADMIN_DEPARTEMEN_NAME]
-
-                if df_staf_all.empty:
-                    st.info("Tidak ada data staf untuk diedit.")
+                search_query = st.text_input("Ketik Nama, Barcode ID, atau Departemen Staf untuk Mencari:", key="search_edit_staf").strip()
+
+                # Hasil dari indeks prefiks direktori staf (terurut relevansi, maksimal MAKS_HASIL_CARI)
+                if search_query:
+                    hasil_cari = direktori_staf().cari(search_query, batas=MAKS_HASIL_CARI,
+                                                       kecuali_departemen=ADMIN_DEPARTEMEN_NAME)
+                    if not hasil_cari:
+                        st.warning("Staf tidak ditemukan.")
                 else:
-                    df_staf_all['display'] = df_staf_all['nama'] + " (" + df_staf_all['barcode_id'] + ") - " + df_staf_all['departemen']
-                    
-                    search_query = st.text_input("Ketik Nama atau Barcode ID Staf untuk Mencari:", key="search_edit_staf").strip().lower()
-                    
-                    filtered_options = []
-                    
-                    if search_query:
-                        filtered_df = df_staf_all[
-                            (df_staf_all['nama'].str.lower().str.contains(search_query)) | 
-                            (df_staf_all['barcode_id'].str.lower().str.contains(search_query))
-                        ]
-                        filtered_options = filtered_df['display'].tolist()
-                        if not filtered_options:
-                            st.warning("Staf tidak ditemukan.")
-                    else:
-                        filtered_options = df_staf_all['display'].tolist()
-
-                    filtered_options.insert(0, "")
-                    
-                    selected_staf_display = st.selectbox(
-                        "Pilih Staf dari Daftar/Hasil Pencarian:", 
-                        filtered_options, 
-                        key="edit_select_staf"
-                    )
-                    
-                    st.markdown("---")
+                    hasil_cari = [s for s in direktori_staf().semua() if s.departemen != ADMIN_DEPARTEMEN_NAME]
+                    if not hasil_cari:
+                        st.info("Tidak ada data staf untuk diedit.")
+                    elif len(hasil_cari) > MAKS_HASIL_CARI:
+                        st.caption(f"Menampilkan {MAKS_HASIL_CARI} dari {len(hasil_cari)} staf. Ketik untuk mempersempit.")
+                        hasil_cari = hasil_cari[:MAKS_HASIL_CARI]
+
+                label_staf = {s.barcode_id: f"{s.nama} ({s.barcode_id}) - {s.departemen}" for s in hasil_cari}
+                barcode_id = st.selectbox(
+                    "Pilih Staf dari Daftar/Hasil Pencarian:", 
+                    [None, *label_staf],
+                    format_func=lambda b: "" if b is None else label_staf.get(b, b),
+                    key="edit_select_staf"
+                )
+                
+                st.markdown("---")
 
-                    if selected_staf_display:
-                        match = re.search(r'\((.*?)\)', selected_staf_display)
-                        barcode_id = match.group(1) if match else None
-                        
-                        if barcode_id:
-                            staf_data = get_staf_by_barcode(barcode_id)
+                if barcode_id:
+                    staf_data = get_staf_by_barcode(barcode_id)
                             
-                            if staf_data:
-                                available_departments = [d for d in DEPARTEMEN_LIST_DYNAMIC if d != ADMIN_DEPARTEMEN_NAME] 
+                    if staf_data:
+                        available_departments = [d for d in DEPARTEMEN_LIST_DYNAMIC if d != ADMIN_DEPARTEMEN_NAME] 
 
-                                with st.form(key='edit_staf_form'):
+                        with st.form(key='edit_staf_form'):
                                     
-                                    st.text_input("Barcode ID (Tidak dapat diubah):", value=staf_data['barcode_id'], disabled=True)
-                                    edited_nama = st.text_input("Nama Staf:", value=staf_data['nama'])
+                            st.text_input("Barcode ID (Tidak dapat diubah):", value=staf_data.barcode_id, disabled=True)
+                            edited_nama = st.text_input("Nama Staf:", value=staf_data.nama)
                                     
-                                    try:
-                                        default_index = available_departments.index(staf_data['departemen'])
-                                    except ValueError:
-                                        default_index = 0
+                            try:
+                                default_index = available_departments.index(staf_data.departemen)
+                            except ValueError:
+                                default_index = 0
                                         
-                                    edited_departemen = st.selectbox("Departemen/Divisi:", available_departments, index=default_index)
+                            edited_departemen = st.selectbox("Departemen/Divisi:", available_departments, index=default_index)
 
-                                    submit_edit = st.form_submit_button("Simpan Perubahan")
+                            submit_edit = st.form_submit_button("Simpan Perubahan")
                                     
-                                    if submit_edit:
-                                        status, pesan = edit_staf(barcode_id, edited_nama.strip(), edited_departemen)
-                                        if status:
-                                            st.success(pesan)
-                                            time.sleep(1)
-                                            st.rerun()
-                                        else:
-                                            st.error(pesan)
-                            else:
-                                st.error("Data staf tidak ditemukan.")
+                            if submit_edit:
+                                status, pesan = edit_staf(barcode_id, edited_nama.strip(), edited_departemen)
+                                if status:
+                                    st.success(pesan)
+                                    time.sleep(1)
+                                    st.rerun()
+                                else:
+                                    st.error(pesan)
+                    else:
+                        st.error("Data staf tidak ditemukan.")
 
             
             elif crud_tab == "Hapus Staf":
-                st.caption("PERINGATAN: Menghapus staf akan menghapus SEMUA transaksi terkait.")
+                st.caption("PERINGATAN: Menghapus staf akan menghapus SEMUA transaksi terkait. "
+                           "Staf langsung tidak dapat scan; riwayatnya dibersihkan bertahap di latar.")
                 
                 df_staf_all = tampil_data_staf()
                 df_staf_all = df_staf_all[df_staf_all['departemen'] != ADMIN_DEPARTEMEN_NAME]
@@ -656,7 +608,7 @@ elif st.session_state['mode'] == 'Admin':
 
                     if barcode_id:
                         staf_data = get_staf_by_barcode(barcode_id)
-                        st.warning(f"Anda akan menghapus **{staf_data['nama']}** ({staf_data['departemen']}).")
+                        st.warning(f"Anda akan menghapus **{staf_data.nama}** ({staf_data.departemen}).")
                         
                         if st.button(f"Konfirmasi HAPUS Staf {barcode_id}", type="primary"):
                             status, pesan = hapus_staf(barcode_id)
@@ -669,6 +621,49 @@ elif st.session_state['mode'] == 'Admin':
                     else:
                         st.error("Silakan pilih staf yang valid.")
 
+                tampil_tugas_hapus("staf")
+
+            elif crud_tab == "Impor Massal (CSV)":
+                st.caption("Tambah/perbarui banyak staf sekaligus dari file CSV (kolom: barcode_id, nama, departemen, "
+                           "jatah_harian opsional). Barcode yang sudah terdaftar akan diperbarui.")
+                st.download_button("Unduh Templat CSV", data=templat_csv(), file_name="templat_impor_staf.csv",
+                                   mime="text/csv", key="templat_impor_staf")
+
+                file_impor = st.file_uploader("Pilih File CSV:", type=["csv"], key="file_impor_staf")
+                if file_impor is not None:
+                    try:
+                        rencana = rencanakan_impor(file_impor)
+                    except (ValueError, UnicodeDecodeError) as e:
+                        st.error(f"❌ File tidak dapat dibaca: {e}")
+                        rencana = None
+
+                    if rencana is not None:
+                        col_tambah, col_ubah, col_tetap, col_galat = st.columns(4)
+                        col_tambah.metric("Staf Baru", len(rencana.tambah))
+                        col_ubah.metric("Diperbarui", len(rencana.ubah))
+                        col_tetap.metric("Tidak Berubah", rencana.tetap)
+                        col_galat.metric("Baris Ditolak", len(rencana.galat))
+
+                        if rencana.galat:
+                            st.warning("Baris berikut tidak valid dan akan dilewati:")
+                            st.dataframe(rencana.laporan_galat(), width='stretch', hide_index=True)
+
+                        if rencana.ada_perubahan:
+                            st.markdown("**Pratinjau Perubahan**")
+                            st.dataframe(rencana.pratinjau(), width='stretch', hide_index=True)
+                            if st.button("Terapkan Impor", type="primary", key="terapkan_impor_staf"):
+                                jumlah_galat = len(rencana.galat)
+                                status, pesan = terapkan_impor(rencana)
+                                if status:
+                                    st.success(pesan)
+                                else:
+                                    st.error(pesan)
+                                if len(rencana.galat) > jumlah_galat:
+                                    # Staf/departemen yang dihapus antara pratinjau dan impor
+                                    st.dataframe(rencana.laporan_galat().iloc[jumlah_galat:], width='stretch', hide_index=True)
+                        else:
+                            st.info("Tidak ada perubahan: semua baris valid sudah sesuai dengan data staf.")
+
 
             st.markdown("---")
             st.subheader("Daftar Semua Staf")
@@ -726,6 +721,8 @@ elif st.session_state['mode'] == 'Admin':
                             st.rerun()
                         else:
                             st.error(pesan)
+
+                tampil_tugas_hapus("departemen")
             
             st.markdown("---")
             st.subheader("Daftar Departemen Aktif")
@@ -755,8 +752,7 @@ elif st.session_state['mode'] == 'Admin':
             filter_options = ["Semua Departemen"] + [d for d in DEPARTEMEN_LIST_DYNAMIC if d != ADMIN_DEPARTEMEN_NAME]
             filter_dept_jatah = st.selectbox("Filter berdasarkan Departemen:", filter_options, key="filter_jatah_dept")
             
-            df_jatah = get_jatah_harian_staf(filter_dept_jatah)
-            df_jatah = df_jatah[df_jatah['Departemen'] != ADMIN_DEPARTEMEN_NAME]
+            df_jatah = get_jatah_harian_staf(filter_dept_jatah, tanpa_admin=True)
 
             if not df_jatah.empty:
                 # Perbaikan: Mengganti use_container_width=True menjadi width='stretch'
@@ -768,11 +764,9 @@ elif st.session_state['mode'] == 'Admin':
                                  "Status": st.column_config.TextColumn("Status"),
                                  "Departemen": st.column_config.TextColumn("Departemen/Divisi")
                              })
-                st.download_button(
-                    label="📥 Download Data Jatah Harian",
-                    data=df_jatah.to_csv(index=False).encode('utf-8'),
-                    file_name=f'Laporan_Jatah_Harian_{date.today()}.csv',
-                    mime='text/csv',
+                tombol_download_ekspor(
+                    "Data Jatah Harian", "ekspor_jatah", f'Laporan_Jatah_Harian_{date.today()}',
+                    ekspor_jatah_harian, departemen_filter=filter_dept_jatah
                 )
             else:
                 st.info(f"Tidak ada data staf atau transaksi untuk departemen '{filter_dept_jatah}' hari ini.")
@@ -800,13 +794,32 @@ elif st.session_state['mode'] == 'Admin':
             if start_tgl > end_tgl:
                 st.error("❌ Tanggal awal tidak boleh melebihi tanggal akhir. Silakan perbaiki rentang tanggal.")
             else:
-                df_transaksi = get_all_transaksi(
+                start_str = start_tgl.strftime('%Y-%m-%d')
+                end_str = end_tgl.strftime('%Y-%m-%d')
+
+                # Header ringkasan: satu COUNT, tanpa memuat baris transaksi
+                ringkasan = hitung_transaksi(filter_dept_transaksi, start_str, end_str)
+                col_total, col_valid, col_ditolak = st.columns(3)
+                col_total.metric("Total Transaksi", ringkasan['total'])
+                col_valid.metric("VALID", ringkasan['valid'])
+                col_ditolak.metric("BATAS (Ditolak)", ringkasan['ditolak'])
+
+                page_size = st.selectbox("Baris per Halaman:", UKURAN_HALAMAN, index=1, key="page_size_transaksi")
+
+                # Kembali ke halaman pertama setiap kali filter berubah
+                kunci_filter = (filter_dept_transaksi, start_str, end_str, page_size)
+                if st.session_state.get('filter_halaman_transaksi') != kunci_filter:
+                    st.session_state['filter_halaman_transaksi'] = kunci_filter
+                    st.session_state['kursor_transaksi'] = [None]
+                tumpukan_kursor = st.session_state['kursor_transaksi']
+
+                df_transaksi, kursor_berikutnya = get_halaman_transaksi(
                     departemen_filter=filter_dept_transaksi, 
-                    start_date=start_tgl.strftime('%Y-%m-%d'), 
-                    end_date=end_tgl.strftime('%Y-%m-%d')
+                    start_date=start_str, 
+                    end_date=end_str,
+                    page_size=page_size,
+                    kursor=tumpukan_kursor[-1]
                 )
-                
-                df_transaksi = df_transaksi[df_transaksi['Departemen'] != ADMIN_DEPARTEMEN_NAME]
 
                 if not df_transaksi.empty:
                     # Perbaikan: Mengganti use_container_width=True menjadi width='stretch'
@@ -814,11 +827,147 @@ elif st.session_state['mode'] == 'Admin':
                                  column_config={
                                      "Waktu": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm:ss")
                                  })
-                    st.download_button(
-                        label="📥 Download Riwayat Transaksi",
-                        data=df_transaksi.to_csv(index=False).encode('utf-8'),
-                        file_name=f'Riwayat_Transaksi_{start_tgl}_sampai_{end_tgl}.csv',
-                        mime='text/csv',
+
+                    halaman = len(tumpukan_kursor)
+                    total_halaman = max(1, -(-ringkasan['total'] // page_size))
+                    col_prev, col_info, col_next = st.columns([1, 2, 1])
+                    col_prev.button("⬅️ Sebelumnya", disabled=halaman == 1, key="prev_transaksi",
+                                    on_click=tumpukan_kursor.pop)
+                    col_info.caption(f"Halaman {halaman} dari {total_halaman}")
+                    col_next.button("Berikutnya ➡️", disabled=kursor_berikutnya is None, key="next_transaksi",
+                                    on_click=tumpukan_kursor.append, args=(kursor_berikutnya,))
+
+                    tombol_download_ekspor(
+                        "Riwayat Transaksi", "ekspor_transaksi", f'Riwayat_Transaksi_{start_tgl}_sampai_{end_tgl}',
+                        ekspor_transaksi, departemen_filter=filter_dept_transaksi,
+                        start_date=start_str, end_date=end_str
                     )
                 else:
-                    st.info(f"Tidak ada transaksi tercatat pada rentang **{start_tgl.strftime('%d-%m-%Y')}** hingga **{end_tgl.strftime('%d-%m-%Y')}** untuk departemen '{filter_dept_transaksi}'.")
\ No newline at end of file
+                    st.info(f"Tidak ada transaksi tercatat pada rentang **{start_tgl.strftime('%d-%m-%Y')}** hingga **{end_tgl.strftime('%d-%m-%Y')}** untuk departemen '{filter_dept_transaksi}'.")
+
+
+        # === TAB 5: ANALITIK DEPARTEMEN (DARI REKAP_HARIAN) ===
+        with tab5:
+            st.subheader("Tren Makan per Departemen")
+
+            filter_options = ["Semua Departemen"] + [d for d in DEPARTEMEN_LIST_DYNAMIC if d != ADMIN_DEPARTEMEN_NAME]
+
+            col_filter, col_date_start, col_date_end, col_periode = st.columns([1.5, 1, 1, 1])
+            with col_filter:
+                filter_dept_analitik = st.selectbox("Filter Departemen:", filter_options, key="filter_analitik_dept")
+            with col_date_start:
+                start_analitik = st.date_input("Tanggal Awal:", value=date.today() - timedelta(days=RENTANG_ANALITIK_HARI - 1),
+                                               key="start_analitik_date")
+            with col_date_end:
+                end_analitik = st.date_input("Tanggal Akhir:", value=date.today(), key="end_analitik_date")
+            with col_periode:
+                periode = st.radio("Periode:", ["Harian", "Mingguan"], horizontal=True, key="periode_analitik")
+
+            if start_analitik > end_analitik:
+                st.error("❌ Tanggal awal tidak boleh melebihi tanggal akhir. Silakan perbaiki rentang tanggal.")
+            else:
+                df_rekap = get_rekap_harian(filter_dept_analitik, start_analitik, end_analitik)
+
+                if df_rekap.empty:
+                    st.info(f"Tidak ada transaksi tercatat pada rentang **{start_analitik.strftime('%d-%m-%Y')}** hingga **{end_analitik.strftime('%d-%m-%Y')}** untuk departemen '{filter_dept_analitik}'.")
+                else:
+                    col_total, col_valid, col_ditolak = st.columns(3)
+                    col_total.metric("Total Transaksi", int(df_rekap['Valid'].sum() + df_rekap['Ditolak'].sum()))
+                    col_valid.metric("VALID", int(df_rekap['Valid'].sum()))
+                    col_ditolak.metric("BATAS (Ditolak)", int(df_rekap['Ditolak'].sum()))
+
+                    # Semua departemen: satu garis per departemen; satu departemen: valid vs ditolak
+                    if filter_dept_analitik == "Semua Departemen":
+                        tren = df_rekap.pivot_table(index='Tanggal', columns='Departemen', values='Valid',
+                                                    aggfunc='sum', fill_value=0, observed=True)
+                    else:
+                        tren = df_rekap.groupby('Tanggal')[['Valid', 'Ditolak']].sum()
+                    # Tanggal tanpa transaksi tetap tampil sebagai 0
+                    tren = tren.reindex(pd.date_range(start_analitik, end_analitik, name='Tanggal'), fill_value=0)
+                    if periode == "Mingguan":
+                        tren = tren.resample('W-MON', label='left', closed='left').sum()
+
+                    st.markdown(f"**Makan {periode.lower()}**")
+                    st.line_chart(tren)
+
+                    st.markdown("**Jam sibuk** (jumlah scan per jam dalam rentang)")
+                    st.bar_chart(get_rekap_jam(filter_dept_analitik, start_analitik, end_analitik))
+
+                    ringkasan_dept = (df_rekap.groupby('Departemen', observed=True)[['Valid', 'Ditolak']].sum()
+                                      .sort_values('Valid', ascending=False))
+                    st.dataframe(ringkasan_dept, width='stretch')
+
+            with st.expander("Pemeliharaan Rekap"):
+                st.caption("Rekap diperbarui otomatis setiap scan. Bangun ulang bila departemen staf dipindah "
+                           "dan riwayat lama ingin dihitung dengan departemen barunya.")
+                if st.button("Bangun Ulang Rekap", key="bangun_ulang_rekap"):
+                    jumlah = bangun_ulang_rekap()
+                    st.success(f"✅ Rekap dibangun ulang ({jumlah} baris).")
+
+                st.caption("Periksa membandingkan rekap dengan hitungan ulang seluruh transaksi (termasuk arsip) "
+                           "tanpa mengubah apa pun; bisa memakan waktu pada riwayat panjang.")
+                col_periksa, col_perbaiki = st.columns(2)
+                with col_periksa:
+                    periksa = st.button("Periksa Rekap", key="periksa_rekap")
+                with col_perbaiki:
+                    perbaiki = st.button("Perbaiki Rekap", key="perbaiki_rekap")
+                if periksa or perbaiki:
+                    with st.spinner("Menghitung ulang rekap..."):
+                        berbeda = periksa_rekap(perbaiki=perbaiki)
+                    daftar_bulan = ", ".join(f"{tahun:04d}-{bulan:02d}" for tahun, bulan in berbeda)
+                    if not berbeda:
+                        st.success("✅ Rekap cocok dengan transaksi.")
+                    elif perbaiki:
+                        tandai_perubahan()
+                        st.success(f"✅ Rekap diperbaiki untuk bulan: {daftar_bulan}")
+                    else:
+                        st.warning(f"⚠️ Rekap tidak cocok untuk bulan: {daftar_bulan}")
+
+        # === TAB 6: KINERJA (METRIK PROSES INI) ===
+        with tab6:
+            st.subheader("Kinerja Scan & Database")
+            st.caption(f"Metrik sejak proses dimulai {datetime.fromtimestamp(metrik.registry.mulai).strftime('%d-%m-%Y %H:%M:%S')}. "
+                       f"Format Prometheus: http://{metrik.METRIK_HOST}:{metrik.METRIK_PORT}/metrics")
+            st.button("Segarkan", key="segarkan_kinerja")
+
+            data_metrik = metrik.ringkasan()
+            counter = {(c['Metrik'], c['Label']): c['Nilai'] for c in data_metrik['counter']}
+            total_scan = sum(v for (nama, _), v in counter.items() if nama == 'kantin_scan_total')
+
+            col_laju, col_total, col_tolak, col_decode, col_antrean = st.columns(5)
+            col_laju.metric(f"Scan/detik ({metrik.JENDELA_LAJU_DETIK} dtk)", f"{metrik.registry.laju_scan():.2f}")
+            col_total.metric("Total Scan", int(total_scan))
+            col_tolak.metric("Ditolak (Batas)", int(counter.get(('kantin_scan_total', '{status="Peringatan"}'), 0)))
+            col_decode.metric("Decode Gagal", int(counter.get(('kantin_decode_total', '{hasil="gagal"}'), 0)))
+            # Dibaca langsung seperti gauge kantin_antrean_penulis: membuka tab ini tidak memulai thread penulis
+            penulis = kantin_db._scan_writer
+            statistik_penulis = penulis.statistik() if penulis is not None else None
+            col_antrean.metric("Menunggu Commit", statistik_penulis['antrean'] if statistik_penulis else "tidak aktif")
+
+            st.markdown("**Latensi**")
+            if data_metrik['histogram']:
+                st.dataframe(pd.DataFrame(data_metrik['histogram']), width='stretch', hide_index=True,
+                             column_config={kolom: st.column_config.NumberColumn(format="%.3f")
+                                            for kolom in ("Rata-rata (ms)", "p50 (ms)", "p95 (ms)", "p99 (ms)")})
+            else:
+                st.info("Belum ada data latensi.")
+
+            st.markdown(f"**SQL Lambat** (≥ {metrik.SQL_LAMBAT_DETIK * 1000:.0f} ms, {metrik.MAKS_SQL_LAMBAT} terakhir)")
+            if metrik.registry.sql_lambat:
+                st.dataframe(pd.DataFrame(
+                    [(s.waktu, s.durasi * 1000, s.sql) for s in list(metrik.registry.sql_lambat)],
+                    columns=["Waktu", "Durasi (ms)", "SQL"]
+                ), width='stretch', hide_index=True)
+            else:
+                st.info("Tidak ada statement SQL lambat.")
+
+            with st.expander("Counter & Group Commit"):
+                st.dataframe(pd.DataFrame(data_metrik['counter']), width='stretch', hide_index=True)
+                if statistik_penulis:
+                    st.json(statistik_penulis)
+                else:
+                    st.caption("Penulis group commit tidak aktif di proses ini (belum ada scan lewat group commit).")
+
+
+# Durasi eksekusi skrip penuh (rerun); fragment tidak ikut terhitung
+metrik.amati("kantin_rerun_detik", time.perf_counter() - _mulai_rerun, mode=st.session_state['mode'])